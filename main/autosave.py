@@ -0,0 +1,215 @@
+"""
+Autosave: an append-only journal of edits per pattern, written on a background thread. Does not use tkinter
+"""
+import json
+import os
+import queue
+import threading
+import time
+import typing
+
+from pattern import GroupBuilder, Pattern
+
+JOURNAL_FLUSH_INTERVAL: float = 1.0  # seconds of edits written and fsynced together
+JOURNAL_COMPACT_EDITS: int = 1000  # edits after which the journal is replaced by a snapshot
+JOURNAL_EXTENSION: str = ".journal"
+
+
+class Journal:
+    """
+    Journal of one pattern. Every edit is a JSON line; a "snapshot" line holds the whole state. A pattern shown in
+    several views has one journal, kept by one of the views
+    """
+    def __init__(self, autosave: "Autosave", path: str, snapshot: typing.Callable[[], dict[str, typing.Any]]) -> None:
+        """
+        Construct a journal. Use Autosave.open
+        :param autosave: autosave that writes the journal
+        :param path: journal file
+        :param snapshot: returns the whole state of the tab, for compaction
+        """
+        self.autosave: Autosave = autosave
+        self.path: str = path
+        self.snapshot: typing.Callable[[], dict[str, typing.Any]] = snapshot
+        self.edits: int = 0  # edits since the last snapshot
+        self.owner: typing.Any = None  # view that records the changes of the pattern
+
+    def record(self, op: str, **fields: typing.Any) -> None:
+        """
+        Appends an edit. Every JOURNAL_COMPACT_EDITS edits the journal is compacted instead
+        :param op: edit type
+        :param fields: edit data, JSON-serializable
+        :return: None
+        """
+        self.edits += 1
+        if self.edits >= self.autosave.compact_edits:
+            self.compact()
+            return
+        self.autosave.queue.put((self.path, "append", json.dumps({"op": op, **fields}) + "\n"))
+
+    def compact(self) -> None:
+        """
+        Replaces the journal with a snapshot of the current state
+        :return: None
+        """
+        self.edits = 0
+        self.autosave.queue.put((self.path, "replace", json.dumps({"op": "snapshot", **self.snapshot()}) + "\n"))
+
+    def remove(self) -> None:
+        """
+        Deletes the journal, when its tab is closed
+        :return: None
+        """
+        self.autosave.queue.put((self.path, "remove", None))
+
+
+class Autosave:
+    """
+    Writes the journals of all tabs on one background thread, fsyncing them in batches
+    """
+    def __init__(self, directory: str, flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+                 compact_edits: int = JOURNAL_COMPACT_EDITS) -> None:
+        """
+        Starts the writer thread
+        :param directory: directory with the journals
+        :param flush_interval: seconds of edits written and fsynced together
+        :param compact_edits: edits after which a journal is compacted
+        """
+        self.directory: str = directory
+        self.flush_interval: float = flush_interval
+        self.compact_edits: int = compact_edits
+        self.queue: queue.Queue[tuple[str, str, str | None] | None] = queue.Queue()
+        os.makedirs(directory, exist_ok=True)
+        self._thread: threading.Thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def journals(self) -> list[str]:
+        """
+        :return: journal files left from the last session, oldest first
+        """
+        return sorted(os.path.join(self.directory, i) for i in os.listdir(self.directory)
+                      if i.endswith(JOURNAL_EXTENSION))
+
+    def open(self, snapshot: typing.Callable[[], dict[str, typing.Any]], path: str | None = None) -> Journal:
+        """
+        Opens a journal for a tab and starts it with a snapshot
+        :param snapshot: returns the whole state of the tab
+        :param path: existing journal to replace, a new one by default
+        :return: journal
+        """
+        if path is None:
+            path = os.path.join(self.directory, f"{time.time_ns()}{JOURNAL_EXTENSION}")
+        journal: Journal = Journal(self, path, snapshot)
+        journal.compact()
+        return journal
+
+    def close(self) -> None:
+        """
+        Writes everything queued and stops the writer thread
+        :return: None
+        """
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        """
+        Writer thread
+        Not intended for use outside the class
+        :return: None
+        """
+        files: dict[str, typing.TextIO] = {}
+        running: bool = True
+        while running:
+            batch: list[tuple[str, str, str | None] | None] = [self.queue.get()]
+            deadline: float = time.monotonic() + self.flush_interval
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            dirty: set[str] = set()
+            for item in batch:
+                if item is None:
+                    running = False
+                    break
+                path, action, line = item
+                try:
+                    if action == "append":
+                        if path not in files:
+                            files[path] = open(path, "a", encoding="utf-8")
+                        files[path].write(line)
+                        dirty.add(path)
+                        continue
+                    if path in files:
+                        files.pop(path).close()
+                    dirty.discard(path)
+                    if action == "replace":
+                        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                            f.write(line)
+                            f.flush()
+                            os.fsync(f.fileno())
+                        os.replace(f"{path}.tmp", path)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                except OSError:  # autosave must never take the editor down, the next snapshot repairs the journal
+                    continue
+            for path in dirty:
+                try:
+                    files[path].flush()
+                    os.fsync(files[path].fileno())
+                except OSError:
+                    continue
+        for f in files.values():
+            f.close()
+
+
+def replay_journal(path: str, tolerance: float = 0) -> dict[str, typing.Any] | None:
+    """
+    Rebuilds the state of a tab from its journal. A line cut off by a crash is ignored
+    :param path: journal file
+    :param tolerance: palette tolerance
+    :return: name, icon, compound, path and pattern (Pattern), None without a snapshot
+    """
+    state: dict[str, typing.Any] | None = None
+    groups: GroupBuilder | None = None  # group edits not compiled into the pattern yet
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record: dict[str, typing.Any] = json.loads(line)
+            except ValueError:
+                break
+            op: str = record.pop("op")
+            if op == "snapshot":
+                state = {**record, "pattern": Pattern.from_dict(record["pattern"], tolerance)}
+                groups = None
+                continue
+            if state is None:
+                continue
+            pattern: Pattern = state["pattern"]
+            if op in ("link", "unlink"):
+                if groups is None:
+                    groups = GroupBuilder.from_groups(pattern.cell_count, pattern.groups)
+                if op == "link":
+                    groups.link_thread(record["cell"], record["thread"])
+                else:
+                    groups.unlink(record["cell"])
+                continue
+            if groups is not None and op in ("fill", "fill_threads"):
+                pattern.set_groups(groups.compile())
+            if op == "fill":
+                pattern.fill_thread(record["thread"], record["color"])
+            elif op == "fill_threads":
+                pattern.fill_threads(record["colors"])
+            elif op == "thread":
+                pattern.set_thread(record["thread"], record["color"])
+            elif op == "cell":
+                pattern.set_cell(record["cell"], record["color"])
+            elif op == "recolor":
+                pattern.recolor(record["index"], record["color"])
+            elif op == "threads":
+                pattern.resize(record["rows"], record["cols"], record["threads"])
+                groups = None
+            elif op == "tab":
+                state.update(record)
+    if groups is not None:
+        state["pattern"].set_groups(groups.compile())
+    return state
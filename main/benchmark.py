@@ -0,0 +1,121 @@
+"""
+Compares the two renderers of Custom: a polygon per rhombus and one bitmap, and times the cold start of the window.
+Needs a display.
+Run from this directory: python benchmark.py [rows] [cols], or python benchmark.py startup.
+python benchmark.py collab [clients] times a collaboration session without a display
+Use the results to tune RASTER_BUDGET in custom.py, the bitmap threshold is measured from it when drawing
+"""
+import random
+import subprocess
+import sys
+import time
+
+import custom
+from collab import COLLAB_TICK, Loopback
+from pattern import Pattern
+
+
+def benchmark(rows: int = 500, cols: int = 9) -> None:
+    """
+    Times drawing, filling every thread and hit testing with both renderers
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: None
+    """
+    window: custom.Window = custom.Window()
+    window.withdraw()
+    tab: custom.Custom = custom.Custom(window.notebook, window)
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    print(f"{rows} rows, {cols} columns, {pattern.cell_count} rhombuses")
+
+    measured: int = custom.RASTER_CELLS
+    for name, limit in (("polygons", pattern.cell_count), ("bitmap", 0)):
+        custom.Custom.raster_cells = limit
+        start: float = time.perf_counter()
+        tab.set_pattern(pattern)
+        window.update()
+        draw: float = time.perf_counter() - start
+        if name == "polygons":
+            measured = custom.Custom.raster_cells
+
+        start = time.perf_counter()
+        for n in range(pattern.threads):
+            tab.fill_circle(n, "#ff0000" if n % 2 else "#0000ff")
+            window.update()
+        fill: float = (time.perf_counter() - start) / pattern.threads
+
+        start = time.perf_counter()
+        for y in range(0, tab.canvas_height, 7):
+            tab.canvas.find_closest(tab.cell_width, y)
+        find_closest: float = time.perf_counter() - start
+        start = time.perf_counter()
+        for y in range(0, tab.canvas_height, 7):
+            tab.cell_at(tab.cell_width, y)
+        cell_at: float = time.perf_counter() - start
+
+        print(f"{name:>8}: draw {draw * 1000:.1f} ms, fill {fill * 1000:.1f} ms per thread, "
+              f"{tab.canvas_height // 7} hit tests: find_closest {find_closest * 1000:.1f} ms, "
+              f"cell_at {cell_at * 1000:.1f} ms")
+
+    print(f"bitmap above {measured} rhombuses, drawn as polygons in {custom.RASTER_BUDGET * 1000:.0f} ms")
+    tab.journal.remove()
+    window.close()
+
+
+def startup(runs: int = 5) -> None:
+    """
+    Times importing custom and opening the window until it is drawn, each run in a new interpreter
+    :param runs: number of runs
+    :return: None
+    """
+    code: str = ("import time\n"
+                 "start = time.perf_counter()\n"
+                 "import custom\n"
+                 "imported = time.perf_counter()\n"
+                 "window = custom.Window()\n"
+                 "window.update()\n"
+                 "shown = time.perf_counter()\n"
+                 "print(imported - start, shown - imported)\n"
+                 "window.close()\n")
+    for _ in range(runs):
+        output: str = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        imported, shown = map(float, output.split()[-2:])
+        print(f"import {imported * 1000:.1f} ms, window {shown * 1000:.1f} ms, total {(imported + shown) * 1000:.1f} ms")
+
+
+def collab(clients: int = 30, ticks: int = 200, rows: int = 100, cols: int = 9) -> None:
+    """
+    Times a collaboration session in one process: every client sets a random cell each tick
+    :param clients: number of clients
+    :param ticks: number of ticks
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: None
+    """
+    loopback: Loopback = Loopback(Pattern(rows, cols, (cols - 1) * 4 + 1))
+    patterns: list[Pattern] = [Pattern(rows, cols, (cols - 1) * 4 + 1) for _ in range(clients)]
+    for pattern in patterns:
+        loopback.connect(pattern)
+    rng: random.Random = random.Random(0)
+    colors: list[str] = [f"#{rng.randrange(0x1000000):06x}" for _ in range(16)]
+    sent: int = 0
+    start: float = time.perf_counter()
+    for _ in range(ticks):
+        for pattern in patterns:
+            pattern.set_cell(rng.randrange(pattern.cell_count), rng.choice(colors))
+        sent += len(loopback.tick())
+    elapsed: float = (time.perf_counter() - start) / ticks
+    canonical: Pattern = loopback.hub.pattern
+    converged: bool = all(i.cell_color(k) == canonical.cell_color(k) for i in patterns for k in range(i.cell_count))
+    print(f"{clients} clients: {elapsed * 1000:.2f} ms per tick of {COLLAB_TICK * 1000:.0f} ms, "
+          f"{sent / ticks:.0f} bytes broadcast per tick, {'converged' if converged else 'DIVERGED'}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["startup"]:
+        startup()
+    elif sys.argv[1:2] == ["collab"]:
+        collab(*map(int, sys.argv[2:3]))
+    else:
+        benchmark(*map(int, sys.argv[1:3]))
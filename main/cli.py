@@ -0,0 +1,214 @@
+"""
+Command line interface for pattern files. Does not use tkinter, run it as python custom.py <command> ...
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import typing
+
+from collab import COLLAB_PORT, Server
+from export import export_png, export_svg, export_text
+from layouts import KUMIHIMO_THREADS, kumihimo_groups, kumihimo_slots, kumihimo_threads
+from library import BlobStore, read_filenames, read_pattern, write_pattern
+from pattern import Pattern
+from validation import Report, summary, validate_files
+
+BLOBS_PATH: str = "Custom/blobs"  # blob store of the GUI
+FORMATS: tuple[str, ...] = ("json", "png", "svg", "txt")
+
+
+def parser() -> argparse.ArgumentParser:
+    """
+    :return: argument parser of the command line interface
+    """
+    main_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="custom.py",
+                                                                   description="Friendship bracelet patterns")
+    main_parser.add_argument("--jobs", "-j", type=int, default=1, help="files processed in parallel")
+    main_parser.add_argument("--blobs", default=BLOBS_PATH, help="blob store the pattern files refer to")
+    commands: typing.Any = main_parser.add_subparsers(dest="command", required=True)
+
+    info: argparse.ArgumentParser = commands.add_parser("info", help="show pattern sizes and colors")
+    info.add_argument("files", nargs="+")
+
+    simulate: argparse.ArgumentParser = commands.add_parser("simulate",
+                                                            help="set thread colors and fill their groups")
+    simulate.add_argument("files", nargs="+")
+    simulate.add_argument("--colors", required=True, help="comma-separated thread colors, repeated if too few")
+    simulate.add_argument("--layout", choices=("groups", "kumihimo"), default="groups",
+                          help="use the groups stored in the file or the kumihimo layout")
+    simulate.add_argument("--kumihimo-threads", type=int, choices=KUMIHIMO_THREADS, default=16)
+    simulate.add_argument("--output", "-o", required=True,
+                          help="output file, or directory for several files; the format is taken from the extension")
+
+    validate: argparse.ArgumentParser = commands.add_parser("validate",
+                                                            help="check groups and cells against the threads")
+    validate.add_argument("files", nargs="*")
+    validate.add_argument("--library", help="also check the patterns listed in a filenames file, like the GUI's")
+    validate.add_argument("--report", help="JSON file the structured report is written to")
+
+    convert: argparse.ArgumentParser = commands.add_parser("convert", help="convert to a pattern file or a preview")
+    convert.add_argument("files", nargs="+")
+    convert.add_argument("--to", choices=FORMATS, required=True)
+    convert.add_argument("--output", "-o", help="output directory, next to the input files by default")
+    convert.add_argument("--scale", type=float, default=1, help="preview size relative to the GUI")
+
+    serve: argparse.ArgumentParser = commands.add_parser("serve", help="host a collaboration session on a pattern")
+    serve.add_argument("file")
+    serve.add_argument("--host", default="", help="interface to listen on, all by default")
+    serve.add_argument("--port", type=int, default=COLLAB_PORT)
+    serve.add_argument("--output", "-o", help="pattern file the session is saved to when the server stops")
+    return main_parser
+
+
+def output_path(path: str, output: str | None, extension: str, many: bool) -> str:
+    """
+    :param path: input file
+    :param output: output file or directory
+    :param extension: extension for files in a directory
+    :param many: several input files, so output is a directory
+    :return: output file for path
+    """
+    if output is not None and not many and not os.path.isdir(output):
+        return output
+    name: str = f"{os.path.splitext(os.path.basename(path))[0]}.{extension}"
+    return os.path.join(output if output is not None else os.path.dirname(path), name)
+
+
+def save(path: str, pattern: Pattern, name: str, scale: float = 1, source: str | None = None,
+         layout: str = "custom") -> None:
+    """
+    Writes a pattern as a self-contained pattern file or a preview, by extension
+    :param path: file path
+    :param pattern: pattern
+    :param name: pattern name
+    :param scale: preview size relative to the GUI
+    :param source: input file, which is never overwritten
+    :param layout: layout the groups come from, kept in pattern files
+    :return: None
+    """
+    if source is not None and os.path.abspath(path) == os.path.abspath(source):
+        raise ValueError("the output would overwrite the input, choose another --output")
+    os.makedirs(os.path.dirname(path) or os.curdir, exist_ok=True)
+    extension: str = os.path.splitext(path)[1].lower()
+    width: int = max(round(20 * scale), 1)
+    height: int = max(round(30 * scale), 1)
+    if extension == ".json":
+        write_pattern(path, pattern, None, name, layout=layout)
+    elif extension == ".png":
+        export_png(pattern, path, width, height)
+    elif extension == ".svg":
+        export_svg(pattern, path, width, height)
+    else:
+        export_text(pattern, path)
+
+
+def run(args: argparse.Namespace, path: str) -> tuple[bool, str]:
+    """
+    Runs a command on one file. Called in worker processes
+    :param args: parsed arguments
+    :param path: pattern file
+    :return: success, message
+    """
+    try:
+        meta, pattern = read_pattern(path, BlobStore(args.blobs))
+        many: bool = len(args.files) > 1
+        if args.command == "info":
+            groups: int = sum(1 for i in pattern.groups if i)
+            return True, (f"{meta['name']}: {pattern.rows} rows, {pattern.cols} columns, {pattern.threads} threads, "
+                          f"{groups} groups, {len(pattern.palette)} colors: {' '.join(pattern.palette)}")
+        if args.command == "simulate":
+            colors: list[str] = [i.strip() for i in args.colors.split(",") if i.strip()]
+            threads: list[int] = list(range(pattern.threads))
+            layout: str = meta["layout"]
+            if args.layout == "kumihimo":
+                slots: int = kumihimo_slots(args.kumihimo_threads)
+                if pattern.threads != slots:
+                    return False, f"the kumihimo layout of {args.kumihimo_threads} threads needs {slots} thread slots"
+                pattern.set_groups(kumihimo_groups(pattern, args.kumihimo_threads))
+                threads = kumihimo_threads(args.kumihimo_threads)
+                layout = "kumihimo"
+            for k, n in enumerate(threads):
+                pattern.fill_thread(n, colors[k % len(colors)])
+            out: str = output_path(path, args.output, "json", many)
+            save(out, pattern, meta["name"], source=path, layout=layout)
+            return True, f"wrote {out}"
+        out = output_path(path, args.output, args.to, True)  # --output is always a directory for convert
+        save(out, pattern, meta["name"], args.scale, path, meta["layout"])
+        return True, f"wrote {out}"
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return False, str(e)
+
+
+def serve(args: argparse.Namespace) -> int:
+    """
+    Hosts a collaboration session until interrupted
+    :param args: parsed arguments
+    :return: exit code
+    """
+    try:
+        meta, pattern = read_pattern(args.file, BlobStore(args.blobs))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"{args.file}: {e}", file=sys.stderr)
+        return 1
+    server: Server = Server(pattern)
+    print(f"{args.file}: serving on port {args.port}, Ctrl+C to stop")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"{args.file}: {e}", file=sys.stderr)
+        return 1
+    if args.output is not None:
+        try:
+            save(args.output, server.hub.pattern, meta["name"], source=args.file, layout=meta["layout"])
+        except (OSError, ValueError) as e:
+            print(f"{args.file}: {e}", file=sys.stderr)
+            return 1
+        print(f"{args.file}: wrote {args.output}")
+    return 0
+
+
+def validate(args: argparse.Namespace) -> int:
+    """
+    Validates pattern files and the library in parallel, printing a line per file
+    :param args: parsed arguments
+    :return: exit code, 1 if any file has problems
+    """
+    paths: list[str] = list(args.files)
+    if args.library is not None:
+        paths += read_filenames(args.library, os.path.dirname(args.library))
+    reports: list[Report] = validate_files(paths, args.blobs, args.jobs)
+    for report in reports:
+        print(f"{report.path}: {'; '.join(i.message for i in report.problems) or 'ok'}",
+              file=sys.stderr if report.problems else sys.stdout)
+    if args.report is not None:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary(reports), f, indent=1)
+    return int(any(i.problems for i in reports))
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Runs the command line interface
+    :param argv: arguments, sys.argv by default
+    :return: exit code, 1 if any file failed
+    """
+    args: argparse.Namespace = parser().parse_args(argv)
+    if args.command == "serve":
+        return serve(args)
+    if args.command == "validate":
+        return validate(args)
+    if args.jobs > 1 and len(args.files) > 1:
+        with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+            results: typing.Iterable[tuple[bool, str]] = list(executor.map(run, [args] * len(args.files), args.files))
+    else:
+        results = [run(args, i) for i in args.files]
+    failed: bool = False
+    for path, (ok, message) in zip(args.files, results):
+        print(f"{path}: {message}", file=sys.stdout if ok else sys.stderr)
+        failed = failed or not ok
+    return int(failed)
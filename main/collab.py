@@ -0,0 +1,445 @@
+"""
+Editing one pattern together on a LAN. A server holds the canonical pattern and broadcasts compact binary changes
+to every client, coalesced in batches per tick. Hub and Client don't do any I/O, Server and Connection run them
+on asyncio, Loopback connects them in one process for testing. Does not use tkinter
+"""
+import asyncio
+import json
+import queue
+import struct
+import threading
+import typing
+import zlib
+
+from pattern import Change, Pattern, color_to_rgb
+
+COLLAB_PORT: int = 47800
+COLLAB_TICK: float = 0.02  # seconds of changes coalesced into one batch
+MAX_SNAPSHOT: int = 64 << 20  # bytes of a snapshot, compressed and uncompressed, so a peer can't exhaust memory
+MAX_SNAPSHOT_CELLS: int = 1 << 22  # rows * columns of a snapshot, checked before the pattern is allocated
+FILL: bytes = b"F"  # thread and its group
+THREAD: bytes = b"T"  # thread only
+CELL: bytes = b"C"
+SNAPSHOT: bytes = b"S"  # whole pattern, for changes that aren't colors
+MESSAGES: dict[bytes, struct.Struct] = {FILL: struct.Struct(">H3s"), THREAD: struct.Struct(">H3s"),
+                                        CELL: struct.Struct(">I3s"), SNAPSHOT: struct.Struct(">I")}
+
+
+def encode_snapshot(pattern: Pattern) -> bytes:
+    """
+    :param pattern: pattern
+    :return: snapshot message with the compressed pattern
+    """
+    data: bytes = zlib.compress(pattern.canonical_json())
+    return SNAPSHOT + MESSAGES[SNAPSHOT].pack(len(data)) + data
+
+
+def decode_snapshot(data: bytes) -> Pattern:
+    """
+    Decodes a snapshot from a peer. Anything Pattern.from_dict can't build a consistent pattern from raises
+    ValueError, so a client can't put the hub into a state later changes fail on
+    :param data: compressed pattern from a snapshot message
+    :return: pattern
+    """
+    decompressor: typing.Any = zlib.decompressobj()
+    text: bytes = decompressor.decompress(data, MAX_SNAPSHOT)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Snapshot larger than {MAX_SNAPSHOT} bytes")
+    pattern: typing.Any = json.loads(text)
+    try:
+        cells: int = int(pattern["rows"]) * int(pattern["cols"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Malformed snapshot: {e!r}") from e
+    if cells > MAX_SNAPSHOT_CELLS:
+        raise ValueError(f"Snapshot of {cells} cells, at most {MAX_SNAPSHOT_CELLS} are accepted")
+    return Pattern.from_dict(pattern)
+
+
+def encode_change(pattern: Pattern, change: Change) -> bytes:
+    """
+    Encodes a change of a pattern. Colors are sent as RGB, palette indices differ between clients
+    :param pattern: changed pattern
+    :param change: change from the pattern
+    :return: messages
+    """
+    def rgb(index: int) -> bytes:
+        return bytes(color_to_rgb(pattern.palette[index]) or (0, 0, 0))
+
+    if change.kind == "fill":
+        return FILL + MESSAGES[FILL].pack(change.index, rgb(change.color))
+    if change.kind == "thread":
+        return THREAD + MESSAGES[THREAD].pack(change.index, rgb(change.color))
+    if change.kind == "cell":
+        return CELL + MESSAGES[CELL].pack(change.index, rgb(change.color))
+    if change.kind == "fill_threads":  # groups don't overlap, so the order of the threads doesn't matter
+        return b"".join(FILL + MESSAGES[FILL].pack(n, rgb(index)) for index, threads in change.filled.items()
+                        for n in threads)
+    return encode_snapshot(pattern)
+
+
+def decode(data: bytes) -> typing.Iterator[tuple[bytes, int, bytes]]:
+    """
+    Generator over the messages in data
+    :param data: messages
+    :return: kind, thread or cell index and RGB color; for a snapshot kind, -1 and the compressed pattern
+    """
+    position: int = 0
+    while position < len(data):
+        kind: bytes = data[position:position + 1]
+        if kind not in MESSAGES:
+            raise ValueError(f"Unknown message {kind!r}")
+        fields: tuple[typing.Any, ...] = MESSAGES[kind].unpack_from(data, position + 1)
+        position += 1 + MESSAGES[kind].size
+        if kind == SNAPSHOT:
+            yield kind, -1, data[position:position + fields[0]]
+            position += fields[0]
+        else:
+            yield kind, fields[0], fields[1]
+
+
+def apply(pattern: Pattern, kind: bytes, index: int, rgb: bytes) -> bool:
+    """
+    Applies a color message to a pattern
+    :param pattern: pattern
+    :param kind: FILL, THREAD or CELL
+    :param index: thread or cell index
+    :param rgb: color
+    :return: whether the index exists
+    """
+    color: tuple[int, int, int] = (rgb[0], rgb[1], rgb[2])
+    if kind == CELL:
+        if index >= pattern.cell_count:
+            return False
+        pattern.set_cell(index, color)
+    elif index >= pattern.threads:
+        return False
+    elif kind == FILL:
+        pattern.fill_thread(index, color)
+    else:
+        pattern.set_thread(index, color)
+    return True
+
+
+async def read_message(reader: asyncio.StreamReader) -> bytes:
+    """
+    Reads one whole message from a stream
+    :param reader: stream
+    :return: message
+    """
+    kind: bytes = await reader.readexactly(1)
+    if kind not in MESSAGES:
+        raise ValueError(f"Unknown message {kind!r}")
+    fields: bytes = await reader.readexactly(MESSAGES[kind].size)
+    if kind == SNAPSHOT:
+        size: int = MESSAGES[kind].unpack(fields)[0]
+        if size > MAX_SNAPSHOT:
+            raise ValueError(f"Snapshot of {size} bytes, at most {MAX_SNAPSHOT} are accepted")
+        fields += await reader.readexactly(size)
+    return kind + fields
+
+
+class Hub:
+    """
+    Server side: the canonical pattern and the changes received since the last tick
+    """
+    def __init__(self, pattern: Pattern) -> None:
+        """
+        Construct the hub
+        :param pattern: canonical pattern, owned by the hub
+        """
+        self.pattern: Pattern = pattern
+        self.pending: dict[tuple[bytes, int], bytes] = {}  # (kind, index): color, ordered by the last change
+        self.snapshot: bool = False  # whether a client replaced the pattern since the last tick
+
+    def receive(self, data: bytes) -> None:
+        """
+        Queues messages from a client. A later change of the same thread or cell replaces an earlier one
+        :param data: messages
+        :return: None
+        """
+        for kind, index, value in decode(data):
+            if kind == SNAPSHOT:
+                self.pattern = decode_snapshot(value)
+                self.pending.clear()
+                self.snapshot = True
+                continue
+            self.pending.pop((kind, index), None)  # moves the change after the ones it overrides
+            self.pending[(kind, index)] = value
+
+    def tick(self) -> bytes:
+        """
+        Applies the queued changes to the canonical pattern
+        :return: messages to broadcast, empty if nothing changed
+        """
+        messages: list[bytes] = [encode_snapshot(self.pattern)] if self.snapshot else []
+        self.snapshot = False
+        pending: dict[tuple[bytes, int], bytes] = self.pending
+        self.pending = {}  # dropped even if a change fails, so it isn't retried every tick
+        for (kind, index), rgb in pending.items():
+            if apply(self.pattern, kind, index, rgb):
+                messages.append(kind + MESSAGES[kind].pack(index, rgb))
+        return b"".join(messages)
+
+
+class Client:
+    """
+    Client side: sends the changes of a local pattern and applies the remote ones. Remote changes go through
+    the pattern like local edits, so its views update them the same way
+    """
+    def __init__(self, pattern: Pattern, send: typing.Callable[[bytes], typing.Any]) -> None:
+        """
+        Starts sending the changes of pattern
+        :param pattern: local pattern
+        :param send: sends messages to the server
+        """
+        self.pattern: Pattern = pattern
+        self.send: typing.Callable[[bytes], typing.Any] = send
+        self._applying: bool = False  # whether the changes come from the server
+        pattern.subscribe(self.on_change)
+
+    def on_change(self, change: Change) -> None:
+        """
+        Sends a local change
+        :param change: change from the pattern
+        :return: None
+        """
+        if not self._applying:
+            self.send(encode_change(self.pattern, change))
+
+    def receive(self, data: bytes) -> None:
+        """
+        Applies messages from the server
+        :param data: messages
+        :return: None
+        """
+        self._applying = True
+        try:
+            for kind, index, value in decode(data):
+                if kind == SNAPSHOT:
+                    self.pattern.replace(decode_snapshot(value))
+                else:
+                    apply(self.pattern, kind, index, value)
+        finally:
+            self._applying = False
+
+    def close(self) -> None:
+        """
+        Stops sending changes
+        :return: None
+        """
+        self.pattern.unsubscribe(self.on_change)
+
+
+class Loopback:
+    """
+    Hub and clients in one process, without sockets or asyncio. Call tick to deliver the changes
+    """
+    def __init__(self, pattern: Pattern) -> None:
+        """
+        Construct the loopback
+        :param pattern: canonical pattern, a copy is kept
+        """
+        self.hub: Hub = Hub(Pattern.from_dict(pattern.to_dict()))
+        self.clients: list[Client] = []
+
+    def connect(self, pattern: Pattern) -> Client:
+        """
+        Connects a client, which gets the canonical pattern
+        :param pattern: local pattern of the client
+        :return: client
+        """
+        client: Client = Client(pattern, self.hub.receive)
+        client.receive(encode_snapshot(self.hub.pattern))
+        self.clients.append(client)
+        return client
+
+    def tick(self) -> bytes:
+        """
+        Applies the queued changes and broadcasts them
+        :return: broadcast messages
+        """
+        data: bytes = self.hub.tick()
+        if data:
+            for client in self.clients:
+                client.receive(data)
+        return data
+
+
+class Server:
+    """
+    Hub on asyncio: accepts clients, sends them the canonical pattern and broadcasts a batch every tick
+    """
+    def __init__(self, pattern: Pattern, tick: float = COLLAB_TICK) -> None:
+        """
+        Construct the server
+        :param pattern: canonical pattern, a copy is kept
+        :param tick: seconds of changes coalesced into one batch
+        """
+        self.hub: Hub = Hub(Pattern.from_dict(pattern.to_dict()))
+        self.tick: float = tick
+        self.writers: set[asyncio.StreamWriter] = set()
+        self._server: asyncio.Server | None = None
+        self._ticker: asyncio.Task | None = None  # broadcasts every tick
+        self._handlers: set[asyncio.Task] = set()  # serve the clients
+
+    async def start(self, host: str = "", port: int = COLLAB_PORT) -> None:
+        """
+        Starts listening
+        :param host: interface, all by default
+        :param port: port
+        :return: None
+        """
+        self._server = await asyncio.start_server(self._handle, host or None, port)
+        self._ticker = asyncio.ensure_future(self._broadcast())
+
+    async def serve(self, host: str = "", port: int = COLLAB_PORT) -> None:
+        """
+        Serves until cancelled
+        :param host: interface, all by default
+        :param port: port
+        :return: None
+        """
+        await self.start(host, port)
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """
+        Stops the server and disconnects the clients
+        :return: None
+        """
+        if self._server is not None:
+            self._server.close()
+            self._ticker.cancel()
+        for writer in self.writers:  # the handlers end when their connections do
+            writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _broadcast(self) -> None:
+        """
+        Sends the batch of every tick to every client
+        Not intended for use outside the class
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                data: bytes = self.hub.tick()
+            except (IndexError, KeyError, TypeError, ValueError, struct.error):  # one bad batch must not end the loop
+                continue
+            if data:
+                for writer in self.writers:
+                    writer.write(data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves one client
+        Not intended for use outside the class
+        :param reader: stream from the client
+        :param writer: stream to the client
+        :return: None
+        """
+        task: asyncio.Task = asyncio.current_task()
+        self._handlers.add(task)
+        writer.write(encode_snapshot(self.hub.pattern))
+        self.writers.add(writer)
+        try:
+            while True:
+                self.hub.receive(await read_message(reader))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, IndexError, KeyError, TypeError, zlib.error):
+            pass  # the client left or sent a broken message, it is disconnected
+        finally:
+            self.writers.discard(writer)
+            self._handlers.discard(task)
+            writer.close()
+
+
+class Connection:
+    """
+    Client connected to a server, on an asyncio loop in a background thread. Received messages wait until poll
+    applies them on the caller's thread, which for a view is the tkinter one
+    """
+    def __init__(self, pattern: Pattern, host: str, port: int = COLLAB_PORT, server: Server | None = None) -> None:
+        """
+        Connects in the background
+        :param pattern: local pattern, replaced by the canonical one when connected
+        :param host: server address
+        :param port: server port
+        :param server: server to start on the same loop first, to host the pattern
+        """
+        self.client: Client = Client(pattern, self.send)
+        self.received: queue.Queue[bytes] = queue.Queue()
+        self.error: str | None = None  # why the connection ended
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self._writer: asyncio.StreamWriter | None = None
+        self._unsent: list[bytes] = []  # changes made before the connection was open
+        self._task: asyncio.Task = self.loop.create_task(self._run(host, port, server))
+        threading.Thread(target=self.loop.run_until_complete, args=(self._task,), name="collab", daemon=True).start()
+
+    def send(self, data: bytes) -> None:
+        """
+        Sends messages to the server. Thread-safe
+        :param data: messages
+        :return: None
+        """
+        self.loop.call_soon_threadsafe(self._write, data)
+
+    def poll(self) -> bool:
+        """
+        Applies the received messages to the pattern
+        :return: whether the connection is still open
+        """
+        while not self.received.empty():
+            self.client.receive(self.received.get_nowait())
+        return self.error is None
+
+    def close(self) -> None:
+        """
+        Disconnects, and stops the server if there is one
+        :return: None
+        """
+        self.client.close()
+        self.loop.call_soon_threadsafe(self._task.cancel)
+
+    def _write(self, data: bytes) -> None:
+        """
+        Writes to the server, or keeps data until connected. Runs on the loop
+        Not intended for use outside the class
+        :param data: messages
+        :return: None
+        """
+        if self._writer is None:
+            self._unsent.append(data)
+        else:
+            self._writer.write(data)
+
+    async def _run(self, host: str, port: int, server: Server | None) -> None:
+        """
+        Connects and reads messages until the connection ends
+        Not intended for use outside the class
+        :param host: server address
+        :param port: server port
+        :param server: server to start first
+        :return: None
+        """
+        try:
+            if server is not None:
+                await server.start(host, port)
+            reader, self._writer = await asyncio.open_connection(host or "127.0.0.1", port)
+            self._writer.write(b"".join(self._unsent))
+            self._unsent.clear()
+            while True:
+                self.received.put(await read_message(reader))
+        except asyncio.CancelledError:  # closed
+            self.error = "Disconnected"
+        except asyncio.IncompleteReadError:
+            self.error = "The server closed the connection"
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            if server is not None:
+                await server.close()
@@ -0,0 +1,129 @@
+"""
+Image to pattern converter: resamples an image to the rhombus lattice, quantizes it to a few thread colors and
+maps every cell to the nearest one. Does not use tkinter, PIL and NumPy are imported on first use
+"""
+import typing
+
+from export import EXPORT_HEIGHT, EXPORT_WIDTH
+from pattern import DisjointSet, Palette, Pattern, normalize_color
+
+if typing.TYPE_CHECKING:
+    import numpy
+
+IMAGE_BACKGROUND: str = "#ffffff"  # transparent pixels are drawn over this color
+
+
+class Conversion(typing.NamedTuple):
+    """
+    Result of convert_image
+    """
+    pattern: Pattern  # closest pattern the thread groups can make
+    conflicts: list[int]  # cells whose color differs from their nearest color, because of the groups
+    error: float  # mean RGB distance between the cells and the image
+
+
+def fit_rows(path: str, cols: int, cell_width: int = EXPORT_WIDTH, cell_height: int = EXPORT_HEIGHT) -> int:
+    """
+    Number of rows that keeps the aspect ratio of an image. Reads only the image header
+    :param path: image file
+    :param cols: grid columns
+    :param cell_width: half-width of a cell
+    :param cell_height: half-height of a cell
+    :return: grid rows
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        width, height = image.size
+    return max(round((height / width * 2 * max(cols - 1, 1) * cell_width / cell_height + 1) / 2), 1)
+
+
+def sample_cells(path: str, rows: int, cols: int) -> "numpy.ndarray":
+    """
+    Resamples an image to the rhombus lattice: one averaged pixel per cell center, stretching the image to the grid
+    :param path: image file
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: RGB of every cell in cell index order, float32 array of shape (cells, 3)
+    """
+    import numpy
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image = image.convert("RGBA")
+        image = Image.alpha_composite(Image.new("RGBA", image.size, IMAGE_BACKGROUND), image).convert("RGB")
+        # one pixel per point of the doubled lattice: outer cells at even, inner cells at odd coordinates
+        lattice: numpy.ndarray = numpy.asarray(image.resize((max(2 * cols - 1, 1), 2 * rows), Image.Resampling.BOX),
+                                               dtype=numpy.float32)
+    return numpy.concatenate((lattice[0::2, 0::2].reshape(-1, 3), lattice[1::2, 1::2].reshape(-1, 3)))
+
+
+def quantize_cells(cells: "numpy.ndarray", colors: int) -> "numpy.ndarray":
+    """
+    Chooses a few colors that represent the cells, with median cut
+    :param cells: RGB of the cells, from sample_cells
+    :param colors: maximum number of colors, at most 256
+    :return: RGB of the colors, float32 array of shape (colors, 3)
+    """
+    import numpy
+    from PIL import Image
+
+    strip: Image.Image = Image.fromarray(cells.round().astype(numpy.uint8).reshape(1, -1, 3))
+    quantized: Image.Image = strip.quantize(colors=colors, method=Image.Quantize.MEDIANCUT)
+    used: numpy.ndarray = numpy.unique(numpy.asarray(quantized))
+    return numpy.array(quantized.getpalette(), dtype=numpy.float32).reshape(-1, 3)[used]
+
+
+def nearest_colors(cells: "numpy.ndarray", palette: "numpy.ndarray") -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """
+    Maps every cell to the nearest palette color
+    :param cells: RGB of the cells, shape (cells, 3)
+    :param palette: RGB of the colors, shape (colors, 3)
+    :return: squared distance from every cell to every color, shape (cells, colors), and the nearest color indices
+    """
+    distances: numpy.ndarray = ((cells[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+    return distances, distances.argmin(axis=1)
+
+
+def convert_image(path: str, template: Pattern, colors: int, tolerance: float = 0) -> Conversion:
+    """
+    Converts an image to a pattern with the grid and groups of a template. Cells and threads in overlapping groups
+    are joined like in solver.solve, and every joined set takes the color closest to all its cells.
+    Threads without cells keep the first color, cells without threads take their nearest color
+    :param path: image file
+    :param template: pattern with the rows, columns, threads and groups to use
+    :param colors: maximum number of colors
+    :param tolerance: palette tolerance of the new pattern
+    :return: closest achievable pattern, conflicting cells and the mean error
+    """
+    import numpy
+
+    cells: numpy.ndarray = sample_cells(path, template.rows, template.cols)
+    palette: numpy.ndarray = quantize_cells(cells, min(colors, 256))
+    distances, nearest = nearest_colors(cells, palette)
+
+    count: int = template.cell_count
+    sets: DisjointSet = DisjointSet(count + template.threads)  # cells, then threads
+    for n, group in enumerate(template.groups):
+        for i in group:
+            sets.union(count + n, i)
+    roots: numpy.ndarray = numpy.array([sets.find(i) if template.cell_threads[i] >= 0 else -1 for i in range(count)],
+                                       dtype=numpy.int64)
+    grouped: numpy.ndarray = roots >= 0
+    keys, inverse = numpy.unique(roots[grouped], return_inverse=True)
+    costs: numpy.ndarray = numpy.zeros((len(keys), len(palette)), dtype=numpy.float64)
+    numpy.add.at(costs, inverse, distances[grouped])
+    choice: numpy.ndarray = costs.argmin(axis=1)
+    achievable: numpy.ndarray = nearest.copy()
+    achievable[grouped] = choice[inverse]
+
+    pattern: Pattern = Pattern(template.rows, template.cols, template.threads,
+                               Palette((normalize_color(tuple(int(j) for j in i)) for i in palette), tolerance))
+    pattern.set_groups([list(i) for i in template.groups])
+    pattern.cell_colors[:] = achievable.astype(numpy.uint8).tobytes()
+    set_colors: dict[int, int] = dict(zip(keys.tolist(), choice.tolist()))
+    for n in range(template.threads):
+        pattern.thread_colors[n] = set_colors.get(sets.find(count + n), 0)
+    conflicts: list[int] = numpy.flatnonzero(achievable != nearest).tolist()
+    error: float = float(numpy.sqrt(distances[numpy.arange(count), achievable]).mean()) if count else 0
+    return Conversion(pattern, conflicts, error)
@@ -1,22 +1,54 @@
-﻿from tkinter import *
+﻿from __future__ import annotations  # PIL types in annotations without importing PIL
+
+import sys
+
+if __name__ == "__main__" and len(sys.argv) > 1:  # command line interface, runs without tkinter and PIL
+    from cli import main
+    sys.exit(main())
+
+from tkinter import *
 import tkinter as tk
-from tkinter import colorchooser, messagebox, filedialog
-from tkinter.ttk import Radiobutton, Notebook, Entry, Separator, Button, Style, Combobox
-from PIL import Image, ImageTk
-import PIL.ImageFile
-import math
+from tkinter import colorchooser, messagebox, filedialog, simpledialog
+from tkinter.ttk import Notebook, Entry, Separator, Button, Style, Combobox, Checkbutton
+import collections
+import concurrent.futures
 import os
+import time
 import typing
 
+from autosave import Autosave, Journal, replay_journal
+from collab import COLLAB_PORT, Connection, Server
+from converter import Conversion, convert_image, fit_rows
+from diff import Diff, Merge, diff, merge
+from export import RASTER_BACKGROUND, export, raster, raster_palette, raster_size
+from geometry import DIAMOND_HEIGHT, DIAMOND_WIDTH, GRID_OFFSET, SHADOW_OFFSET, SMALL_CIRCLE_RADIUS, Layout, layout
+from layouts import KUMIHIMO_THREADS, kumihimo_cells, kumihimo_groups, kumihimo_slots, kumihimo_threads
+from library import Entry as LibraryEntry, Library, read_pattern, write_pattern
+from pattern import Change, GroupBuilder, Palette, Pattern
+from presets import PRESETS, from_image
+from solver import solve
+from symmetry import SYMMETRIES, grid_partners, ring_partners
+from validation import MAX_THREADS, Problem, validate
+
+if typing.TYPE_CHECKING:  # PIL is imported on first use, it is slow to import
+    from PIL import Image, ImageTk
+    import PIL.ImageFile
+
 # Constants
-DIAMOND_WIDTH: int = 20
-DIAMOND_HEIGHT: int = 30
-SMALL_CIRCLE_RADIUS: int = 12
-BIG_CIRCLE_RADIUS: int = 150
 ICON_HEIGHT: int = 24
 TAB_ICON_HEIGHT: int = 12
 BUTTON_ICON_HEIGHT: int = 15
-SHADOW_OFFSET: int = 10
+UPDATE_DELAY: int = 300  # ms to wait for more keystrokes before rebuilding the grid
+COLOR_TOLERANCE: float = 8  # colors closer than this in RGB space share a palette entry
+ZOOM_LEVELS: tuple[float, ...] = (0.25, 0.5, 0.75, 1, 1.5, 2)  # rhombus size relative to DIAMOND_WIDTH/HEIGHT
+BITMAP_ZOOM: float = 0.5  # at this zoom and below the grid is drawn as one bitmap instead of a polygon per rhombus
+RASTER_BUDGET: float = 0.1  # s a grid may take to draw as polygons, bigger grids are drawn as a bitmap at every zoom
+RASTER_CELLS: int = 3000  # bitmap threshold until drawing polygons has been timed, see Custom.raster_cells
+RASTER_SAMPLE: int = 500  # fewest rhombuses of a timed polygon draw, smaller ones are mostly overhead
+IMAGE_PRESET: str = "From image..."  # preset with colors sampled from an image the user chooses
+SESSION_POLL: int = 20  # ms between applying the changes of a collaboration session
+CHECK_POLL: int = 50  # ms between looking for the result of a pattern check
+COLORBUTTON_CACHE_SIZE: int = 64  # color button images kept for reuse, buttons keep their own image alive
 
 # Files
 directory: str = "Custom"
@@ -27,20 +59,31 @@ edit_path: str = f"{directory}/edit.png"
 plus_path: str = f"{directory}/plus.png"
 delete_path: str = f"{directory}/delete.png"
 filenames_path: str = f"{directory}/filenames.txt"
+index_path: str = f"{directory}/index.sqlite3"
+blobs_path: str = f"{directory}/blobs"
+autosave_path: str = f"{directory}/autosave"
 
 
 _all_icons: dict[tuple[str, bool], ImageTk.PhotoImage] = {}  # otherwise icons from geticon() get garbage-collected
+_pending_icons: dict[tuple[str, bool], PIL.ImageFile.ImageFile] = {}  # lazy icons from geticon() not decoded yet
 
 
-def geticon(icon_path: str, is_tab: bool = False, height: int | None = None) -> ImageTk.PhotoImage:
+def geticon(icon_path: str, is_tab: bool = False, height: int | None = None, lazy: bool = False
+            ) -> ImageTk.PhotoImage:
     """
     Makes a PhotoImage to use as an icon
     :param icon_path: path to icon
     :param is_tab: smaller icon size to use as a Notebook tab image
     :param height: icon height (overrides is_tab)
+    :param lazy: only read the icon size, the icon is blank until preload_icons() or a geticon() call that isn't lazy.
+    For icons that are not visible yet
     :return: PhotoImage to use as an icon
     """
+    from PIL import Image, ImageTk
+
     if _all_icons.get((icon_path, is_tab), None) is not None:
+        if not lazy and (icon_path, is_tab) in _pending_icons:
+            _decode_icon((icon_path, is_tab))
         return _all_icons[(icon_path, is_tab)]
 
     if height is None:
@@ -49,20 +92,118 @@ def geticon(icon_path: str, is_tab: bool = False, height: int | None = None) ->
         else:
             height: int = ICON_HEIGHT
 
-    icon: PIL.ImageFile.ImageFile = Image.open(icon_path)
-    icon_ratio: float = icon.width / icon.height
-    icon: Image.Image = icon.resize((int(height * icon_ratio), height), Image.Resampling.LANCZOS)
-    icon: ImageTk.PhotoImage = ImageTk.PhotoImage(icon)
+    icon: PIL.ImageFile.ImageFile = Image.open(icon_path)  # reads only the header, pixels are decoded on first use
+    size: tuple[int, int] = (int(height * icon.width / icon.height), height)
+    if lazy:
+        _all_icons[(icon_path, is_tab)] = ImageTk.PhotoImage("RGBA", size)
+        _pending_icons[(icon_path, is_tab)] = icon
+        return _all_icons[(icon_path, is_tab)]
+    icon: ImageTk.PhotoImage = ImageTk.PhotoImage(icon.resize(size, Image.Resampling.LANCZOS))
     _all_icons[(icon_path, is_tab)] = icon  # prevent garbage collection
     return icon
 
 
+def _decode_icon(key: tuple[str, bool]) -> None:
+    """
+    Decodes a lazy icon into its PhotoImage
+    Not intended for use outside the module
+    :param key: icon path and is_tab
+    :return: None
+    """
+    from PIL import Image
+
+    icon: PIL.ImageFile.ImageFile = _pending_icons.pop(key)
+    photo: ImageTk.PhotoImage = _all_icons[key]
+    photo.paste(icon.convert("RGBA").resize((photo.width(), photo.height()), Image.Resampling.LANCZOS))
+
+
+def preload_icons() -> None:
+    """
+    Decodes all lazy icons. Call it when idle
+    :return: None
+    """
+    while _pending_icons:
+        _decode_icon(next(iter(_pending_icons)))
+
+
+def retag_palette(canvas: Canvas, tag_or_id: str | int, old: typing.Iterable[int], new: int) -> None:
+    """
+    Moves canvas items from their "pal:<index>" tags to "pal:<new>", so recoloring a palette entry stays one itemconfig
+    :param canvas: canvas with the items
+    :param tag_or_id: items to retag
+    :param old: palette indices the items had
+    :param new: new palette index
+    :return: None
+    """
+    for i in old:
+        if i != new:
+            canvas.dtag(tag_or_id, f"pal:{i}")
+    canvas.addtag_withtag(f"pal:{new}", tag_or_id)
+
+
+def fill_canvas_threads(canvas: Canvas, pattern: Pattern, filled: dict[int, list[int]], old: set[int],
+                        cell_items: list[int]) -> None:
+    """
+    Shows Pattern.fill_threads on a canvas with a few commands per palette index instead of per thread,
+    finding circles and rhombuses by their thread tags
+    :param canvas: canvas with the items
+    :param pattern: pattern after fill_threads
+    :param filled: threads filled with each palette index, from fill_threads
+    :param old: palette indices the items had, from fill_threads
+    :param cell_items: canvas item of every cell, 0 if it has none
+    :return: None
+    """
+    if not filled:
+        return
+    threads: list[int] = [n for i in filled.values() for n in i]
+    every: str = "||".join(f"thread:{n}" for n in threads)
+    for i in old:
+        canvas.dtag(every, f"pal:{i}")
+    for index, ns in filled.items():
+        some: str = "||".join(f"thread:{n}" for n in ns)
+        canvas.addtag_withtag(f"pal:{index}", some)
+        canvas.itemconfig(some, fill=pattern.palette[index])
+    seen: set[int] = set()
+    shared: set[int] = set()
+    for n in threads:
+        shared.update(i for i in pattern.groups[n] if i in seen)
+        seen.update(pattern.groups[n])
+    for i in shared:  # rhombuses in several filled groups, they have the color of the last one
+        if cell_items[i]:
+            retag_palette(canvas, cell_items[i], filled, pattern.cell_colors[i])
+            canvas.itemconfig(cell_items[i], fill=pattern.palette[pattern.cell_colors[i]])
+
+
+def preset_colors(name: str, n: int) -> list[str] | None:
+    """
+    Colors of a preset, asking for the image of IMAGE_PRESET
+    :param name: preset name from PRESETS or IMAGE_PRESET
+    :param n: number of colors
+    :return: n colors, None if the user cancels
+    """
+    if name != IMAGE_PRESET:
+        return PRESETS[name](n)
+    path: str = filedialog.askopenfilename(title="Choose image", filetypes=[
+        ("All images", ("*.png", "*.jpg", "*.jpeg", "*.bmp", "*.gif")), ("All files", "*")])
+    if not path:
+        return None
+    try:
+        return from_image(path, n)
+    except OSError as e:
+        messagebox.showerror(title="Preset from image", message=f"Can't read {path}:\n{e}")
+        return None
+
+
 # Custom widgets
 
 class Colorbutton(tk.Button):
     """
     Button widget with a colorpicker
     """
+    _button_img: Image.Image | None = None  # decoded once for all buttons
+    # Button images by color, shared by all buttons, least recently used first
+    _images: collections.OrderedDict[str | tuple[int, int, int], ImageTk.PhotoImage] = collections.OrderedDict()
+
     def __init__(self, master: Misc | None = None, color: str | tuple[int, int, int] = "#ffffff", *args, **kwargs
                  ) -> None:
         """
@@ -72,8 +213,6 @@ class Colorbutton(tk.Button):
         :param args: Button options
         :param kwargs: Button options
         """
-        self._button_img: PIL.ImageFile.ImageFile = Image.open(button_image_path).convert("RGBA")
-
         self.color: str | tuple[int, int, int] = color
         buttonimg: ImageTk.PhotoImage = self._create_button_img(self.color)
         super().__init__(master, image=buttonimg, border=0, relief="sunken", *args, **kwargs)
@@ -92,15 +231,24 @@ class Colorbutton(tk.Button):
 
     def _create_button_img(self, color: str | tuple[int, int, int]) -> ImageTk.PhotoImage:
         """
-        Function that generates a button image with a color
+        Function that generates a button image with a color, or returns the one made before. Only the
+        COLORBUTTON_CACHE_SIZE most recently used images are kept
         Not intended for use ouside widget's class
         :param color: color of the button image
         :return: button image
         """
-        img: Image.Image = self._button_img.copy()
-        color_overlay: Image.Image = Image.new("RGBA", img.size, color)
-        img = Image.alpha_composite(color_overlay, img)
-        return ImageTk.PhotoImage(img)
+        from PIL import Image, ImageTk
+
+        if color in Colorbutton._images:
+            Colorbutton._images.move_to_end(color)
+            return Colorbutton._images[color]
+        if Colorbutton._button_img is None:
+            Colorbutton._button_img = Image.open(button_image_path).convert("RGBA")
+        color_overlay: Image.Image = Image.new("RGBA", Colorbutton._button_img.size, color)
+        Colorbutton._images[color] = ImageTk.PhotoImage(Image.alpha_composite(color_overlay, Colorbutton._button_img))
+        if len(Colorbutton._images) > COLORBUTTON_CACHE_SIZE:
+            Colorbutton._images.popitem(last=False)
+        return Colorbutton._images[color]
 
 
 class Labelentry(LabelFrame):
@@ -249,6 +397,25 @@ class Labelfilechooser(Labelentry):
                 self.command()
 
 
+class Presetchooser(Labelcombobox):
+    """
+    Combobox with thread color presets and a Button to apply the chosen one
+    """
+    def __init__(self, master: Misc | None = None, command: typing.Callable[[str], typing.Any] | None = None,
+                 *args, **kwargs) -> None:
+        """
+        Construct a preset chooser with the parent MASTER.
+        :param master: parent
+        :param command: command called with the preset name when Apply is pressed
+        :param args: Combobox options
+        :param kwargs: Combobox options
+        """
+        super().__init__(master, "Preset", [*PRESETS, IMAGE_PRESET], *args, **kwargs)
+        self.combobox.current(0)
+        self.command: typing.Callable[[str], typing.Any] | None = command
+        Button(self, text="Apply", command=lambda: self.command(self.combobox.get()) if self.command else None).pack()
+
+
 # Works, but will be removed after Custom class is complete. Will not be documented.
 class Kumihimo(Frame):
     """
@@ -264,11 +431,13 @@ class Kumihimo(Frame):
         if icon is not None:
             self.icon = geticon(self.icon, True)
 
-        self.circle_radius = BIG_CIRCLE_RADIUS
         self.rows = 7
         self.cols = 5
+        self.threads = 16
+        self.slots = kumihimo_slots(self.threads)
         self.canvas_width = self.canvas_height = 0
         self.calc_size()
+        self.pattern = Pattern(self.rows, self.cols, self.slots, Palette(tolerance=COLOR_TOLERANCE))
 
         self.color = "#ff0000"
         self.alt_color = "#ffffff"
@@ -293,30 +462,35 @@ class Kumihimo(Frame):
         self.threads = self.thread_mode.get()
         thread_frame = Frame(self)
         thread_frame.grid(row=0, column=1, sticky="w", padx=10)
-        Radiobutton(thread_frame, text="16 threads", variable=self.thread_mode, value=16,
-                    command=self.update_circle).pack(anchor="w")
-        Radiobutton(thread_frame, text="8 threads", variable=self.thread_mode, value=8,
-                    command=self.update_circle).pack(anchor="w")
+        thread_chooser = Labelcombobox(thread_frame, text="Threads", values=[str(i) for i in KUMIHIMO_THREADS],
+                                       textvariable=self.thread_mode)
+        thread_chooser.combobox.bind("<<ComboboxSelected>>", lambda event: self.update_circle())
+        thread_chooser.pack(anchor="w")
+        Button(thread_frame, text="Solve threads", command=self.solve_threads).pack(anchor="w")
+        Presetchooser(thread_frame, self.apply_preset).pack(anchor="w")
+        self.symmetryvar = StringVar(value=SYMMETRIES[0])
+        Labelcombobox(thread_frame, text="Symmetry", values=list(SYMMETRIES),
+                      textvariable=self.symmetryvar).pack(anchor="w")
 
         self.canvas = Canvas(self, width=self.canvas_width, height=self.canvas_height, bg="white", highlightthickness=0)
         self.canvas.grid(column=0, row=2, columnspan=2)
 
-        self.diamond_ids = {}  # item_id: (points, cx, cy)
-        self.circle_ids = {}
-        self.circle_colors = {}
-        self.logical_coords = {}  # item_id: (x, y) in logical grid coords
+        self.cell_items = [0] * self.pattern.cell_count  # cell index: item_id
+        self.circle_items = [0] * self.slots  # i: item_id
+        self.update_groups()
         self.draw_grid()
         self.canvas.bind("<Button-1>", self.on_click_left)
         self.canvas.bind("<Button-2>", self.on_middle_click)
         self.canvas.bind("<Button-3>", self.on_click_right)
+        self.canvas.bind("<Control-Button-1>", lambda event: self.paint_diamond(event, self.color))
+        self.canvas.bind("<Control-Button-3>", lambda event: self.paint_diamond(event, self.alt_color))
         self.canvas.bind("<MouseWheel>", lambda event: self.on_scroll(int(event.delta > 0) * 2 - 1))  # Windows
         self.canvas.bind("<Button-4>", lambda event: self.on_scroll(1))  # Linux MouseWheel-Up
         self.canvas.bind("<Button-5>", lambda event: self.on_scroll(-1))  # Linux MouseWheel-Down
 
     def calc_size(self):
-        self.canvas_width = ((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH +
-                             self.circle_radius * 2 + 40 + SHADOW_OFFSET * 2)
-        self.canvas_height = (2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT + SHADOW_OFFSET * 2
+        self.layout = layout(self.rows, self.cols, self.threads, ring=True)
+        self.canvas_width, self.canvas_height = self.layout.width, self.layout.height
 
         try:
             self.toplevel.set_geometry()
@@ -341,181 +515,155 @@ class Kumihimo(Frame):
             self.color = fill_color
             self.colorbtn.set_color(self.color)
 
-    def draw_diamond(self, cx, cy, w, h, logical_coords, delpoints=()):
-        points = [cx, cy - h, cx + w, cy, cx, cy + h, cx - w, cy]
-        for i in sorted(delpoints, reverse=True):
-            points.pop(i * 2)
-            points.pop(i * 2)
-        if len(points) <= 4:
-            points.append(cx)
-            points.append(cy)
-        item = self.canvas.create_polygon(points, fill="white", outline="black")
-        self.diamond_ids[item] = (points, cx, cy)
-        self.logical_coords[item] = logical_coords
+    def draw_diamond(self, index):
+        tags = ("diamond", f"pal:{self.pattern.cell_colors[index]}")
+        if self.pattern.cell_threads[index] >= 0:
+            tags += (f"thread:{self.pattern.cell_threads[index]}",)
+        self.cell_items[index] = self.canvas.create_polygon(list(self.layout.polygon(index)),
+                                                            fill=self.pattern.cell_color(index), outline="black",
+                                                            tags=tags)
 
     def draw_grid(self):
-        offset_x, offset_y = 5, 5
-
-        delpoints = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if row == 0:
-                    delpoints.append(0)
-                if col == 0:
-                    delpoints.append(3)
-                if col == self.cols - 1:
-                    delpoints.append(1)
-                cx = offset_x + col * 2 * DIAMOND_WIDTH
-                cy = offset_y + row * 2 * DIAMOND_HEIGHT
-                self.draw_diamond(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col, row), delpoints)
-                delpoints = []
-
-        for row in range(self.rows):
-            for col in range(self.cols - 1):
-                if row == self.rows - 1:
-                    delpoints.append(2)
-                cx = offset_x + col * 2 * DIAMOND_WIDTH + DIAMOND_WIDTH
-                cy = offset_y + row * 2 * DIAMOND_HEIGHT + DIAMOND_HEIGHT
-                self.draw_diamond(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col + 0.5, row + 0.5), delpoints)
-                delpoints = []
+        self.canvas.delete("diamond")
+        self.cell_items = [0] * self.pattern.cell_count
+        for index in range(self.pattern.cell_count):
+            self.draw_diamond(index)
 
         self.draw_circle_of_circles()
 
     def draw_circle_of_circles(self):
-        for item in list(self.circle_ids):
-            if self.canvas.gettags(item) == ("circle",):
-                self.canvas.delete(item)
-                self.circle_ids.pop(item)
+        self.canvas.delete("circle")
 
-        cx = (2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH + self.circle_radius + 20 + SHADOW_OFFSET
-        cy = ((2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT) // 2 + SHADOW_OFFSET
-
-        shadow_radius = self.circle_radius + SMALL_CIRCLE_RADIUS + SHADOW_OFFSET
+        cx, cy, radius = self.layout.ring
+        shadow_radius = radius + SMALL_CIRCLE_RADIUS + SHADOW_OFFSET
         self.canvas.create_oval(
             cx - shadow_radius, cy - shadow_radius,
             cx + shadow_radius, cy + shadow_radius,
             fill="#eee", outline="", tags="circle"
         )
 
-        mod = 32 / self.threads * 2
-        for i in range(32):
-            if i % mod >= 2:
-                continue
-            angle = 2 * math.pi * (i - 0.5) / 32
-            x = cx + self.circle_radius * math.sin(angle)
-            y = cy - self.circle_radius * math.cos(angle)
+        for i in self.layout.circle_threads:
+            x, y = self.layout.circle(i)
             item = self.canvas.create_oval(
                 x - SMALL_CIRCLE_RADIUS, y - SMALL_CIRCLE_RADIUS,
                 x + SMALL_CIRCLE_RADIUS, y + SMALL_CIRCLE_RADIUS,
-                fill=self.circle_colors.get(i, "white"), outline="black", tags="circle"
+                fill=self.pattern.thread_color(i), outline="black",
+                tags=("circle", f"thread:{i}", f"pal:{self.pattern.thread_colors[i]}")
             )
-            self.circle_ids[item] = (x, y, i)
-            self.circle_colors[i] = self.circle_colors.get(i, "white")
+            self.circle_items[i] = item
 
     def update_circle(self):
         if self.threads != self.thread_mode.get():
             self.threads = self.thread_mode.get()
+            self.slots = kumihimo_slots(self.threads)
+            self.cols = max(5, self.threads // 4 + 1)  # one repeat of the threads wide
+            self.circle_items = [0] * self.slots
 
-            # Reset all diamond fills to white
-            for item_id in self.diamond_ids:
-                self.canvas.itemconfig(item_id, fill="white")
-
-            # Reset circle colors
-            self.circle_colors = {}
+            # Reset all diamond and circle colors
+            self.pattern.resize(self.rows, self.cols, self.slots)
+            self.update_groups()
+            self.calc_size()
 
         # Redraw
-        self.draw_circle_of_circles()
+        self.draw_grid()
+
+    def update_groups(self):
+        self.pattern.set_groups(kumihimo_groups(self.pattern, self.threads))
 
     def redraw_diamonds(self):
-        mod = 32 / self.threads * 2
-        for i in range(32):
-            if i % mod >= 2:
-                continue
-            self.fill_circle(i, self.circle_colors.get(i, "white"))
-
-    def point_inside_polygon(self, x, y, poly):
-        n = len(poly)
-        inside = False
-        p1x, p1y = poly[0], poly[1]
-        xinters = 0
-        for i in range(2, n + 2, 2):
-            p2x, p2y = poly[i % n], poly[(i + 1) % n]
-            if min(p1y, p2y) < y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
+        for i in kumihimo_threads(self.threads):
+            self.fill_circle(i, self.pattern.thread_color(i))
 
     def set_diamond(self, x, y, color):
-        if 0 <= x < self.cols - 0.5 and 0 <= y <= self.rows:
-            self.canvas.itemconfig(
-                list(self.logical_coords.keys())[list(self.logical_coords.values()).index((x, y))], fill=color)
-            return True
-        return False
+        index = self.pattern.cell_index(x, y)
+        if index < 0:
+            return False
+        old = self.pattern.cell_colors[index]
+        new = self.pattern.set_cell(index, color)
+        retag_palette(self.canvas, self.cell_items[index], (old,), new)
+        self.canvas.itemconfig(self.cell_items[index], fill=self.pattern.palette[new])
+        return True
 
     def set_circle(self, n, color):
-        self.canvas.itemconfig([i for i, j in self.circle_ids.items() if j[2] == n][0], fill=color)
-        self.circle_colors[n] = color
+        old = self.pattern.thread_colors[n]
+        new = self.pattern.set_thread(n, color)
+        retag_palette(self.canvas, self.circle_items[n], (old,), new)
+        self.canvas.itemconfig(self.circle_items[n], fill=self.pattern.palette[new])
+
+    def recolor(self, index, color):
+        self.pattern.recolor(index, color)
+        self.canvas.itemconfig(f"pal:{index}", fill=self.pattern.palette[index])
 
     def fill_circle(self, circle, color=None):
         if color:
-            self.set_circle(circle, color)
-        start_x = 3 - math.floor(circle % 16 / (32 / self.threads * 2))
-        shift = math.floor(circle / 16) * 2 + circle % 2
-        start_x = start_x - 0.5 * shift
-        start_y = 0.5 * shift
-        shift = (-0.5 * 4, 0.5 * 4)
-        sh = math.log(self.threads // 4, 2) % 2 * 2 + 1
-        start_shift = (0.5 * (self.threads // 4) - (0.5 * sh), 0.5 * (self.threads // 4) + (0.5 * sh))
-        if self.threads // 4 < 4:
-            start_x -= start_shift[0]
-            start_y -= start_shift[1]
-        diamonds = set()
-        while start_y < self.rows:
-            x = start_x
-            y = start_y
-            while 0 <= x and y < self.rows:
-                diamonds.add((x, y))
-                if color:
-                    self.set_diamond(x, y, color)
-                x += shift[0]
-                y += shift[1]
-            start_x += start_shift[0]
-            start_y += start_shift[1]
-            x = start_x
-            y = start_y
-            while x < self.rows - 0.5 and 0 <= y:
-                start_x, start_y = x, y
-                x += 0.5 * 4
-                y -= 0.5 * 4
-        return diamonds
+            index, old = self.pattern.fill_thread(circle, color)
+            retag_palette(self.canvas, f"thread:{circle}", old, index)
+            self.canvas.itemconfig(f"thread:{circle}", fill=self.pattern.palette[index])
+        return {self.pattern.cell_coords(i) for i in self.pattern.groups[circle]}
+
+    def apply_preset(self, name):
+        slots = kumihimo_threads(self.threads)
+        colors = preset_colors(name, len(slots))
+        if colors is None:
+            return
+        thread_colors = [None] * len(self.circle_items)
+        for i, color in zip(slots, colors):
+            thread_colors[i] = color
+        filled, old = self.pattern.fill_threads(thread_colors)
+        fill_canvas_threads(self.canvas, self.pattern, filled, old, self.cell_items)
+
+    def fill_symmetric(self, circle, color):
+        self.fill_circle(circle, color)
+        for n in ring_partners(self.threads, self.symmetryvar.get())[circle]:
+            self.fill_circle(n, color)
+
+    def circle_diamonds(self, circle):
+        return kumihimo_cells(circle, self.rows, self.cols, self.threads)
+
+    def solve_threads(self):
+        # Thread colors from the drawn diamonds, diamonds that can't be made are outlined red
+        solution = solve(self.pattern)
+        self.canvas.itemconfig("conflict", outline="black", width=1)
+        self.canvas.dtag("conflict")
+        for n, index in enumerate(solution.thread_colors):
+            if index != self.pattern.thread_colors[n]:
+                self.set_circle(n, self.pattern.palette[index])
+        for i in solution.conflicts:
+            self.canvas.addtag_withtag("conflict", self.cell_items[i])
+        self.canvas.itemconfig("conflict", outline="red", width=2)
+        self.canvas.tag_raise("conflict")
+
+    def paint_diamond(self, event, color):
+        index = self.layout.cell_at(event.x, event.y)
+        if index >= 0:
+            self.set_diamond(*self.pattern.cell_coords(index), color)
 
     def get_circle(self, logical_x, logical_y):
-        mod = 32 / self.threads * 2
-        for i in range(32):
-            if i % mod >= 2:
-                continue
-            if (logical_x, logical_y) in self.fill_circle(i):
-                return i
-        raise RuntimeWarning(f"Nothing found: {logical_x}, {logical_y}")
+        index = self.pattern.cell_index(logical_x, logical_y)
+        if index >= 0:
+            return self.pattern.cell_threads[index]
+        return -1
 
     def handle_click(self, event, color):
-        clicked = self.canvas.find_closest(event.x, event.y)
-        if clicked:
-            item_id = clicked[0]
-            if item_id in self.logical_coords:
-                points, _, _ = self.diamond_ids[item_id]
-                if not self.point_inside_polygon(event.x, event.y, points):
-                    return
-                self.fill_circle(self.get_circle(*self.logical_coords[item_id]), color)
-            elif item_id in self.circle_ids:
-                cx, cy, n = self.circle_ids[item_id]
-                dist = math.hypot(event.x - cx, event.y - cy)
-                if dist <= SMALL_CIRCLE_RADIUS:
-                    self.fill_circle(n, color)
+        index = self.layout.cell_at(event.x, event.y)
+        if index >= 0:
+            n = self.get_circle(*self.pattern.cell_coords(index))
+            if n >= 0:
+                self.fill_symmetric(n, color)
+            else:
+                self.mark_unassigned(index)
+            return
+        n = self.layout.circle_at(event.x, event.y)
+        if n >= 0:
+            self.fill_symmetric(n, color)
+
+    def mark_unassigned(self, index):
+        # A rhombus in no group is outlined like an "unassigned" problem in the editor of Custom, instead of filled
+        self.canvas.itemconfig("problem", outline="black", width=1)
+        self.canvas.dtag("problem")
+        self.canvas.addtag_withtag("problem", self.cell_items[index])
+        self.canvas.itemconfig("problem", outline="orange", width=2)
+        self.canvas.tag_raise("problem")
 
     def on_click_left(self, event):
         self.handle_click(event, self.color)
@@ -524,29 +672,15 @@ class Kumihimo(Frame):
         self.handle_click(event, self.alt_color)
 
     def on_middle_click(self, event):
-        clicked = self.canvas.find_closest(event.x, event.y)
-        if not clicked:
-            return
-
-        item_id = clicked[0]
-
         # Check for Shift key — 0x0001 or 0x0004 are commonly used across platforms
         pick_alt = (event.state & 0x0001) != 0 or (event.state & 0x0004) != 0
 
-        if item_id in self.diamond_ids:
-            points, _, _ = self.diamond_ids[item_id]
-            if self.point_inside_polygon(event.x, event.y, points):
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
-
-        elif item_id in self.circle_ids:
-            cx, cy, _ = self.circle_ids[item_id]
-            dist = math.hypot(event.x - cx, event.y - cy)
-            if dist <= SMALL_CIRCLE_RADIUS:
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
+        index = self.layout.cell_at(event.x, event.y)
+        n = self.layout.circle_at(event.x, event.y)
+        if index >= 0:
+            self.set_color(pick_alt, self.pattern.cell_color(index))
+        elif n >= 0:
+            self.set_color(pick_alt, self.pattern.thread_color(n))
 
     def on_scroll(self, scroll):
         pass
@@ -578,6 +712,7 @@ class Flat(Frame):
         self.canvas_width = self.canvas_height = 0
         self.threads = 13
         self.calc_size()
+        self.pattern = Pattern(self.rows, self.cols, self.threads, Palette(tolerance=COLOR_TOLERANCE))
 
         self.color = "#ff0000"
         self.alt_color = "#ffffff"
@@ -610,27 +745,28 @@ class Flat(Frame):
         self.thread_entry.pack(anchor="w")
         self.thread_info = Label(thread_frame, text="")
         self.thread_info.pack(anchor="w")
+        # No Solve threads button: Flat has no thread groups yet, solving would always keep the colors as they are
+        Presetchooser(thread_frame, self.apply_preset).pack(anchor="w")
 
         self.canvas = Canvas(self, width=self.canvas_width, height=self.canvas_height, bg="white", highlightthickness=0)
         self.canvas.grid(column=0, row=2, columnspan=2, sticky="w")
         self.calc_size()
 
-        self.diamond_ids = {}  # item_id: (points, cx, cy)
-        self.circle_ids = {}
-        self.circle_colors = {}
-        self.logical_coords = {}  # item_id: (x, y) in logical grid coords
+        self.cell_items = []  # cell index: item_id
+        self.circle_items = []  # i: item_id
         self.draw_grid()
         self.canvas.bind("<Button-1>", self.on_click_left)
         self.canvas.bind("<Button-2>", self.on_middle_click)
         self.canvas.bind("<Button-3>", self.on_click_right)
+        self.canvas.bind("<Control-Button-1>", lambda event: self.paint_diamond(event, self.color))
+        self.canvas.bind("<Control-Button-3>", lambda event: self.paint_diamond(event, self.alt_color))
         self.canvas.bind("<MouseWheel>", lambda event: self.on_scroll(int(event.delta > 0) * 2 - 1))  # Windows
         self.canvas.bind("<Button-4>", lambda event: self.on_scroll(1))  # Linux MouseWheel-Up
         self.canvas.bind("<Button-5>", lambda event: self.on_scroll(-1))  # Linux MouseWheel-Down
 
     def calc_size(self):
-        self.canvas_width = ((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH +
-                             SMALL_CIRCLE_RADIUS * (self.threads + 1) * 2 + 40 + SHADOW_OFFSET * 2)
-        self.canvas_height = (2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT + SHADOW_OFFSET * 2
+        self.layout = layout(self.rows, self.cols, self.threads)
+        self.canvas_width, self.canvas_height = self.layout.width, self.layout.height
 
         try:
             self.canvas.config(width=self.canvas_width, height=self.canvas_height)
@@ -656,77 +792,35 @@ class Flat(Frame):
             self.color = fill_color
             self.colorbtn.set_color(self.color)
 
-    def draw_diamond(self, cx, cy, w, h, logical_coords, delpoints=()):
-        points = [cx, cy - h, cx + w, cy, cx, cy + h, cx - w, cy]
-        for i in sorted(delpoints, reverse=True):
-            points.pop(i * 2)
-            points.pop(i * 2)
-        if len(points) <= 4:
-            points.append(cx)
-            points.append(cy)
-        item = self.canvas.create_polygon(points, fill="white", outline="black", tags="diamond")
-        self.diamond_ids[item] = (points, cx, cy)
-        self.logical_coords[item] = logical_coords
+    def draw_diamond(self, index):
+        tags = ("diamond", f"pal:{self.pattern.cell_colors[index]}")
+        if self.pattern.cell_threads[index] >= 0:
+            tags += (f"thread:{self.pattern.cell_threads[index]}",)
+        self.cell_items[index] = self.canvas.create_polygon(list(self.layout.polygon(index)),
+                                                            fill=self.pattern.cell_color(index), outline="black",
+                                                            tags=tags)
 
     def draw_grid(self):
-        for item in list(self.diamond_ids.keys()):
-            if self.canvas.gettags(item) == ("diamond",):
-                self.canvas.delete(item)
-                self.diamond_ids.pop(item)
-
-        offset_x, offset_y = 5, 5
-
-        delpoints = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if row == 0:
-                    delpoints.append(0)
-                if col == 0:
-                    delpoints.append(3)
-                if col == self.cols - 1:
-                    delpoints.append(1)
-                cx = offset_x + col * 2 * DIAMOND_WIDTH
-                cy = offset_y + row * 2 * DIAMOND_HEIGHT
-                self.draw_diamond(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col, row), delpoints)
-                delpoints = []
-
-        for row in range(self.rows):
-            for col in range(self.cols - 1):
-                if row == self.rows - 1:
-                    delpoints.append(2)
-                cx = offset_x + col * 2 * DIAMOND_WIDTH + DIAMOND_WIDTH
-                cy = offset_y + row * 2 * DIAMOND_HEIGHT + DIAMOND_HEIGHT
-                self.draw_diamond(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col + 0.5, row + 0.5), delpoints)
-                delpoints = []
+        self.canvas.delete("diamond")
+        self.cell_items = [0] * self.pattern.cell_count
+        for index in range(self.pattern.cell_count):
+            self.draw_diamond(index)
 
         self.draw_circles()
 
     def draw_circles(self):
-        for item in list(self.circle_ids):
-            if self.canvas.gettags(item) == ("circle",):
-                self.canvas.delete(item)
-                self.circle_ids.pop(item)
-
-        cx = (((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH + 20 + SHADOW_OFFSET) +
-              (self.canvas_width - ((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH + 20 +
-                                    SHADOW_OFFSET * 7.5)) // 2)
-        cy = ((2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT) // 2
+        self.canvas.delete("circle")
+        self.circle_items = [0] * self.threads
 
-        sub = 0
-
-        for i in range(self.threads + 1):
-            if i == self.threads // 2:
-                sub = 1
-                continue
-            x = cx + (i - self.threads / 2) * SMALL_CIRCLE_RADIUS * 2 + SMALL_CIRCLE_RADIUS
-            y = cy
+        for i in self.layout.circle_threads:
+            x, y = self.layout.circle(i)
             item = self.canvas.create_oval(
                 x - SMALL_CIRCLE_RADIUS, y - SMALL_CIRCLE_RADIUS,
                 x + SMALL_CIRCLE_RADIUS, y + SMALL_CIRCLE_RADIUS,
-                fill=self.circle_colors.get(i - sub, "white"), outline="black", tags="circle"
+                fill=self.pattern.thread_color(i), outline="black",
+                tags=("circle", f"thread:{i}", f"pal:{self.pattern.thread_colors[i]}")
             )
-            self.circle_ids[item] = (x, y, i - sub)
-            self.circle_colors[i - sub] = self.circle_colors.get(i - sub, "white")
+            self.circle_items[i] = item
 
     def update_circles(self):
         if self.thread_entry.get() == "":
@@ -742,76 +836,83 @@ class Flat(Frame):
             self.thread_info.config(text="", fg="black")
         if self.threads != self.thread_mode.get():
             self.threads = self.thread_mode.get()
-            self.circle_colors = {}
             self.cols = self.threads // 4 + 1
+            self.pattern.resize(self.rows, self.cols, self.threads)
             self.calc_size()
 
         self.draw_grid()
 
     def redraw_diamonds(self):
-        mod = 32 / self.threads * 2
-        for i in range(32):
-            if i % mod >= 2:
-                continue
-            self.fill_circle(i, self.circle_colors.get(i, "white"))
-
-    def point_inside_polygon(self, x, y, poly):
-        n = len(poly)
-        inside = False
-        p1x, p1y = poly[0], poly[1]
-        xinters = 0
-        for i in range(2, n + 2, 2):
-            p2x, p2y = poly[i % n], poly[(i + 1) % n]
-            if min(p1y, p2y) < y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
+        for i in range(self.threads):
+            self.fill_circle(i, self.pattern.thread_color(i))
 
     def set_diamond(self, x, y, color):
-        if 0 <= x < self.cols - 0.5 and 0 <= y <= self.rows:
-            self.canvas.itemconfig(
-                list(self.logical_coords.keys())[list(self.logical_coords.values()).index((x, y))], fill=color)
-            return True
-        return False
+        index = self.pattern.cell_index(x, y)
+        if index < 0:
+            return False
+        old = self.pattern.cell_colors[index]
+        new = self.pattern.set_cell(index, color)
+        retag_palette(self.canvas, self.cell_items[index], (old,), new)
+        self.canvas.itemconfig(self.cell_items[index], fill=self.pattern.palette[new])
+        return True
 
     def set_circle(self, n, color):
-        self.canvas.itemconfig([i for i, j in self.circle_ids.items() if j[2] == n][0], fill=color)
-        self.circle_colors[n] = color
+        old = self.pattern.thread_colors[n]
+        new = self.pattern.set_thread(n, color)
+        retag_palette(self.canvas, self.circle_items[n], (old,), new)
+        self.canvas.itemconfig(self.circle_items[n], fill=self.pattern.palette[new])
+
+    def recolor(self, index, color):
+        self.pattern.recolor(index, color)
+        self.canvas.itemconfig(f"pal:{index}", fill=self.pattern.palette[index])
 
     def fill_circle(self, circle, color=None):
         if color:
-            self.set_circle(circle, color)
+            index, old = self.pattern.fill_thread(circle, color)
+            retag_palette(self.canvas, f"thread:{circle}", old, index)
+            self.canvas.itemconfig(f"thread:{circle}", fill=self.pattern.palette[index])
         # logic
-        diamonds = []
+        diamonds = [self.pattern.cell_coords(i) for i in self.pattern.groups[circle]]
         return diamonds
 
+    def apply_preset(self, name):
+        colors = preset_colors(name, self.threads)
+        if colors is None:
+            return
+        filled, old = self.pattern.fill_threads(colors)
+        fill_canvas_threads(self.canvas, self.pattern, filled, old, self.cell_items)
+
+    def paint_diamond(self, event, color):
+        index = self.layout.cell_at(event.x, event.y)
+        if index >= 0:
+            self.set_diamond(*self.pattern.cell_coords(index), color)
+
     def get_circle(self, logical_x, logical_y):
-        mod = 32 / self.threads * 2
-        for i in range(32):
-            if i % mod >= 2:
-                continue
-            if (logical_x, logical_y) in self.fill_circle(i):
-                return i
-        raise RuntimeWarning(f"Nothing found: {logical_x}, {logical_y}")
+        index = self.pattern.cell_index(logical_x, logical_y)
+        if index >= 0:
+            return self.pattern.cell_threads[index]
+        return -1
 
     def handle_click(self, event, color):
-        clicked = self.canvas.find_closest(event.x, event.y)
-        if clicked:
-            item_id = clicked[0]
-            if item_id in self.logical_coords:
-                points, _, _ = self.diamond_ids[item_id]
-                if not self.point_inside_polygon(event.x, event.y, points):
-                    return
-                self.fill_circle(self.get_circle(*self.logical_coords[item_id]), color)
-            elif item_id in self.circle_ids:
-                cx, cy, n = self.circle_ids[item_id]
-                dist = math.hypot(event.x - cx, event.y - cy)
-                if dist <= SMALL_CIRCLE_RADIUS:
-                    self.fill_circle(n, color)
+        index = self.layout.cell_at(event.x, event.y)
+        if index >= 0:
+            n = self.get_circle(*self.pattern.cell_coords(index))
+            if n >= 0:
+                self.fill_circle(n, color)
+            else:
+                self.mark_unassigned(index)
+            return
+        n = self.layout.circle_at(event.x, event.y)
+        if n >= 0:
+            self.fill_circle(n, color)
+
+    def mark_unassigned(self, index):
+        # A rhombus in no group is outlined like an "unassigned" problem in the editor of Custom, instead of filled
+        self.canvas.itemconfig("problem", outline="black", width=1)
+        self.canvas.dtag("problem")
+        self.canvas.addtag_withtag("problem", self.cell_items[index])
+        self.canvas.itemconfig("problem", outline="orange", width=2)
+        self.canvas.tag_raise("problem")
 
     def on_click_left(self, event):
         self.handle_click(event, self.color)
@@ -820,29 +921,15 @@ class Flat(Frame):
         self.handle_click(event, self.alt_color)
 
     def on_middle_click(self, event):
-        clicked = self.canvas.find_closest(event.x, event.y)
-        if not clicked:
-            return
-
-        item_id = clicked[0]
-
         # Check for Shift key — 0x0001 or 0x0004 are commonly used across platforms
         pick_alt = (event.state & 0x0001) != 0 or (event.state & 0x0004) != 0
 
-        if item_id in self.diamond_ids:
-            points, _, _ = self.diamond_ids[item_id]
-            if self.point_inside_polygon(event.x, event.y, points):
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
-
-        elif item_id in self.circle_ids:
-            cx, cy, _ = self.circle_ids[item_id]
-            dist = math.hypot(event.x - cx, event.y - cy)
-            if dist <= SMALL_CIRCLE_RADIUS:
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
+        index = self.layout.cell_at(event.x, event.y)
+        n = self.layout.circle_at(event.x, event.y)
+        if index >= 0:
+            self.set_color(pick_alt, self.pattern.cell_color(index))
+        elif n >= 0:
+            self.set_color(pick_alt, self.pattern.thread_color(n))
 
     def on_scroll(self, scroll):
         pass
@@ -870,7 +957,7 @@ class Editor(Frame):
 
         self.is_open: bool = False
 
-        Separator(self, orient="vertical").grid(row=0, column=0, rowspan=4, sticky="nsw")
+        Separator(self, orient="vertical").grid(row=0, column=0, rowspan=5, sticky="nsw")
         Label(self, text="Editor").grid(row=0, column=1, columnspan=2)
         self.namevar: StringVar = StringVar(value=self.master.name)
         self.namevar.trace_add("write", lambda a, b, c: self.master.updatetab(name=self.namevar.get()))
@@ -887,23 +974,147 @@ class Editor(Frame):
                                                                                             self.iconpathvar.get()))
                                        )
         iconchooser.grid(row=1, column=2, sticky="n")
-        Button(iconchooser.buttonframe, image=geticon(delete_path, height=BUTTON_ICON_HEIGHT), style="Red.TButton",
-               command=lambda: self.iconpathvar.set("")).grid(row=0, column=1, sticky="w")
+        Button(iconchooser.buttonframe, image=geticon(delete_path, height=BUTTON_ICON_HEIGHT, lazy=True),
+               style="Red.TButton", command=lambda: self.iconpathvar.set("")).grid(row=0, column=1, sticky="w")
         self.compoundvar: StringVar = StringVar(value=self.master.compound)
         self.compoundvar.trace_add("write", lambda a, b, c: self.master.updatetab(compound=self.compoundvar.get()))
         Labelcombobox(iconchooser.buttonframe, text="Compound", values=["left", "right", "top", "bottom", "none"],
                       textvariable=self.compoundvar).grid(row=1, column=0, columnspan=2)
-        Button(self, text="Delete", image=geticon(delete_path, True), compound="left",
-               style="Red.TButton", command=self.master.delete).grid(row=3, column=2, sticky="es")
+        group_frame: LabelFrame = LabelFrame(self, text="Groups")
+        group_frame.grid(row=2, column=1, columnspan=2, sticky="new")
+        self.groupmodevar: BooleanVar = BooleanVar(value=False)
+        Checkbutton(group_frame, text="Edit groups", variable=self.groupmodevar).grid(row=0, column=0, sticky="w")
+        self.groupthreadvar: IntVar = IntVar(value=0)
+        Labelentry(group_frame, text="Thread", textvariable=self.groupthreadvar,
+                   validatecommand=(self.register(lambda s: s.isdigit() or s == ""), "%P"),
+                   validate="key").grid(row=0, column=1, sticky="w")
+        Label(group_frame, text="Click a thread to choose it,\nclick a rhombus to link it, right click to unlink"
+              ).grid(row=1, column=0, columnspan=2, sticky="w")
+        problem_frame: LabelFrame = LabelFrame(self, text="Problems")
+        problem_frame.grid(row=3, column=1, columnspan=2, sticky="new")
+        self.problemlist: Listbox = Listbox(problem_frame, height=4, width=40, activestyle="none")
+        self.problemlist.grid(row=0, column=0, sticky="we")
+        self.problemlist.bind("<<ListboxSelect>>", lambda event: self.show_problem())
+        Button(problem_frame, text="Check", command=self.check).grid(row=1, column=0, sticky="w")
+        self.problems: tuple[Problem, ...] = ()  # problems listed in problemlist
+        self._check: concurrent.futures.Future | None = None  # running check
+        self._check_job: str | None = None  # pending poll_check() from after()
+        Button(self, text="Save", command=self.save).grid(row=4, column=1, sticky="ws")
+        Button(self, text="Delete", image=geticon(delete_path, True, lazy=True), compound="left",
+               style="Red.TButton", command=self.master.delete).grid(row=4, column=2, sticky="es")
 
     def load(self, path: str) -> None:
         """
         Load configuration from file
-        TODO: make loading/saving after the Editor is complete
         :param path: file path
         :return: None
         """
-        pass
+        view: Custom | None = self.master.toplevel.main.find_view(path)
+        if view is not None:  # already open in another window
+            self.master.share(view)
+            return
+        try:
+            meta, pattern = read_pattern(path, self.master.toplevel.library.store, COLOR_TOLERANCE)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            messagebox.showerror(title="Open pattern", message=f"Can't open {path}:\n{e}")
+            return
+        self.master.path = path
+        self.master.set_pattern(pattern)
+        self.namevar.set(meta["name"])
+        self.iconpathvar.set(meta["icon"] or "")
+        self.compoundvar.set(meta["compound"])
+        if self.is_open:
+            self.check()
+
+    def save(self, path: str | None = None) -> None:
+        """
+        Save configuration to file and add it to the library
+        :param path: file path, asks the user if the pattern was never saved
+        :return: None
+        """
+        if path is None:
+            path = self.master.path
+        if path is None:
+            path = filedialog.asksaveasfilename(title="Save pattern", initialdir=directory,
+                                                initialfile=f"{self.namevar.get()}.json", defaultextension=".json",
+                                                filetypes=[("Pattern", "*.json")])
+            if not path:
+                return
+        write_pattern(path, self.master.pattern, self.master.toplevel.library.store, self.namevar.get(),
+                      self.iconpathvar.get() or None, self.compoundvar.get())
+        self.master.path = path
+        for i in self.master.views():
+            i.path = path
+        self.master.log("tab", path=path)
+        self.master.toplevel.main.worker.submit(self.master.toplevel.library.add, path)  # reads and hashes the file
+
+    def check(self) -> None:
+        """
+        Validates the pattern on the worker thread of the main window. The problems are listed when it is done,
+        the editor stays responsive meanwhile
+        :return: None
+        """
+        self.cancel_check()
+        data: dict[str, typing.Any] = self.master.pattern.to_dict()
+        data["groups"] = [list(i) for i in data["groups"]]  # to_dict shares the group lists with the pattern
+        self._check = self.master.toplevel.main.worker.submit(validate, data)
+        self.problemlist.delete(0, END)
+        self.problemlist.insert(END, "Checking...")
+        self._check_job = self.after(CHECK_POLL, self.poll_check)
+
+    def poll_check(self) -> None:
+        """
+        Lists the problems once the check is done
+        :return: None
+        """
+        if not self._check.done():
+            self._check_job = self.after(CHECK_POLL, self.poll_check)
+            return
+        self._check_job = None
+        problems: tuple[Problem, ...] = self._check.result()
+        self._check = None
+        self.report(problems)
+
+    def report(self, problems: tuple[Problem, ...]) -> None:
+        """
+        Lists problems, replacing the listed ones. A single problem is outlined right away
+        :param problems: problems from validate or from an edit
+        :return: None
+        """
+        self.cancel_check()
+        self.problems = problems
+        self.problemlist.delete(0, END)
+        self.problemlist.insert(END, *(i.message for i in problems))
+        if not problems:
+            self.problemlist.insert(END, "No problems")
+        self.master.mark(tag="problem")
+        if len(problems) == 1:
+            self.problemlist.selection_set(0)
+            self.show_problem()
+
+    def cancel_check(self) -> None:
+        """
+        Stops waiting for a running check, its result is dropped
+        :return: None
+        """
+        if self._check_job is not None:
+            self.after_cancel(self._check_job)
+            self._check_job = None
+        if self._check is not None:
+            self._check.cancel()
+            self._check = None
+
+    def show_problem(self) -> None:
+        """
+        Outlines the rhombuses and circles of the selected problem
+        :return: None
+        """
+        selection: tuple[int, ...] = self.problemlist.curselection()
+        if not selection or selection[0] >= len(self.problems):
+            return
+        problem: Problem = self.problems[selection[0]]
+        self.master.mark([i for i in problem.cells if i < len(self.master.cell_items)],
+                         [n for n in problem.threads if n < len(self.master.circle_items)], "problem", "orange")
 
 
 # Main class for designing a custom pattern
@@ -911,8 +1122,13 @@ class Custom(Frame):
     """
     Main class for designing a custom pattern
     """
+    # Grids with more rhombuses are drawn as a bitmap: as many as are drawn as polygons in RASTER_BUDGET, timed on
+    # this machine by every polygon draw of RASTER_SAMPLE or more rhombuses. Shared by all views
+    raster_cells: int = RASTER_CELLS
+
     def __init__(self, master: Misc, toplevel: Misc, path: str = None, name: str = "Custom", icon: str | None = None,
-                 compound: str = "left", *args, **kwargs) -> None:
+                 compound: str = "left", journal: str | None = None, view: Custom | None = None, *args,
+                 **kwargs) -> None:
         """
         Constructs the class
         :param master: parent
@@ -921,6 +1137,8 @@ class Custom(Frame):
         :param name: pattern name
         :param icon: path to icon
         :param compound: icon compound
+        :param journal: autosave journal to restore the pattern from
+        :param view: another view whose pattern this one shows
         :param args: Frame options
         :param kwargs: Frame options
         """
@@ -929,6 +1147,8 @@ class Custom(Frame):
         self.toplevel: Misc = toplevel
         self.name: str = name
         self.compound: str = compound
+        self.path: str | None = None  # set when the pattern is loaded or saved
+        self.journal: Journal | None = None  # journal of the pattern, opened when it is ready
 
         self.icon: str | None = icon
         if icon is not None:
@@ -941,7 +1161,24 @@ class Custom(Frame):
         self.canvas_width: int = 0
         self.canvas_height: int = 0
         self.threads: int = 13
+        self.zoom: float = 1
+        self.cell_width: int = DIAMOND_WIDTH
+        self.cell_height: int = DIAMOND_HEIGHT
+        self.layout: Layout | None = None  # positions of the rhombuses and circles, shared with equal tabs
+        self.image: Image.Image | None = None  # the grid as palette indices, when it is drawn as a bitmap
+        self.bitmap: ImageTk.PhotoImage | None = None  # self.image on the canvas
+        self._dirty_rows: set[int] = set()  # rows of self.image to rasterize again
+        self._palette_dirty: bool = False  # whether palette colors changed since the bitmap was updated
+        self._bitmap_job: str | None = None  # pending update_bitmap() from after_idle()
         self.calc_size(False)
+        self.pattern: Pattern = Pattern(self.rows, self.cols, self.threads, Palette(tolerance=COLOR_TOLERANCE))
+        self.pattern.subscribe(self.on_change)
+        self.groups: GroupBuilder = GroupBuilder(self.pattern.cell_count, self.threads)
+        self._groups_job: str | None = None  # pending compile_groups() from after_idle()
+        self._compiling: bool = False  # whether the groups being set come from self.groups
+        self.session: Connection | None = None  # collaboration session, see connect
+        self._session_job: str | None = None  # pending poll_session() from after()
+        self.partners: list[tuple[int, ...]] = [()] * self.threads  # symmetric partners of every thread
 
         self.color: str | tuple[int, int, int] = "#ff0000"
         self.alt_color: str | tuple[int, int, int] = "#ffffff"
@@ -959,8 +1196,9 @@ class Custom(Frame):
         self.colorbtn.grid(column=0, row=0, sticky="w")
         self.alt_colorbtn.grid(column=0, row=1, sticky="w")
 
+        self._update_job: str | None = None  # pending update_circles() from after()
         self.thread_mode: IntVar = IntVar(value=13)
-        self.thread_mode.trace_add("write", lambda a, b, c: self.update_circles())
+        self.thread_mode.trace_add("write", lambda a, b, c: self.schedule_update())
         self.threads: int = self.thread_mode.get()
         thread_frame: Frame = Frame(self)
         thread_frame.grid(row=0, column=1, sticky="w", padx=10)
@@ -969,6 +1207,11 @@ class Custom(Frame):
                                                    validatecommand=(master.register(lambda s: s.isdigit() or s == ""),
                                                                     "%P"), validate="key")
         self.thread_entry.pack(anchor="w")
+        Presetchooser(thread_frame, self.apply_preset).pack(anchor="w")
+        self.symmetryvar: StringVar = StringVar(value=SYMMETRIES[0])
+        self.symmetryvar.trace_add("write", lambda a, b, c: self.update_partners())
+        Labelcombobox(thread_frame, text="Symmetry", values=list(SYMMETRIES),
+                      textvariable=self.symmetryvar).pack(anchor="w")
 
         Button(self, image=geticon(edit_path),
                command=lambda: self.close_editor() if self.editor.is_open else self.open_editor()).grid(row=0,
@@ -980,19 +1223,26 @@ class Custom(Frame):
         self.canvas.grid(column=0, row=2, columnspan=2, sticky="w")
         self.calc_size()
 
-        self.diamond_ids: dict[int, tuple[list[int], int, int]] = {}  # item_id: (points, cx, cy)
-        self.circle_ids: dict[int, tuple[int, int, int]] = {}  # item_id: (x, y, i)
-        self.circle_colors: dict[int, str | tuple[int, int, int]] = {}  # i: color
-        self.logical_coords: dict[int, tuple[int, int]] = {}  # item_id: (x, y) in logical grid coords
+        self.cell_items: list[int] = []  # cell index: item_id
+        self.circle_items: list[int] = []  # i: item_id
         self.draw_grid()
         if path:
             self.editor.load(path)
+        if view is not None:
+            self.share(view)
+        if journal:
+            self.restore(journal)
+        self.open_journal(journal)
         self.canvas.bind("<Button-1>", self.on_click_left)
         self.canvas.bind("<Button-2>", self.on_middle_click)
         self.canvas.bind("<Button-3>", self.on_click_right)
         self.canvas.bind("<MouseWheel>", lambda event: self.on_scroll(int(event.delta > 0) * 2 - 1))  # Windows
         self.canvas.bind("<Button-4>", lambda event: self.on_scroll(1))  # Linux MouseWheel-Up
         self.canvas.bind("<Button-5>", lambda event: self.on_scroll(-1))  # Linux MouseWheel-Down
+        self.canvas.bind("<Control-MouseWheel>", lambda event: self.on_zoom(int(event.delta > 0) * 2 - 1))
+        self.canvas.bind("<Control-Button-4>", lambda event: self.on_zoom(1))
+        self.canvas.bind("<Control-Button-5>", lambda event: self.on_zoom(-1))
+        self.bind("<Destroy>", lambda event: self.detach())
 
     def open_editor(self) -> None:
         """
@@ -1001,6 +1251,7 @@ class Custom(Frame):
         """
         if not self.editor.is_open:
             self.editor.grid(row=0, column=3, rowspan=3, sticky="nesw")
+            self.editor.check()
         self.editor.is_open = True
         self.toplevel.set_geometry()
 
@@ -1031,22 +1282,203 @@ class Custom(Frame):
                 self.icon = geticon(icon, True)
         if compound is not None:
             self.compound = compound
+        self.log("tab", **{i: j for i, j in (("name", name), ("icon", icon), ("compound", compound)) if j is not None})
         self.toplevel.updatetab(self)
 
+    def log(self, op: str, **fields: typing.Any) -> None:
+        """
+        Records an edit in the autosave journal. Changes of the pattern reach every view of it and are recorded by
+        the view that keeps the journal, links and tab changes by the view they are made in
+        :param op: edit type
+        :param fields: edit data
+        :return: None
+        """
+        if self.journal is not None and (self.journal.owner is self or op in ("link", "unlink", "tab")):
+            self.journal.record(op, **fields)
+
+    def compact_journal(self) -> None:
+        """
+        Replaces the autosave journal with a snapshot, if this view keeps it
+        :return: None
+        """
+        if self.journal is not None and self.journal.owner is self:
+            self.journal.compact()
+
+    def views(self) -> list[Custom]:
+        """
+        :return: the other views of the pattern, in all windows
+        """
+        return [i for window in self.toplevel.main.windows for i in window.tabs
+                if isinstance(i, Custom) and i is not self and i.pattern is self.pattern]
+
+    def open_journal(self, path: str | None = None) -> None:
+        """
+        Journals the pattern: uses the journal of another view of it, or opens one kept by this view
+        :param path: existing journal to replace, a new one by default
+        :return: None
+        """
+        for i in self.views():
+            if i.journal is not None:
+                self.journal = i.journal
+                return
+        self.journal = self.toplevel.autosave.open(self.snapshot, path)
+        self.journal.owner = self
+
+    def release_journal(self, remove: bool) -> None:
+        """
+        Stops journaling the pattern. Another view of it takes the journal over
+        :param remove: delete the journal if no other view shows the pattern, else it is restored with the next session
+        :return: None
+        """
+        journal: Journal | None = self.journal
+        self.journal = None
+        if journal is None:
+            return
+        views: list[Custom] = [i for i in self.views() if i.journal is journal]
+        if views:
+            if journal.owner is self:
+                journal.owner = views[0]
+                journal.snapshot = views[0].snapshot
+        elif remove:
+            journal.remove()
+
+    def snapshot(self) -> dict[str, typing.Any]:
+        """
+        Whole state of the tab, for the autosave journal
+        :return: name, icon, compound, path and pattern
+        """
+        if self._groups_job is not None:
+            self.compile_groups()
+        return {"name": self.name, "icon": self.editor.iconpathvar.get() or None, "compound": self.compound,
+                "path": self.path, "pattern": self.pattern.to_dict()}
+
+    def restore(self, journal: str) -> None:
+        """
+        Restores the tab from an autosave journal
+        :param journal: journal file
+        :return: None
+        """
+        try:
+            state: dict[str, typing.Any] | None = replay_journal(journal, COLOR_TOLERANCE)
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        if state is None:
+            return
+        self.path = state["path"]
+        self.set_pattern(state["pattern"])
+        self.editor.namevar.set(state["name"])
+        self.editor.iconpathvar.set(state["icon"] or "")
+        self.editor.compoundvar.set(state["compound"])
+
     def calc_size(self, update_canvas: bool = True) -> None:
         """
         Update the canvas size
         :param update_canvas: update the canvas or just calculate the size
         :return: None
         """
-        self.canvas_width = ((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH +
-                             SMALL_CIRCLE_RADIUS * (self.threads + 1) * 2 + 40 + SHADOW_OFFSET * 2)
-        self.canvas_height = (2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT + SHADOW_OFFSET * 2
+        self.layout = layout(self.rows, self.cols, self.threads, self.cell_width, self.cell_height)
+        self.canvas_width, self.canvas_height = self.layout.width, self.layout.height
 
         if update_canvas:
             self.canvas.config(width=self.canvas_width, height=self.canvas_height)
             self.toplevel.set_geometry()
 
+    def set_pattern(self, pattern: Pattern) -> None:
+        """
+        Replaces the pattern and redraws it
+        :param pattern: new pattern
+        :return: None
+        """
+        replaced: bool = pattern is not self.pattern and self.journal is not None  # the journal is of the old one
+        if pattern is not self.pattern:
+            self.pattern.unsubscribe(self.on_change)
+            pattern.subscribe(self.on_change)
+            self.release_journal(True)
+        pattern.palette.tolerance = COLOR_TOLERANCE
+        self.pattern = pattern
+        self.redraw()
+        if replaced:
+            self.open_journal()
+        else:
+            self.compact_journal()
+
+    def redraw(self) -> None:
+        """
+        Takes the size and the groups from the pattern and redraws it
+        :return: None
+        """
+        self.groups = GroupBuilder.from_groups(self.pattern.cell_count, self.pattern.groups)
+        if self._groups_job is not None:
+            self.after_cancel(self._groups_job)
+            self._groups_job = None
+        self.rows, self.cols, self.threads = self.pattern.rows, self.pattern.cols, self.pattern.threads
+        self.update_partners()
+        self.thread_mode.set(self.threads)
+        self.calc_size()
+        self.draw_grid()
+
+    def on_change(self, change: Change) -> None:
+        """
+        Applies a change of the pattern, made in this view or another one, to the canvas and the journal.
+        Only the changed items are touched
+        :param change: change from the pattern
+        :return: None
+        """
+        palette: Palette = self.pattern.palette
+        if change.kind == "fill":
+            retag_palette(self.canvas, f"thread:{change.index}", change.old, change.color)
+            self.canvas.itemconfig(f"thread:{change.index}", fill=palette[change.color])
+            self.schedule_bitmap(change.cells)
+            self.log("fill", thread=change.index, color=palette[change.color])
+        elif change.kind == "fill_threads":
+            fill_canvas_threads(self.canvas, self.pattern, change.filled, change.old, self.cell_items)
+            self.schedule_bitmap(i for ns in change.filled.values() for n in ns for i in self.pattern.groups[n])
+            self.log("fill_threads", colors=[self.pattern.thread_color(n) for n in range(self.threads)])
+        elif change.kind == "thread":
+            retag_palette(self.canvas, self.circle_items[change.index], change.old, change.color)
+            self.canvas.itemconfig(self.circle_items[change.index], fill=palette[change.color])
+            self.log("thread", thread=change.index, color=palette[change.color])
+        elif change.kind == "cell":
+            retag_palette(self.canvas, self.cell_items[change.index], change.old, change.color)
+            self.canvas.itemconfig(self.cell_items[change.index], fill=palette[change.color])
+            self.schedule_bitmap(change.cells)
+            self.log("cell", cell=change.index, color=palette[change.color])
+        elif change.kind == "recolor":
+            self.canvas.itemconfig(f"pal:{change.index}", fill=palette[change.index])
+            self.schedule_bitmap(palette=True)
+            self.log("recolor", index=change.index, color=palette[change.index])
+        elif change.kind == "groups":
+            if not self._compiling:  # compiled by another view, which recorded the links
+                self.groups = GroupBuilder.from_groups(self.pattern.cell_count, self.pattern.groups)
+                if self._groups_job is not None:
+                    self.after_cancel(self._groups_job)
+                    self._groups_job = None
+                self.compact_journal()
+            for n, cells in enumerate(self.pattern.groups):
+                self.canvas.dtag("rhombus", f"thread:{n}")
+                for i in cells:
+                    self.canvas.addtag_withtag(f"thread:{n}", self.cell_items[i])
+            self.update_partners()
+        elif change.kind == "resize":
+            self.redraw()
+            self.log("threads", rows=self.rows, cols=self.cols, threads=self.threads)
+        else:
+            self.redraw()
+            self.compact_journal()
+
+    def share(self, view: Custom) -> None:
+        """
+        Shows the pattern of another view. Both views edit one model instead of copies and share its journal
+        :param view: view of the pattern, usually in another window
+        :return: None
+        """
+        view.compile_groups()
+        self.path = view.path
+        self.set_pattern(view.pattern)
+        self.editor.namevar.set(view.editor.namevar.get())
+        self.editor.iconpathvar.set(view.editor.iconpathvar.get())
+        self.editor.compoundvar.set(view.editor.compoundvar.get())
+
     def choose_color(self) -> None:
         """
         Colorchooser for the main color
@@ -1082,110 +1514,184 @@ class Custom(Frame):
             self.color = fill_color
             self.colorbtn.set_color(self.color)
 
-    def draw_rhombus(self, cx: int, cy: int, w: int, h: int, logical_coords: tuple[float, float],
-                     delpoints: list[int] | None = None) -> None:
+    def draw_rhombus(self, index: int) -> None:
         """
         Draws a rhombus
-        :param cx: x position
-        :param cy: y position
-        :param w: width
-        :param h: height
-        :param logical_coords: logical coordinates
-        :param delpoints: points to delete
-        :return: None
-        """
-        if delpoints is None:
-            delpoints = []
-        points: list[int] = [cx, cy - h, cx + w, cy, cx, cy + h, cx - w, cy]
-        for i in sorted(delpoints, reverse=True):
-            points.pop(i * 2)
-            points.pop(i * 2)
-        if len(points) <= 4:
-            points.append(cx)
-            points.append(cy)
-        item: int = self.canvas.create_polygon(points, fill="white", outline="black", tags="rhombus")
-        self.diamond_ids[item] = (points, cx, cy)
-        self.logical_coords[item] = logical_coords
+        :param index: cell index
+        :return: None
+        """
+        tags: tuple[str, ...] = ("rhombus", f"pal:{self.pattern.cell_colors[index]}")
+        if self.pattern.cell_threads[index] >= 0:
+            tags += (f"thread:{self.pattern.cell_threads[index]}",)
+        self.cell_items[index] = self.canvas.create_polygon(list(self.layout.polygon(index)),
+                                                            fill=self.pattern.cell_color(index), outline="black",
+                                                            tags=tags)
 
     def draw_grid(self) -> None:
         """
         Draws a grid of rhombuses
         :return: None
         """
-        for item in list(self.diamond_ids.keys()):
-            if self.canvas.gettags(item) == ("rhombus",):
-                self.canvas.delete(item)
-                self.diamond_ids.pop(item)
-
-        offset_x: int = 5
-        offset_y: int = 5
-
-        delpoints: list[int] = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if row == 0:
-                    delpoints.append(0)
-                if col == 0:
-                    delpoints.append(3)
-                if col == self.cols - 1:
-                    delpoints.append(1)
-                cx: int = offset_x + col * 2 * DIAMOND_WIDTH
-                cy: int = offset_y + row * 2 * DIAMOND_HEIGHT
-                self.draw_rhombus(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col, row), delpoints)
-                delpoints = []
-
-        for row in range(self.rows):
-            for col in range(self.cols - 1):
-                if row == self.rows - 1:
-                    delpoints.append(2)
-                cx: int = offset_x + col * 2 * DIAMOND_WIDTH + DIAMOND_WIDTH
-                cy: int = offset_y + row * 2 * DIAMOND_HEIGHT + DIAMOND_HEIGHT
-                self.draw_rhombus(cx, cy, DIAMOND_WIDTH, DIAMOND_HEIGHT, (col + 0.5, row + 0.5), delpoints)
-                delpoints = []
+        self.canvas.delete("rhombus")
+        self.cell_items = [0] * self.pattern.cell_count
+        if self._bitmap_job is not None:
+            self.after_cancel(self._bitmap_job)
+            self._bitmap_job = None
+        self._dirty_rows.clear()
+        self._palette_dirty = False
+        if self.rasterized():
+            self.draw_bitmap()
+            self.draw_circles()
+            return
+        self.image = None
+        self.bitmap = None
+
+        start: float = time.perf_counter()
+        for index in range(self.pattern.cell_count):
+            self.draw_rhombus(index)
+        if self.pattern.cell_count >= RASTER_SAMPLE:
+            cost: float = (time.perf_counter() - start) / self.pattern.cell_count
+            Custom.raster_cells = max(int(RASTER_BUDGET / cost), RASTER_SAMPLE) if cost > 0 else RASTER_CELLS
 
         self.draw_circles()
 
+    def rasterized(self) -> bool:
+        """
+        Whether the grid is drawn as one bitmap instead of a polygon per rhombus: at low zoom and for big grids
+        :return: whether to use the bitmap
+        """
+        return ((self.zoom <= BITMAP_ZOOM or self.pattern.cell_count > Custom.raster_cells)
+                and len(self.pattern.palette) <= RASTER_BACKGROUND)
+
+    def draw_bitmap(self) -> None:
+        """
+        Draws the whole grid as one image
+        :return: None
+        """
+        from PIL import Image, ImageTk
+
+        size: tuple[int, int] = raster_size(self.pattern, self.cell_width, self.cell_height)
+        self.image = Image.frombytes("P", size, b"".join(raster(self.pattern, self.cell_width, self.cell_height)))
+        self.image.putpalette(raster_palette(self.pattern))
+        self.bitmap = ImageTk.PhotoImage(self.image)
+        self.canvas.delete("bitmap")
+        self.canvas.create_image(GRID_OFFSET, GRID_OFFSET, image=self.bitmap, anchor="nw", tags=("rhombus", "bitmap"))
+        self.canvas.tag_lower("bitmap")
+
+    def schedule_bitmap(self, cells: typing.Iterable[int] = (), palette: bool = False) -> None:
+        """
+        Marks rhombuses to redraw when idle, if the grid is a bitmap, so a fill updates it once
+        :param cells: indices of the changed cells
+        :param palette: palette colors changed
+        :return: None
+        """
+        if self.image is None:
+            return
+        for i in cells:
+            x, y = self.pattern.cell_coords(i)
+            self._dirty_rows.add(int(y))
+            if x == int(x) and y > 0:  # the top half of an outer rhombus is drawn with the row above
+                self._dirty_rows.add(int(y) - 1)
+        self._palette_dirty = self._palette_dirty or palette
+        if self._bitmap_job is None:
+            self._bitmap_job = self.after_idle(self.update_bitmap)
+
+    def update_bitmap(self) -> None:
+        """
+        Rasterizes the dirty rows again and copies only them to the canvas image.
+        A palette change repaints the whole image without rasterizing it
+        :return: None
+        """
+        from PIL import Image, ImageTk
+
+        self._bitmap_job = None
+        if self.image is None:
+            return
+        if len(self.pattern.palette) > RASTER_BACKGROUND:
+            self.draw_grid()
+            return
+        palette: bytes = raster_palette(self.pattern)
+        self.image.putpalette(palette)
+        rows: list[int] = sorted(self._dirty_rows)
+        self._dirty_rows.clear()
+        start: int = 0
+        while start < len(rows):  # consecutive rows are one rectangle
+            stop: int = start + 1
+            while stop < len(rows) and rows[stop] == rows[stop - 1] + 1:
+                stop += 1
+            lines: list[bytes] = list(raster(self.pattern, self.cell_width, self.cell_height, rows[start],
+                                             rows[stop - 1] + 1))
+            band: Image.Image = Image.frombytes("P", (self.image.width, len(lines)), b"".join(lines))
+            band.putpalette(palette)
+            y: int = 2 * rows[start] * self.cell_height
+            self.image.paste(band, (0, y))
+            if not self._palette_dirty:
+                photo: ImageTk.PhotoImage = ImageTk.PhotoImage(band)
+                self.canvas.tk.call(str(self.bitmap), "copy", str(photo), "-to", 0, y)
+            start = stop
+        if self._palette_dirty:
+            self._palette_dirty = False
+            self.bitmap.paste(self.image)
+
+    def on_zoom(self, step: 1 | -1) -> None:
+        """
+        Zooms the grid to the next level in ZOOM_LEVELS
+        :param step: 1 = in, -1 = out
+        :return: None
+        """
+        level: int = min(max(ZOOM_LEVELS.index(self.zoom) + step, 0), len(ZOOM_LEVELS) - 1)
+        if ZOOM_LEVELS[level] != self.zoom:
+            self.set_zoom(ZOOM_LEVELS[level])
+
+    def set_zoom(self, zoom: float) -> None:
+        """
+        Changes the rhombus size and redraws the grid
+        :param zoom: rhombus size relative to DIAMOND_WIDTH and DIAMOND_HEIGHT
+        :return: None
+        """
+        self.zoom = zoom
+        self.cell_width = max(round(DIAMOND_WIDTH * zoom), 1)
+        self.cell_height = max(round(DIAMOND_HEIGHT * zoom), 1)
+        self.calc_size()
+        self.draw_grid()
+
     def draw_circles(self) -> None:
         """
         Draws circles (threads)
         TODO: add customization in Editor
         :return: None
         """
-        for item in list(self.circle_ids):
-            if self.canvas.gettags(item) == ("circle",):
-                self.canvas.delete(item)
-                self.circle_ids.pop(item)
-
-        cx: int = (((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH + 20 + SHADOW_OFFSET) +
-                   (self.canvas_width - ((2 * (self.cols - 1) - 1) * DIAMOND_WIDTH + 2 * DIAMOND_WIDTH + 20 +
-                                         SHADOW_OFFSET * 7.5)) // 2)
-        cy: int = ((2 * (self.rows - 1) - 1) * DIAMOND_HEIGHT + 2 * DIAMOND_HEIGHT) // 2
+        self.canvas.delete("circle")
+        self.circle_items = [0] * self.threads
 
-        sub: int = 0
-
-        for i in range(self.threads + 1):
-            if i == self.threads // 2:
-                sub = 1
-                continue
-            x: int = cx + (i - self.threads / 2) * SMALL_CIRCLE_RADIUS * 2 + SMALL_CIRCLE_RADIUS
-            y: int = cy
-            item: int = self.canvas.create_oval(
+        for i in self.layout.circle_threads:
+            x, y = self.layout.circle(i)
+            self.circle_items[i] = self.canvas.create_oval(
                 x - SMALL_CIRCLE_RADIUS, y - SMALL_CIRCLE_RADIUS,
                 x + SMALL_CIRCLE_RADIUS, y + SMALL_CIRCLE_RADIUS,
-                fill=self.circle_colors.get(i - sub, "white"), outline="black", tags="circle"
+                fill=self.pattern.thread_color(i), outline="black",
+                tags=("circle", f"thread:{i}", f"pal:{self.pattern.thread_colors[i]}")
             )
-            self.circle_ids[item] = (x, y, i - sub)
-            self.circle_colors[i - sub] = self.circle_colors.get(i - sub, "white")
+
+    def schedule_update(self) -> None:
+        """
+        Schedules update_circles after UPDATE_DELAY, so a thread count typed in several keystrokes rebuilds once
+        :return: None
+        """
+        if self._update_job is not None:
+            self.after_cancel(self._update_job)
+        self._update_job = self.after(UPDATE_DELAY, self.update_circles)
 
     def update_circles(self) -> None:
         """
         Updates the class
         :return: None
         """
+        self._update_job = None
         if self.thread_entry.entry.get() == "":
             self.thread_entry.showmessage("Not defined", fg="red")
             return
-        elif self.thread_mode.get() > 35:
+        elif self.thread_mode.get() > MAX_THREADS:
             self.thread_entry.showmessage("Too big", fg="red")
             return
         elif self.thread_mode.get() % 2 == 0:
@@ -1194,37 +1700,40 @@ class Custom(Frame):
         else:
             self.thread_entry.delmessage()
         if self.threads != self.thread_mode.get():
-            self.threads = self.thread_mode.get()
-            self.circle_colors = {}
-            self.cols = self.threads // 4 + 1
-            self.calc_size()
-
-        self.draw_grid()
+            self.pattern.resize(self.rows, self.thread_mode.get() // 4 + 1, self.thread_mode.get())
 
-    def point_inside_polygon(self, x: int, y: int, poly: list[int]) -> bool:
+    def cell_at(self, x: int, y: int) -> int:
         """
-        Returns if a point is inside a polygon
+        Finds the rhombus at a canvas position without looking at canvas items
         :param x: x position
         :param y: y position
-        :param poly: polygon points
-        :return: whether x, y is inside polygon
-        """
-        n: int = len(poly)
-        inside: bool = False
-        p1x: int = poly[0]
-        p1y: int = poly[1]
-        xinters: int = 0
-        for i in range(2, n + 2, 2):
-            p2x: int = poly[i % n]
-            p2y: int = poly[(i + 1) % n]
-            if min(p1y, p2y) < y <= max(p1y, p2y):
-                if x <= max(p1x, p2x):
-                    if p1y != p2y:
-                        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                    if p1x == p2x or x <= xinters:
-                        inside = not inside
-            p1x, p1y = p2x, p2y
-        return inside
+        :return: cell index, -1 outside the grid
+        """
+        return self.layout.cell_at(x, y)
+
+    def mark(self, cells: typing.Iterable[int] = (), threads: typing.Iterable[int] = (), tag: str = "diff",
+             color: str = "#0080ff") -> None:
+        """
+        Outlines rhombuses and circles by tagging only them, replacing the marks with the same tag.
+        Rhombuses drawn as a bitmap get an outline of their own
+        :param cells: cell indices
+        :param threads: thread numbers
+        :param tag: tag of the marked items
+        :param color: outline color
+        :return: None
+        """
+        self.canvas.delete(f"{tag}&&outline")
+        self.canvas.itemconfig(tag, outline="black", width=1)
+        self.canvas.dtag(tag)
+        for i in cells:
+            if self.cell_items[i]:
+                self.canvas.addtag_withtag(tag, self.cell_items[i])
+                continue
+            self.canvas.create_polygon(list(self.layout.polygon(i)), fill="", tags=("rhombus", "outline", tag))
+        for n in threads:
+            self.canvas.addtag_withtag(tag, self.circle_items[n])
+        self.canvas.itemconfig(tag, outline=color, width=2)
+        self.canvas.tag_raise(tag)
 
     def set_rhombus(self, x: float, y: float, color: str | tuple[int, int, int]) -> bool:
         """
@@ -1234,11 +1743,11 @@ class Custom(Frame):
         :param color: color
         :return: whether the coordinates exist
         """
-        if 0 <= x < self.cols - 0.5 and 0 <= y <= self.rows:
-            self.canvas.itemconfig(
-                list(self.logical_coords.keys())[list(self.logical_coords.values()).index((x, y))], fill=color)
-            return True
-        return False
+        index: int = self.pattern.cell_index(x, y)
+        if index < 0:
+            return False
+        self.pattern.set_cell(index, color)
+        return True
 
     def set_circle(self, n: int, color: str | tuple[int, int, int]) -> None:
         """
@@ -1247,8 +1756,16 @@ class Custom(Frame):
         :param color: color
         :return: None
         """
-        self.canvas.itemconfig([i for i, j in self.circle_ids.items() if j[2] == n][0], fill=color)
-        self.circle_colors[n] = color
+        self.pattern.set_thread(n, color)
+
+    def recolor(self, index: int, color: str | tuple[int, int, int]) -> None:
+        """
+        Changes palette entry index to color, which changes every circle and rhombus that uses it
+        :param index: palette index
+        :param color: new color
+        :return: None
+        """
+        self.pattern.recolor(index, color)
 
     def fill_circle(self, circle: int, color: str | tuple[int, int, int] = None) -> set[tuple[int, int]]:
         """
@@ -1258,22 +1775,117 @@ class Custom(Frame):
         :return: associated rhombuses
         """
         if color:
-            self.set_circle(circle, color)
-        rhombuses: set[tuple[int, int]] = set()
-        # TODO: add logic using Editor (look at the Kumihimo class for an example)
+            self.pattern.fill_thread(circle, color)
+        rhombuses: set[tuple[int, int]] = {self.pattern.cell_coords(i) for i in self.pattern.groups[circle]}
         return rhombuses
 
+    def apply_preset(self, name: str) -> None:
+        """
+        Fills every circle with the colors of a preset in one model update and one redraw
+        :param name: preset name from PRESETS or IMAGE_PRESET
+        :return: None
+        """
+        colors: list[str] | None = preset_colors(name, self.threads)
+        if colors is None:
+            return
+        if self._groups_job is not None:
+            self.compile_groups()
+        self.pattern.fill_threads(colors)
+
+    def link_rhombus(self, index: int, n: int) -> None:
+        """
+        Links a rhombus to the group of thread n and gives it the thread color
+        :param index: cell index
+        :param n: thread number
+        :return: None
+        """
+        self.groups.link_thread(index, n)
+        self.log("link", cell=index, thread=n)
+        self.set_rhombus(*self.pattern.cell_coords(index), self.pattern.thread_color(n))
+        self.schedule_groups()
+
+    def unlink_rhombus(self, index: int) -> None:
+        """
+        Takes a rhombus out of its group
+        :param index: cell index
+        :return: None
+        """
+        self.groups.unlink(index)
+        self.log("unlink", cell=index)
+        self.schedule_groups()
+
+    def schedule_groups(self) -> None:
+        """
+        Schedules compile_groups when idle, so several group edits compile once
+        :return: None
+        """
+        if self._groups_job is None:
+            self._groups_job = self.after_idle(self.compile_groups)
+
+    def compile_groups(self) -> None:
+        """
+        Compiles the group builder into the pattern's lookup arrays. Every view moves its rhombuses' thread tags
+        in on_change
+        :return: None
+        """
+        if self._groups_job is not None:
+            self.after_cancel(self._groups_job)
+            self._groups_job = None
+        self._compiling = True
+        self.pattern.set_groups(self.groups.compile())
+        self._compiling = False
+
+    def update_partners(self) -> None:
+        """
+        Computes the symmetric partners of every thread for the chosen symmetry, after the groups change
+        :return: None
+        """
+        self.partners = grid_partners(self.pattern, self.symmetryvar.get())
+
+    def fill_symmetric(self, circle: int, color: str | tuple[int, int, int]) -> None:
+        """
+        Fills a circle and its symmetric partners
+        :param circle: circle number
+        :param color: color
+        :return: None
+        """
+        self.fill_circle(circle, color)
+        for n in self.partners[circle]:
+            self.fill_circle(n, color)
+
+    def edit_group(self, event: Event, link: bool) -> None:
+        """
+        Group editing click: chooses a thread, or links or unlinks a rhombus
+        :param event: event from tkinter
+        :param link: link the rhombus to the chosen thread, otherwise unlink it
+        :return: None
+        """
+        index: int = self.cell_at(event.x, event.y)
+        if index >= 0:
+            try:
+                n: int = self.editor.groupthreadvar.get()
+            except TclError:  # empty entry
+                return
+            if not link:
+                self.unlink_rhombus(index)
+            elif 0 <= n < self.threads:
+                self.link_rhombus(index, n)
+            return
+        n = self.layout.circle_at(event.x, event.y)
+        if n >= 0:
+            self.editor.groupthreadvar.set(n)
+
     def get_circle(self, logical_x: float, logical_y: float) -> int:
         """
         Returns the associated circle of a rhombus at logical_x, logical_y
         :param logical_x: x position
         :param logical_y: y position
-        :return: associated circle
+        :return: associated circle, -1 if the rhombus is in no group
         """
-        for i in range(self.threads):
-            if (logical_x, logical_y) in self.fill_circle(i):
-                return i
-        return 0  # Nothing was found TODO: add error in editor
+        index: int = self.pattern.cell_index(logical_x, logical_y)
+        if index >= 0:
+            return self.pattern.cell_threads[index]
+        return -1
 
     def handle_click(self, event: Event, color: str | tuple[int, int, int]) -> None:
         """
@@ -1282,21 +1894,21 @@ class Custom(Frame):
         :param color: color
         :return: None
         """
-        clicked: tuple[int, ...] = self.canvas.find_closest(event.x, event.y)
-        if clicked:
-            item_id: int = clicked[0]
-            if item_id in self.logical_coords:
-                points: list[tuple[int, int]] = self.diamond_ids[item_id][0]
-                if not self.point_inside_polygon(event.x, event.y, points):
-                    return
-                self.fill_circle(self.get_circle(*self.logical_coords[item_id]), color)
-            elif item_id in self.circle_ids:
-                cx: int = self.circle_ids[item_id][0]
-                cy: int = self.circle_ids[item_id][1]
-                n: int = self.circle_ids[item_id][2]
-                dist: float = math.hypot(event.x - cx, event.y - cy)
-                if dist <= SMALL_CIRCLE_RADIUS:
-                    self.fill_circle(n, color)
+        if self._groups_job is not None:
+            self.compile_groups()
+        index: int = self.cell_at(event.x, event.y)
+        if index >= 0:
+            n: int = self.get_circle(*self.pattern.cell_coords(index))
+            if n >= 0:
+                self.fill_symmetric(n, color)
+            else:  # shown in the editor, where the rhombus can be linked
+                self.open_editor()
+                self.editor.report((Problem("unassigned", f"rhombus {self.pattern.cell_coords(index)} is in no group, "
+                                                          f"link it to a thread first", (index,)),))
+            return
+        n = self.layout.circle_at(event.x, event.y)
+        if n >= 0:
+            self.fill_symmetric(n, color)
 
     def on_click_left(self, event: Event) -> None:
         """
@@ -1304,6 +1916,9 @@ class Custom(Frame):
         :param event: event from tkinter
         :return: None
         """
+        if self.editor.groupmodevar.get():
+            self.edit_group(event, True)
+            return
         self.handle_click(event, self.color)
 
     def on_click_right(self, event: Event) -> None:
@@ -1312,6 +1927,9 @@ class Custom(Frame):
         :param event: event from tkinter
         :return: None
         """
+        if self.editor.groupmodevar.get():
+            self.edit_group(event, False)
+            return
         self.handle_click(event, self.alt_color)
 
     def on_middle_click(self, event: Event) -> None:
@@ -1320,29 +1938,17 @@ class Custom(Frame):
         :param event: event from tkinter
         :return: None
         """
-        clicked = self.canvas.find_closest(event.x, event.y)
-        if not clicked:
-            return
-
-        item_id = clicked[0]
-
         # Shift key — 0x0001 or 0x0004
         pick_alt = (event.state & 0x0001) != 0 or (event.state & 0x0004) != 0
 
-        if item_id in self.diamond_ids:
-            points, _, _ = self.diamond_ids[item_id]
-            if self.point_inside_polygon(event.x, event.y, points):
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
-
-        elif item_id in self.circle_ids:
-            cx, cy, _ = self.circle_ids[item_id]
-            dist = math.hypot(event.x - cx, event.y - cy)
-            if dist <= SMALL_CIRCLE_RADIUS:
-                fill_color = self.canvas.itemcget(item_id, "fill")
-                if fill_color:
-                    self.set_color(pick_alt, fill_color)
+        index = self.cell_at(event.x, event.y)
+        if index >= 0:
+            self.set_color(pick_alt, self.pattern.cell_color(index))
+            return
+
+        n = self.layout.circle_at(event.x, event.y)
+        if n >= 0:
+            self.set_color(pick_alt, self.pattern.thread_color(n))
 
     def on_scroll(self, scroll: 1 | -1) -> None:
         """
@@ -1353,6 +1959,53 @@ class Custom(Frame):
         """
         pass
 
+    def connect(self, session: Connection) -> None:
+        """
+        Edits the pattern together with a collaboration session. Remote changes reach the canvas through on_change,
+        like local ones
+        :param session: connection to the server
+        :return: None
+        """
+        self.disconnect()
+        self.session = session
+        self.poll_session()
+
+    def poll_session(self) -> None:
+        """
+        Applies the changes received from the session, every SESSION_POLL ms
+        :return: None
+        """
+        self._session_job = None
+        if self.session is None:
+            return
+        if not self.session.poll():
+            messagebox.showerror(title="Session", message=f"The session ended: {self.session.error}")
+            self.disconnect()
+            return
+        self._session_job = self.after(SESSION_POLL, self.poll_session)
+
+    def disconnect(self) -> None:
+        """
+        Leaves the collaboration session, if there is one
+        :return: None
+        """
+        if self._session_job is not None:
+            self.after_cancel(self._session_job)
+            self._session_job = None
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def detach(self) -> None:
+        """
+        Stops following the pattern and the session, when the tab is destroyed
+        :return: None
+        """
+        self.pattern.unsubscribe(self.on_change)
+        self.release_journal(False)
+        self.disconnect()
+        self.editor.cancel_check()
+
     def delete(self) -> None:
         """
         Asks the user if they really want to delete the pattern
@@ -1360,6 +2013,7 @@ class Custom(Frame):
         """
         if messagebox.Message(title=self.name, message=f"Are you sure you want to delete {self.name}?", icon="warning",
                               type="yesno").show() == "yes":  # Message used for a yesno warning
+            self.release_journal(True)
             self.toplevel.delete(self)
 
 
@@ -1391,65 +2045,272 @@ class New(Frame):
             self.icon: ImageTk.PhotoImage = geticon(self.icon, True)
 
 
-# Toplevel window class. Use this or a class with these methods
-class Window(Tk):
+# Dialog for opening a pattern from the library
+class OpenDialog(Toplevel):
     """
-    Toplevel window class. Use this or a class with these methods
+    Dialog for opening a pattern from the library
     """
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, master: Misc, library: Library, command: typing.Callable[[str], typing.Any],
+                 *args, **kwargs) -> None:
         """
-        Toplevel window class. Use this or similar
-        :param args: Tk options
-        :param kwargs: Tk options
+        Construct the dialog with the parent MASTER
+        :param master: parent
+        :param library: library to search
+        :param command: command to execute with the path of the chosen pattern
+        :param args: Toplevel options
+        :param kwargs: Toplevel options
         """
-        super().__init__(*args, **kwargs)
+        super().__init__(master, *args, **kwargs)
+        self.title("Open pattern")
+        self.transient(master)
+
+        self.library: Library = library
+        self.command: typing.Callable[[str], typing.Any] = command
+        self.results: list[LibraryEntry] = []
+        self.color: str | None = None  # color filter
+        self._search_job: str | None = None  # pending search() from after()
+
+        self.searchvar: StringVar = StringVar()
+        self.searchvar.trace_add("write", lambda a, b, c: self.schedule_search())
+        search_entry: Labelentry = Labelentry(self, text="Search", textvariable=self.searchvar)
+        search_entry.grid(row=0, column=0, sticky="nw")
+        self.prefixvar: BooleanVar = BooleanVar(value=False)
+        Checkbutton(search_entry, text="Name starts with", variable=self.prefixvar,
+                    command=self.schedule_search).pack(anchor="w")
+
+        self.threadsvar: StringVar = StringVar()
+        self.threadsvar.trace_add("write", lambda a, b, c: self.schedule_search())
+        Labelentry(self, text="Threads", textvariable=self.threadsvar,
+                   validatecommand=(self.register(lambda s: s.isdigit() or s == ""), "%P"),
+                   validate="key").grid(row=0, column=1, sticky="nw")
+
+        color_frame: LabelFrame = LabelFrame(self, text="Color")
+        color_frame.grid(row=0, column=2, sticky="nw")
+        self.colorbtn: Colorbutton = Colorbutton(color_frame, command=self.choose_color)
+        self.colorbtn.grid(row=0, column=0)
+        self.colorlabel: Label = Label(color_frame, text="Any")
+        self.colorlabel.grid(row=0, column=1)
+        Button(color_frame, image=geticon(delete_path, height=BUTTON_ICON_HEIGHT), style="Red.TButton",
+               command=lambda: self.set_filter_color(None)).grid(row=0, column=2)
+
+        self.listbox: Listbox = Listbox(self, width=60, height=15)
+        self.listbox.grid(row=1, column=0, columnspan=3, sticky="nesw")
+        self.listbox.bind("<Double-Button-1>", lambda e: self.open())
+        self.listbox.bind("<Return>", lambda e: self.open())
+        Button(self, text="Open", command=self.open).grid(row=2, column=2, sticky="e")
+
+        self.search()
+
+    def choose_color(self) -> None:
+        """
+        Colorchooser for the color filter
+        :return: None
+        """
+        color: tuple[tuple[int, int, int], str] | tuple[None, None] = colorchooser.askcolor(
+            initialcolor=self.color or "#ffffff", title="Choose Color", parent=self)
+        if color[1]:
+            self.set_filter_color(color[1])
+
+    def set_filter_color(self, color: str | None) -> None:
+        """
+        Sets the color filter
+        :param color: color, None for any color
+        :return: None
+        """
+        self.color = color
+        self.colorbtn.set_color(color or "#ffffff")
+        self.colorlabel.config(text=color or "Any")
+        self.schedule_search()
+
+    def schedule_search(self) -> None:
+        """
+        Schedules search after UPDATE_DELAY, so typing a query searches once
+        :return: None
+        """
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(UPDATE_DELAY, self.search)
+
+    def search(self) -> None:
+        """
+        Shows the patterns matching the filters
+        :return: None
+        """
+        self._search_job = None
+        threads: int | None = int(self.threadsvar.get()) if self.threadsvar.get() else None
+        self.results = self.library.search(self.searchvar.get(), self.prefixvar.get(), threads, self.color,
+                                           COLOR_TOLERANCE)
+        self.listbox.delete(0, "end")
+        for i in self.results:
+            self.listbox.insert("end", f"{i.name} — {i.threads} threads, {i.rows} rows")
+
+    def open(self) -> None:
+        """
+        Opens the selected pattern and closes the dialog
+        :return: None
+        """
+        selection: tuple[int, ...] = self.listbox.curselection()
+        if selection:
+            self.command(self.results[selection[0]].path)
+            self.destroy()
+
 
+# Window with a notebook of pattern tabs, the base of Window and PatternWindow
+class TabWindow:
+    """
+    Window with a notebook of pattern tabs. Mixed into Window, the main window, and PatternWindow. Every window is
+    a toplevel of one Tk interpreter, so images from geticon() and Colorbutton work in all of them
+    """
+    main: Window
+    library: Library
+    autosave: Autosave
+
+    def build(self, main: Window) -> None:
+        """
+        Creates the menu and the empty notebook. Call from the constructor
+        :param main: main window, owner of the library and the autosave
+        :return: None
+        """
+        self.main = main
+        self.library = main.library
+        self.autosave = main.autosave
         self.title("Fenechki")
 
         self.min_geometry: tuple[int, int] = (0, 0)
+        self._geometry_job: str | None = None  # pending layout pass from after_idle()
+        self._center_geometry: bool = False  # whether the pending layout pass centers the window
 
         self.color: str | tuple[int, int, int] = "#ff0000"
         self.alt_color: str | tuple[int, int, int] = "#ffffff"
-
-        self.style: Style = Style()
-        self.style.configure("Red.TButton", foreground="red")
-
-        self.notebook: Notebook = Notebook()
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        menu: Menu = Menu(self)
+        file_menu: Menu = Menu(menu, tearoff=0)
+        file_menu.add_command(label="New", accelerator="Ctrl+N", command=self.add_new_tab)
+        file_menu.add_command(label="Open...", accelerator="Ctrl+O", command=self.open_dialog)
+        file_menu.add_command(label="Export...", accelerator="Ctrl+E", command=self.export_pattern)
+        file_menu.add_command(label="Import image...", accelerator="Ctrl+I", command=self.import_image)
+        file_menu.add_separator()
+        file_menu.add_command(label="Compare with...", command=self.compare_pattern)
+        file_menu.add_command(label="Merge...", command=self.merge_pattern)
+        file_menu.add_command(label="Clear marks", command=self.clear_marks)
+        menu.add_cascade(label="File", menu=file_menu)
+        window_menu: Menu = Menu(menu, tearoff=0)
+        window_menu.add_command(label="New window", accelerator="Ctrl+Shift+N", command=self.new_window)
+        window_menu.add_command(label="Show in new window", command=lambda: self.new_window(self.current_view()))
+        menu.add_cascade(label="Window", menu=window_menu)
+        session_menu: Menu = Menu(menu, tearoff=0)
+        session_menu.add_command(label="Host...", command=self.host_session)
+        session_menu.add_command(label="Join...", command=self.join_session)
+        session_menu.add_command(label="Leave", command=self.leave_session)
+        menu.add_cascade(label="Session", menu=session_menu)
+        self.config(menu=menu)
+        # Bound to the window, not the application, so a shortcut acts on the window it is pressed in
+        self.bind("<Control-n>", lambda e: self.add_new_tab())
+        self.bind("<Control-N>", lambda e: self.new_window())
+        self.bind("<Control-o>", lambda e: self.open_dialog())
+        self.bind("<Control-e>", lambda e: self.export_pattern())
+        self.bind("<Control-i>", lambda e: self.import_image())
+
+        self.notebook: Notebook = Notebook(self)
         self.notebook.grid(row=0, column=0, sticky="nw")
         self.tabs: list[Custom] = []
 
-        # Not derived from Custom, but will be removed when Custom is complete
-        self.tabs.append(Kumihimo(self.notebook, self))
-        self.tabs.append(Flat(self.notebook, self))
-
-        # Maybe everything will be stored in one json file
-        with open(filenames_path, "r", encoding="utf-8") as f:
-            for i in f.readlines()[:-1]:
-                self.tabs.append(Custom(self.notebook, self, f"{directory}/{i}"))
-        self.tabs.append(New(self.notebook, self))
-
+    def _add_tabs(self) -> None:
+        """
+        Adds self.tabs to the notebook. The last tab is New, choosing it adds a tab
+        Not intended for use outside the class
+        :return: None
+        """
         for i in self.tabs:
             if i.icon:
                 self.notebook.add(i, text=i.name, image=i.icon, compound=i.compound)
             else:
                 self.notebook.add(i, text=i.name)
-
         self.set_geometry(True)
-
         self.notebook.bind("<<NotebookTabChanged>>",
                            lambda e: self.add_new_tab() if self.notebook.index("current") == len(self.tabs) - 1
                            else None)
-        self.bind_all("<Button-1>", lambda e: e.widget.focus_set() if isinstance(e.widget, Widget) else None)
+
+    def current_view(self) -> Custom | None:
+        """
+        :return: current tab, None if it isn't a Custom
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        return tab if isinstance(tab, Custom) else None
+
+    def new_window(self, view: Custom | None = None) -> None:
+        """
+        Opens another window
+        :param view: tab whose pattern the window shows, a new pattern by default
+        :return: None
+        """
+        PatternWindow(self.main, view)
+
+    def host_session(self) -> None:
+        """
+        Starts a collaboration server on the LAN with the pattern of the current tab and joins it
+        :return: None
+        """
+        view: Custom | None = self.current_view()
+        if view is None:
+            return
+        port: int | None = simpledialog.askinteger("Host session", "Port:", parent=self, initialvalue=COLLAB_PORT,
+                                                   minvalue=1, maxvalue=65535)
+        if port is None:
+            return
+        view.compile_groups()
+        view.connect(Connection(view.pattern, "", port, Server(view.pattern)))
+
+    def join_session(self) -> None:
+        """
+        Joins a collaboration server. The pattern of the current tab is replaced by the shared one
+        :return: None
+        """
+        view: Custom | None = self.current_view()
+        if view is None:
+            return
+        address: str | None = simpledialog.askstring("Join session", "Server address:", parent=self,
+                                                     initialvalue=f"localhost:{COLLAB_PORT}")
+        if not address:
+            return
+        host, _, port = address.rpartition(":") if ":" in address else (address, "", str(COLLAB_PORT))
+        if not port.isdigit():
+            messagebox.showerror(title="Join session", message=f"{port} is not a port")
+            return
+        view.connect(Connection(view.pattern, host, int(port)))
+
+    def leave_session(self) -> None:
+        """
+        Leaves the collaboration session of the current tab. Hosting tabs stop their server
+        :return: None
+        """
+        view: Custom | None = self.current_view()
+        if view is not None:
+            view.disconnect()
 
     def set_geometry(self, center: bool = True) -> None:
         """
-        Positions the window
+        Schedules a layout pass that positions the window. Calls made before the event loop is idle are coalesced
         :param center: centers the window
         :return: None
         """
-        self.notebook.update()
+        self._center_geometry = self._center_geometry or center
+        if self._geometry_job is None:
+            # Grid and Notebook propagate requested sizes in idle callbacks too, so let them run first
+            self._geometry_job = self.after_idle(self.after_idle, self._layout)
 
-        self.min_geometry = (self.notebook.winfo_width() + 5, self.notebook.winfo_height() + 5)
+    def _layout(self) -> None:
+        """
+        Layout pass scheduled by set_geometry. Sizes the window from the Notebook's requested size
+        Not intended for use outside the class
+        :return: None
+        """
+        center: bool = self._center_geometry
+        self._geometry_job = None
+        self._center_geometry = False
+
+        self.min_geometry = (self.notebook.winfo_reqwidth() + 5, self.notebook.winfo_reqheight() + 5)
 
         if self.min_geometry[0] > self.winfo_screenwidth():
             self.min_geometry = (self.winfo_screenwidth(), self.min_geometry[1])
@@ -1465,12 +2326,14 @@ class Window(Tk):
         else:
             self.geometry(f"{self.min_geometry[0]}x{self.min_geometry[1]}")
 
-    def add_new_tab(self) -> None:
+    def add_new_tab(self, path: str | None = None, view: Custom | None = None) -> None:
         """
         Adds a new custom tab
+        :param path: path to saved file
+        :param view: tab whose pattern the new tab shows
         :return: None
         """
-        self.tabs.insert(-1, Custom(self.notebook, self))
+        self.tabs.insert(-1, Custom(self.notebook, self, path, view=view))
         if self.tabs[-2].icon:
             self.notebook.insert(len(self.tabs) - 2, self.tabs[-2], text=self.tabs[-2].name, image=self.tabs[-2].icon,
                                  compound=self.tabs[-2].compound)
@@ -1479,6 +2342,152 @@ class Window(Tk):
         self.notebook.select(len(self.tabs) - 2)
         self.set_geometry()
 
+    def open_dialog(self) -> None:
+        """
+        Shows a dialog for opening a pattern from the library
+        :return: None
+        """
+        OpenDialog(self, self.library, self.open_pattern)
+
+    def open_pattern(self, path: str) -> None:
+        """
+        Opens a saved pattern in a new tab, or selects its tab if it is already open in this window.
+        A pattern open in another window gets a view of the same model
+        :param path: path to saved file
+        :return: None
+        """
+        for idx, i in enumerate(self.tabs):
+            if getattr(i, "path", None) is not None and os.path.abspath(i.path) == os.path.abspath(path):
+                self.notebook.select(idx)
+                return
+        self.add_new_tab(path)
+
+    def export_pattern(self) -> None:
+        """
+        Exports the pattern of the current tab to PNG, SVG or a text chart
+        :return: None
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        if not hasattr(tab, "pattern"):
+            return
+        path: str = filedialog.asksaveasfilename(title="Export pattern", initialfile=tab.name,
+                                                 defaultextension=".png",
+                                                 filetypes=[("PNG image", "*.png"), ("SVG image", "*.svg"),
+                                                            ("Text chart", "*.txt")])
+        if not path:
+            return
+        try:
+            export(tab.pattern, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror(title="Export pattern", message=f"Can't export {path}:\n{e}")
+
+    def import_image(self) -> None:
+        """
+        Converts an image into the pattern of the current tab, keeping its thread groups if the rows don't change
+        :return: None
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        if not isinstance(tab, Custom):
+            return
+        path: str = filedialog.askopenfilename(title="Import image", filetypes=[
+            ("All images", ("*.png", "*.jpg", "*.jpeg", "*.bmp", "*.gif")), ("All files", "*")])
+        if not path:
+            return
+        try:
+            rows: int | None = simpledialog.askinteger("Import image", "Rows:", parent=self, minvalue=1,
+                                                       initialvalue=fit_rows(path, tab.cols))
+            colors: int | None = simpledialog.askinteger("Import image", "Colors:", parent=self, minvalue=1,
+                                                         maxvalue=RASTER_BACKGROUND, initialvalue=tab.threads)
+            if rows is None or colors is None:
+                return
+            tab.compile_groups()
+            template: Pattern = tab.pattern if rows == tab.rows else Pattern(rows, tab.cols, tab.threads)
+            conversion: Conversion = convert_image(path, template, colors, COLOR_TOLERANCE)
+        except ImportError as e:
+            messagebox.showerror(title="Import image", message=f"Importing images needs Pillow and NumPy, install "
+                                                              f"them with pip install -r requirements.txt:\n{e}")
+            return
+        except (OSError, ValueError) as e:
+            messagebox.showerror(title="Import image", message=f"Can't import {path}:\n{e}")
+            return
+        tab.pattern.replace(conversion.pattern)
+        if conversion.conflicts:
+            messagebox.showinfo(title="Import image",
+                                message=f"{len(conversion.conflicts)} rhombuses can't match the image with these "
+                                        f"thread groups, the closest pattern is shown")
+
+    def ask_pattern(self, title: str) -> Pattern | None:
+        """
+        Asks for a pattern file and reads it
+        :param title: dialog title
+        :return: pattern, None if the user cancels or the file can't be read
+        """
+        path: str = filedialog.askopenfilename(title=title, initialdir=directory,
+                                               filetypes=[("Pattern", "*.json"), ("All files", "*")])
+        if not path:
+            return None
+        try:
+            return read_pattern(path, self.library.store, COLOR_TOLERANCE)[1]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            messagebox.showerror(title=title, message=f"Can't open {path}:\n{e}")
+            return None
+
+    def compare_pattern(self) -> None:
+        """
+        Marks the circles and rhombuses of the current tab that differ from a saved pattern
+        :return: None
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        if not isinstance(tab, Custom):
+            return
+        old: Pattern | None = self.ask_pattern("Compare with")
+        if old is None:
+            return
+        tab.compile_groups()
+        changes: Diff = diff(old, tab.pattern)
+        tab.mark(changes.cells, changes.thread_colors)
+        layout: list[str] = [f"{name}: {i[0]} -> {i[1]}" for name, i in
+                             (("Rows", changes.rows), ("Columns", changes.cols), ("Threads", changes.threads)) if i]
+        if changes.groups:
+            layout.append(f"Groups of threads {', '.join(str(n + 1) for n in changes.groups)} changed")
+        if layout or not changes:
+            messagebox.showinfo(title="Compare with", message="\n".join(layout) or "The patterns are equal")
+
+    def merge_pattern(self) -> None:
+        """
+        Merges a pattern changed from the same base into the current tab, marking conflicting rhombuses
+        :return: None
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        if not isinstance(tab, Custom):
+            return
+        base: Pattern | None = self.ask_pattern("Merge: common base")
+        theirs: Pattern | None = self.ask_pattern("Merge: pattern to merge") if base is not None else None
+        if theirs is None:
+            return
+        tab.compile_groups()
+        try:
+            merged: Merge = merge(base, tab.pattern, theirs, COLOR_TOLERANCE)
+        except ValueError as e:
+            messagebox.showerror(title="Merge", message=str(e))
+            return
+        tab.pattern.replace(merged.pattern)
+        tab.mark(merged.conflicts, merged.thread_conflicts, "conflict", "red")
+        if merged.conflicts or merged.thread_conflicts:
+            messagebox.showinfo(title="Merge", message=f"{len(merged.conflicts)} rhombuses and "
+                                                       f"{len(merged.thread_conflicts)} threads conflict, "
+                                                       f"they are marked red and keep this tab's version")
+
+    def clear_marks(self) -> None:
+        """
+        Removes the marks of compare_pattern and merge_pattern from the current tab
+        :return: None
+        """
+        tab: Custom = self.tabs[self.notebook.index("current")]
+        if isinstance(tab, Custom):
+            tab.mark(tag="diff")
+            tab.mark(tag="conflict")
+
     def delete(self, obj: Custom) -> None:
         """
         Deletes the tab with obj
@@ -1488,7 +2497,7 @@ class Window(Tk):
         idx: int = self.tabs.index(obj)
         self.tabs.pop(idx)
         obj.destroy()
-        self.notebook.select(idx - 1)
+        self.notebook.select(max(idx - 1, 0))
         self.set_geometry()
 
     def updatetab(self, obj: Custom) -> None:
@@ -1497,6 +2506,8 @@ class Window(Tk):
         :param obj: instance of Custom to update
         :return: None
         """
+        if obj not in self.tabs:  # still being constructed
+            return
         idx: int = self.tabs.index(obj)
         if obj.icon is not None:
             self.notebook.tab(idx, text=obj.name, image=obj.icon, compound=obj.compound)
@@ -1504,5 +2515,94 @@ class Window(Tk):
             self.notebook.tab(idx, text=obj.name, image="")
 
 
+# Main window class. Use this or a class with these methods
+class Window(TabWindow, Tk):
+    """
+    Main window class. Use this or a class with these methods. Owns the library and the autosave of all windows
+    """
+    def __init__(self, *args, **kwargs) -> None:
+        """
+        Main window class. Use this or similar
+        :param args: Tk options
+        :param kwargs: Tk options
+        """
+        super().__init__(*args, **kwargs)
+
+        self.style: Style = Style()
+        self.style.configure("Red.TButton", foreground="red")
+
+        # Patterns from filenames_path are opened from the library instead of each getting a tab
+        self.library = Library(directory, filenames_path, index_path, blobs_path)
+        self.autosave = Autosave(autosave_path)
+        self.worker: concurrent.futures.ThreadPoolExecutor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="worker")  # library updates and pattern checks, off the GUI thread
+        self.worker.submit(self.library.update)
+        self.windows: list[TabWindow] = [self]  # open windows, this one first
+        self.build(self)
+
+        # Not derived from Custom, but will be removed when Custom is complete
+        self.tabs.append(Kumihimo(self.notebook, self))
+        self.tabs.append(Flat(self.notebook, self))
+        for i in self.autosave.journals():  # tabs from the last session
+            self.tabs.append(Custom(self.notebook, self, journal=i))
+        self.tabs.append(New(self.notebook, self))
+        self._add_tabs()
+
+        self.after_idle(preload_icons)  # icons of the hidden editors, before they are opened
+        self.bind_all("<Button-1>", lambda e: e.widget.focus_set() if isinstance(e.widget, Widget) else None)
+
+    def find_view(self, path: str) -> Custom | None:
+        """
+        Finds a tab with a saved pattern in any window
+        :param path: path to saved file
+        :return: tab, None if the pattern isn't open
+        """
+        for window in self.windows:
+            for i in window.tabs:
+                if isinstance(i, Custom) and i.path is not None and os.path.abspath(i.path) == os.path.abspath(path):
+                    return i
+        return None
+
+    def close(self) -> None:
+        """
+        Writes the autosave journals and closes all windows
+        :return: None
+        """
+        self.autosave.close()
+        self.library.close()
+        self.worker.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+
+# Another window with pattern tabs
+class PatternWindow(TabWindow, Toplevel):
+    """
+    Another window with pattern tabs, for example to show a pattern side by side or on a second monitor
+    """
+    def __init__(self, main: Window, view: Custom | None = None, *args, **kwargs) -> None:
+        """
+        Opens the window with one tab
+        :param main: main window
+        :param view: tab whose pattern the window shows, a new pattern by default
+        :param args: Toplevel options
+        :param kwargs: Toplevel options
+        """
+        super().__init__(main, *args, **kwargs)
+        self.build(main)
+        main.windows.append(self)
+        self.tabs.append(Custom(self.notebook, self, view=view))
+        self.tabs.append(New(self.notebook, self))
+        self._add_tabs()
+
+    def close(self) -> None:
+        """
+        Closes the window. Journals of patterns still shown in another window are taken over by a view there, the
+        others are restored with the next session like those of the main window
+        :return: None
+        """
+        self.main.windows.remove(self)
+        self.destroy()
+
+
 if __name__ == "__main__":
     Window().mainloop()
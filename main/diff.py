@@ -0,0 +1,185 @@
+"""
+Diff and three-way merge of patterns. Colors are compared by value, so patterns with different palettes compare
+correctly. Grids are compared in packed chunks, only chunks that differ are scanned cell by cell.
+Does not use tkinter
+"""
+import array
+import itertools
+import typing
+
+from pattern import Palette, Pattern
+
+DIFF_CHUNK: int = 1024  # cells compared together before looking at single cells
+
+
+class Diff(typing.NamedTuple):
+    """
+    Result of diff. Cells and threads are numbered like in the new pattern
+    """
+    rows: tuple[int, int] | None  # old and new rows, None if they are equal
+    cols: tuple[int, int] | None  # old and new columns, None if they are equal
+    threads: tuple[int, int] | None  # old and new number of threads, None if they are equal
+    groups: list[int]  # threads whose group changed, only if the grid and the threads are equal
+    thread_colors: list[int]  # threads in both patterns whose color changed
+    cells: list[int]  # cells in the grid both patterns have whose color changed
+
+    def __bool__(self) -> bool:
+        return any(self)
+
+
+class Merge(typing.NamedTuple):
+    """
+    Result of merge
+    """
+    pattern: Pattern  # merged pattern, conflicts are taken from ours
+    conflicts: list[int]  # cells changed to different colors in ours and theirs
+    thread_conflicts: list[int]  # threads whose color or group changed differently in ours and theirs
+
+
+def _color_ids(patterns: typing.Iterable[Pattern]) -> tuple[list[str], list[list[int]]]:
+    """
+    Numbers the colors of several palettes together, equal colors get equal ids
+    Not intended for use outside the module
+    :param patterns: patterns
+    :return: color of every id, id of every palette entry of every pattern
+    """
+    ids: dict[str, int] = {}
+    tables: list[list[int]] = [[ids.setdefault(color, len(ids)) for color in i.palette] for i in patterns]
+    return list(ids), tables
+
+
+def _packed(values: bytearray, table: list[int], wide: bool) -> bytes | array.array:
+    """
+    Translates palette indices to color ids
+    Not intended for use outside the module
+    :param values: palette indices
+    :param table: color id of every palette index
+    :param wide: some ids don't fit in a byte
+    :return: color ids
+    """
+    if wide:
+        return array.array("H", map(table.__getitem__, values))
+    return bytes(values).translate(bytes(table).ljust(256, b"\0"))
+
+
+def _grid(pattern: Pattern, packed: bytes | array.array, rows: int, cols: int
+          ) -> tuple[bytes | array.array, list[int]]:
+    """
+    Cuts the part of a grid with the given rows and columns out of packed cell colors
+    Not intended for use outside the module
+    :param pattern: pattern
+    :param packed: color ids of its cells
+    :param rows: rows to keep
+    :param cols: columns to keep
+    :return: color ids of the kept cells, and the index of the first kept cell of every row and grid
+    """
+    if rows == pattern.rows and cols == pattern.cols:
+        return packed, []
+    inner: int = pattern.rows * pattern.cols
+    parts: list[bytes | array.array] = []
+    starts: list[int] = []
+    for start, step, width in ((0, pattern.cols, cols), (inner, pattern.cols - 1, cols - 1)):
+        for row in range(rows):
+            starts.append(start + row * step)
+            parts.append(packed[start + row * step:start + row * step + width])
+    if isinstance(packed, bytes):
+        return b"".join(parts), starts
+    return array.array("H", itertools.chain.from_iterable(parts)), starts
+
+
+def _changed(a: typing.Sequence[int], b: typing.Sequence[int]) -> list[int]:
+    """
+    Positions where two equally long sequences differ, comparing them in chunks
+    Not intended for use outside the module
+    :param a: first sequence
+    :param b: second sequence
+    :return: positions
+    """
+    changed: list[int] = []
+    for start in range(0, len(a), DIFF_CHUNK):
+        if a[start:start + DIFF_CHUNK] != b[start:start + DIFF_CHUNK]:
+            changed.extend(i for i in range(start, min(start + DIFF_CHUNK, len(a))) if a[i] != b[i])
+    return changed
+
+
+def diff(old: Pattern, new: Pattern) -> Diff:
+    """
+    Compares two patterns in time linear in the number of cells
+    :param old: old pattern
+    :param new: new pattern
+    :return: layout changes, threads and cells whose color changed
+    """
+    colors, (old_table, new_table) = _color_ids((old, new))
+    wide: bool = len(colors) > 256
+    rows: int = min(old.rows, new.rows)
+    cols: int = min(old.cols, new.cols)
+    old_cells, _ = _grid(old, _packed(old.cell_colors, old_table, wide), rows, cols)
+    new_cells, starts = _grid(new, _packed(new.cell_colors, new_table, wide), rows, cols)
+    cells: list[int] = _changed(old_cells, new_cells)
+    if starts:  # positions in the cut grid back to cell indices of the new pattern
+        cells = [starts[i // cols] + i % cols if i < rows * cols else
+                 starts[rows + (i - rows * cols) // (cols - 1)] + (i - rows * cols) % (cols - 1) for i in cells]
+    threads: int = min(old.threads, new.threads)
+    layout_equal: bool = (old.rows, old.cols, old.threads) == (new.rows, new.cols, new.threads)
+    return Diff(None if old.rows == new.rows else (old.rows, new.rows),
+                None if old.cols == new.cols else (old.cols, new.cols),
+                None if old.threads == new.threads else (old.threads, new.threads),
+                [n for n in range(threads) if sorted(old.groups[n]) != sorted(new.groups[n])] if layout_equal else [],
+                [n for n in range(threads) if old_table[old.thread_colors[n]] != new_table[new.thread_colors[n]]],
+                cells)
+
+
+def merge(base: Pattern, ours: Pattern, theirs: Pattern, tolerance: float = 0) -> Merge:
+    """
+    Three-way merge: changes from base made in only one of ours and theirs are taken, cells and threads changed
+    differently in both are conflicts and keep our version
+    :param base: common ancestor
+    :param ours: our pattern
+    :param theirs: their pattern
+    :param tolerance: palette tolerance of the merged pattern
+    :return: merged pattern and conflicts
+    """
+    if not (base.rows, base.cols, base.threads) == (ours.rows, ours.cols, ours.threads) == \
+           (theirs.rows, theirs.cols, theirs.threads):
+        raise ValueError("Can't merge patterns with different rows, columns or threads")
+    colors, tables = _color_ids((base, ours, theirs))
+    wide: bool = len(colors) > 256
+    packed_base, packed_ours, packed_theirs = (_packed(i.cell_colors, j, wide) for i, j in zip((base, ours, theirs),
+                                                                                            tables))
+    merged: list[int] = list(packed_ours)
+    conflicts: list[int] = []
+    for start in range(0, len(merged), DIFF_CHUNK):
+        stop: int = min(start + DIFF_CHUNK, len(merged))
+        if packed_theirs[start:stop] == packed_base[start:stop]:
+            continue
+        if packed_ours[start:stop] == packed_base[start:stop]:
+            merged[start:stop] = packed_theirs[start:stop]
+            continue
+        for i in range(start, stop):
+            if packed_ours[i] == packed_base[i]:
+                merged[i] = packed_theirs[i]
+            elif packed_theirs[i] != packed_base[i] and packed_theirs[i] != packed_ours[i]:
+                conflicts.append(i)
+
+    thread_ids: list[list[int]] = [[table[i] for i in pattern.thread_colors]
+                                   for pattern, table in zip((base, ours, theirs), tables)]
+    thread_colors: list[int] = []
+    groups: list[list[int]] = []
+    thread_conflicts: set[int] = set()
+    for n in range(base.threads):
+        color_base, color_ours, color_theirs = (i[n] for i in thread_ids)
+        thread_colors.append(color_theirs if color_ours == color_base else color_ours)
+        if color_ours != color_base and color_theirs not in (color_base, color_ours):
+            thread_conflicts.add(n)
+        group_base, group_ours, group_theirs = (sorted(i.groups[n]) for i in (base, ours, theirs))
+        groups.append(group_theirs if group_ours == group_base else group_ours)
+        if group_ours != group_base and group_theirs not in (group_base, group_ours):
+            thread_conflicts.add(n)
+
+    palette: Palette = Palette(tolerance=tolerance)
+    used: dict[int, int] = {i: palette.index(colors[i]) for i in sorted(set(merged) | set(thread_colors))}
+    pattern: Pattern = Pattern(base.rows, base.cols, base.threads, palette)
+    pattern.set_groups(groups)
+    pattern.cell_colors[:] = bytes(map(used.__getitem__, merged))
+    pattern.thread_colors[:] = bytes(map(used.__getitem__, thread_colors))
+    return Merge(pattern, conflicts, sorted(thread_conflicts))
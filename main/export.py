@@ -0,0 +1,226 @@
+"""
+Streaming export of patterns to PNG, SVG and text charts. Patterns are written row by row, so memory use
+doesn't grow with the pattern length. Does not use tkinter or PIL
+"""
+import string
+import struct
+import typing
+import zlib
+
+from geometry import border_clip, rhombus_template
+from pattern import Pattern, color_to_rgb
+
+EXPORT_WIDTH: int = 20  # half-width of a cell in pixels
+EXPORT_HEIGHT: int = 30  # half-height of a cell in pixels
+PNG_STRIP_ROWS: int = 16  # pattern rows compressed together
+BACKGROUND: str = "#ffffff"
+OUTLINE: str = "#000000"
+RASTER_BACKGROUND: int = 254  # palette index of the background in raster, the same for every palette size
+RASTER_OUTLINE: int = 255  # palette index of the outline in raster
+SYMBOLS: str = string.ascii_uppercase + string.ascii_lowercase + string.digits  # text chart symbols
+
+
+def iter_rows(pattern: Pattern, start: int = 0, stop: int | None = None) -> typing.Iterator[tuple[bytes, bytes]]:
+    """
+    Generator over the rows of a pattern
+    :param pattern: pattern
+    :param start: first row
+    :param stop: row after the last one, the end of the pattern by default
+    :return: palette indices of the outer and the inner cells of each row
+    """
+    inner_start: int = pattern.rows * pattern.cols
+    for row in range(start, pattern.rows if stop is None else min(stop, pattern.rows)):
+        yield (bytes(pattern.cell_colors[row * pattern.cols:(row + 1) * pattern.cols]),
+               bytes(pattern.cell_colors[inner_start + row * (pattern.cols - 1):
+                                         inner_start + (row + 1) * (pattern.cols - 1)]))
+
+
+def export(pattern: Pattern, path: str) -> None:
+    """
+    Exports a pattern, choosing the format by file extension: .png, .svg, anything else is a text chart
+    :param pattern: pattern
+    :param path: file path
+    :return: None
+    """
+    if path.lower().endswith(".png"):
+        export_png(pattern, path)
+    elif path.lower().endswith(".svg"):
+        export_svg(pattern, path)
+    else:
+        export_text(pattern, path)
+
+
+def _png_chunk(f: typing.BinaryIO, kind: bytes, data: bytes) -> None:
+    """
+    Writes a PNG chunk
+    Not intended for use outside the module
+    :param f: file
+    :param kind: chunk type
+    :param data: chunk data
+    :return: None
+    """
+    f.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+def _templates(cols: int, cell_width: int, cell_height: int) -> list[bytes | list[int]]:
+    """
+    Rasterizes the pixel rows of one pattern row into slots, which are the same for every row:
+    outer cells of the row, its inner cells, outer cells of the next row, background and outline.
+    Cell (i, j) in doubled coordinates covers |u - i| + |v - j| <= 1, u and v in cell half-widths and half-heights
+    Not intended for use outside the module
+    :param cols: grid columns
+    :param cell_width: half-width of a cell in pixels
+    :param cell_height: half-height of a cell in pixels
+    :return: slot of every pixel, for every pixel row
+    """
+    width: int = max(2 * (cols - 1) * cell_width, 1)
+    background: int = 3 * cols - 1
+    templates: list[bytes | list[int]] = []
+    for y in range(2 * cell_height):
+        v: float = (y + 0.5) / cell_height
+        line: list[int] = [background] * width
+        for j in (int(v), int(v) + 1):
+            half: float = 1 - abs(v - j)
+            for col in range(cols - j % 2):
+                i: int = col * 2 + j % 2
+                x0: int = max(round((i - half) * cell_width), 0)
+                x1: int = min(round((i + half) * cell_width), width)
+                if x1 > x0:
+                    line[x0:x1] = [j * cols - j // 2 + col] * (x1 - x0)
+                    line[x0] = background + 1
+        templates.append(bytes(line) if background + 1 < 256 else line)
+    return templates
+
+
+def raster_size(pattern: Pattern, cell_width: int = EXPORT_WIDTH, cell_height: int = EXPORT_HEIGHT
+                ) -> tuple[int, int]:
+    """
+    :param pattern: pattern
+    :param cell_width: half-width of a cell in pixels
+    :param cell_height: half-height of a cell in pixels
+    :return: width and height of the rasterized pattern
+    """
+    return max(2 * (pattern.cols - 1) * cell_width, 1), (2 * pattern.rows - 1) * cell_height
+
+
+def raster_palette(pattern: Pattern) -> bytes:
+    """
+    :param pattern: pattern
+    :return: RGB bytes of all 256 indices from raster: the palette, padding, the background and the outline
+    """
+    colors: bytes = b"".join(bytes(color_to_rgb(i) or (128, 128, 128)) for i in pattern.palette)
+    return colors.ljust(RASTER_BACKGROUND * 3, b"\x80") + bytes(color_to_rgb(BACKGROUND)) + bytes(color_to_rgb(OUTLINE))
+
+
+def raster(pattern: Pattern, cell_width: int = EXPORT_WIDTH, cell_height: int = EXPORT_HEIGHT, start: int = 0,
+           stop: int | None = None) -> typing.Iterator[bytes]:
+    """
+    Generator over the pixel rows of a pattern. Every pixel row is a precomputed template translated with
+    the colors of the current row. Pattern row n covers pixel rows 2 * n * cell_height to
+    (2 * n + 2) * cell_height, the last one only half of that.
+    Pixels are palette indices, with RASTER_BACKGROUND and RASTER_OUTLINE for the background and the outline
+    :param pattern: pattern
+    :param cell_width: half-width of a cell in pixels
+    :param cell_height: half-height of a cell in pixels
+    :param start: first pattern row
+    :param stop: pattern row after the last one, the end of the pattern by default
+    :return: pixel rows
+    """
+    if len(pattern.palette) > RASTER_BACKGROUND:
+        raise ValueError("Too many colors to rasterize")
+    background: int = RASTER_BACKGROUND
+    outline: int = RASTER_OUTLINE
+    cols: int = pattern.cols
+    templates: list[bytes | list[int]] = _templates(cols, cell_width, cell_height)
+    generator: typing.Iterator[tuple[bytes, bytes]] = iter_rows(pattern, start, None if stop is None else stop + 1)
+    following: tuple[bytes, bytes] | None = next(generator, None)
+    for row in range(start, pattern.rows if stop is None else min(stop, pattern.rows)):
+        outer, inner = following
+        following = next(generator, None)
+        table: bytearray = bytearray(max(3 * cols + 1, 256))
+        table[:3 * cols + 1] = (outer + inner + (following[0] if following else bytes([background]) * cols)
+                                + bytes([background, outline]))
+        for template in templates[:2 * cell_height if row < pattern.rows - 1 else cell_height]:
+            if isinstance(template, bytes):
+                yield template.translate(table)
+            else:  # too many columns for byte slots
+                yield bytes(map(table.__getitem__, template))
+
+
+def export_png(pattern: Pattern, path: str, cell_width: int = EXPORT_WIDTH, cell_height: int = EXPORT_HEIGHT,
+               strip_rows: int = PNG_STRIP_ROWS) -> None:
+    """
+    Writes a pattern as an indexed PNG, compressing it in strips of rows
+    :param pattern: pattern
+    :param path: file path
+    :param cell_width: half-width of a cell in pixels
+    :param cell_height: half-height of a cell in pixels
+    :param strip_rows: pattern rows compressed together
+    :return: None
+    """
+    width, height = raster_size(pattern, cell_width, cell_height)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0))
+        _png_chunk(f, b"PLTE", raster_palette(pattern))
+        compressor: typing.Any = zlib.compressobj()
+        strip: list[bytes] = []
+        for line in raster(pattern, cell_width, cell_height):
+            strip.append(b"\x00" + line)
+            if len(strip) >= strip_rows * 2 * cell_height:
+                data: bytes = compressor.compress(b"".join(strip))
+                strip = []
+                if data:
+                    _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", compressor.compress(b"".join(strip)) + compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+
+
+def export_svg(pattern: Pattern, path: str, cell_width: int = EXPORT_WIDTH, cell_height: int = EXPORT_HEIGHT) -> None:
+    """
+    Writes a pattern as SVG, one polygon per cell, clipped at the border like on the canvas
+    :param pattern: pattern
+    :param path: file path
+    :param cell_width: half-width of a cell in pixels
+    :param cell_height: half-height of a cell in pixels
+    :return: None
+    """
+    width, height = raster_size(pattern, cell_width, cell_height)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                f'viewBox="0 0 {width} {height}">\n'
+                f'<rect width="{width}" height="{height}" fill="{BACKGROUND}"/>\n'
+                f'<g stroke="{OUTLINE}">\n')
+        for row, (outer, inner) in enumerate(iter_rows(pattern)):
+            for offset, cells in ((0, outer), (1, inner)):
+                cy: int = (2 * row + offset) * cell_height
+                for col, index in enumerate(cells):
+                    cx: int = (2 * col + offset) * cell_width
+                    template: tuple[int, ...] = rhombus_template(cell_width, cell_height,
+                                                                 border_clip(pattern.rows, pattern.cols, row, col,
+                                                                             offset == 1))
+                    points: str = " ".join(f"{template[i] + cx},{template[i + 1] + cy}"
+                                           for i in range(0, len(template), 2))
+                    f.write(f'<polygon points="{points}" fill="{pattern.palette[index]}"/>\n')
+        f.write("</g>\n</svg>\n")
+
+
+def export_text(pattern: Pattern, path: str) -> None:
+    """
+    Writes a pattern as a text chart: a legend, the thread colors and two lines per row, outer cells on
+    even and inner cells on odd columns
+    :param pattern: pattern
+    :param path: file path
+    :return: None
+    """
+    if len(pattern.palette) > len(SYMBOLS):
+        raise ValueError(f"Too many colors for a text chart, at most {len(SYMBOLS)} are supported")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("Legend:\n")
+        for index, color in enumerate(pattern.palette):
+            f.write(f"  {SYMBOLS[index]} {color}\n")
+        f.write(f"Threads: {' '.join(SYMBOLS[i] for i in pattern.thread_colors)}\n")
+        f.write("Rows:\n")
+        for row, (outer, inner) in enumerate(iter_rows(pattern)):
+            f.write(f"{row + 1:6} {'   '.join(SYMBOLS[i] for i in outer)}\n")
+            f.write(f"{'':6}   {'   '.join(SYMBOLS[i] for i in inner)}\n")
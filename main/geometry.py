@@ -0,0 +1,203 @@
+"""
+Canvas layout of a pattern: the center and shape of every rhombus and the position of every thread circle,
+in flat arrays computed once per configuration. Does not use tkinter
+"""
+import array
+import functools
+import math
+
+from layouts import kumihimo_slots, kumihimo_threads
+
+DIAMOND_WIDTH: int = 20  # half-width of a rhombus
+DIAMOND_HEIGHT: int = 30  # half-height of a rhombus
+SMALL_CIRCLE_RADIUS: int = 12
+BIG_CIRCLE_RADIUS: int = 150  # smallest radius of the kumihimo ring, larger rings fit all their slots
+RING_SPACING: int = 2  # gap between the circles of a ring
+SHADOW_OFFSET: int = 10
+GRID_OFFSET: int = 5  # position of the first rhombus on the canvas
+LAYOUT_CACHE_SIZE: int = 32  # layouts kept by layout()
+TOP: int = 1  # clipped corners of a rhombus at the grid border, the bits of a clip
+RIGHT: int = 2
+BOTTOM: int = 4
+LEFT: int = 8
+
+
+@functools.lru_cache(maxsize=None)
+def rhombus_template(cell_width: int, cell_height: int, clip: int = 0) -> tuple[int, ...]:
+    """
+    Polygon of a rhombus centered at 0, 0. A clipped corner is cut off at the center line, a rhombus with
+    two corners left is closed through its center
+    :param cell_width: half-width of a rhombus
+    :param cell_height: half-height of a rhombus
+    :param clip: clipped corners, TOP | RIGHT | BOTTOM | LEFT
+    :return: polygon points
+    """
+    corners: tuple[tuple[int, int], ...] = ((0, -cell_height), (cell_width, 0), (0, cell_height), (-cell_width, 0))
+    points: list[int] = [k for i, corner in enumerate(corners) if not clip & 1 << i for k in corner]
+    if len(points) <= 4:
+        points += (0, 0)
+    return tuple(points)
+
+
+def border_clip(rows: int, cols: int, row: int, col: int, inner: bool) -> int:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :param row: row of the cell
+    :param col: column of the cell
+    :param inner: whether the cell is an inner one, at col + 0.5, row + 0.5
+    :return: corners of the cell clipped at the grid border, one of 9 combinations
+    """
+    if inner:
+        return BOTTOM if row == rows - 1 else 0
+    return (TOP if row == 0 else 0) | (RIGHT if col == cols - 1 else 0) | (LEFT if col == 0 else 0)
+
+
+class Layout:
+    """
+    Positions of the rhombuses and circles of a pattern canvas. Use layout(), which shares equal layouts between
+    tabs. Don't modify it
+    """
+    def __init__(self, rows: int, cols: int, threads: int, cell_width: int = DIAMOND_WIDTH,
+                 cell_height: int = DIAMOND_HEIGHT, ring: bool = False, offset: int = GRID_OFFSET,
+                 slots: int | None = None) -> None:
+        """
+        Computes a layout
+        :param rows: grid rows
+        :param cols: grid columns
+        :param threads: number of threads
+        :param cell_width: half-width of a rhombus
+        :param cell_height: half-height of a rhombus
+        :param ring: circles on a kumihimo ring instead of a row
+        :param offset: position of the first rhombus
+        :param slots: slots of the kumihimo ring, see kumihimo_slots
+        """
+        self.rows: int = rows
+        self.cols: int = cols
+        self.threads: int = threads
+        self.cell_width: int = cell_width
+        self.cell_height: int = cell_height
+        self.offset: int = offset
+        self.circle_radius: int = SMALL_CIRCLE_RADIUS
+
+        grid_width: int = (2 * (cols - 1) - 1) * cell_width + 2 * cell_width
+        grid_height: int = (2 * (rows - 1) - 1) * cell_height + 2 * cell_height
+        radius: int = 0
+        if ring:
+            slots = kumihimo_slots(threads, slots)
+            radius = max(BIG_CIRCLE_RADIUS, math.ceil(slots * (SMALL_CIRCLE_RADIUS + RING_SPACING / 2) / math.pi))
+            grid_height = max(grid_height, 2 * (radius + SMALL_CIRCLE_RADIUS + SHADOW_OFFSET))
+        self.width: int = grid_width + (radius if ring else SMALL_CIRCLE_RADIUS * (threads + 1)) * 2 + \
+            40 + SHADOW_OFFSET * 2
+        self.height: int = grid_height + SHADOW_OFFSET * 2
+
+        cells: int = rows * cols + rows * (cols - 1)
+        self.centers: array.array = array.array("i", [0]) * (cells * 2)  # x, y of every cell
+        self.clips: bytearray = bytearray(cells)  # clipped corners of every cell, see border_clip
+        for index in range(cells):
+            inner: bool = index >= rows * cols
+            row, col = divmod(index - rows * cols, cols - 1) if inner else divmod(index, cols)
+            self.centers[index * 2] = offset + (col * 2 + inner) * cell_width
+            self.centers[index * 2 + 1] = offset + (row * 2 + inner) * cell_height
+            self.clips[index] = border_clip(rows, cols, row, col, inner)
+
+        self.ring: tuple[float, float, float] | None = None  # center and radius of the kumihimo ring
+        self.circles: array.array  # x, y of every thread, NaN for threads without a circle
+        self.circle_threads: list[int] = []  # threads with a circle, in drawing order
+        if ring:
+            cx = grid_width + radius + 20 + SHADOW_OFFSET
+            cy = grid_height // 2 + SHADOW_OFFSET
+            self.ring = (cx, cy, radius)
+            self.circles = array.array("d", [math.nan]) * (slots * 2)
+            for i in kumihimo_threads(threads, slots):
+                angle: float = 2 * math.pi * (i - 0.5) / slots
+                self.circles[i * 2] = cx + radius * math.sin(angle)
+                self.circles[i * 2 + 1] = cy - radius * math.cos(angle)
+                self.circle_threads.append(i)
+        else:
+            self.circles = array.array("d", [math.nan]) * (threads * 2)
+            circles_x: float = (grid_width + 20 + SHADOW_OFFSET +
+                                (self.width - (grid_width + 20 + SHADOW_OFFSET * 7.5)) // 2)
+            sub: int = 0
+            for i in range(threads + 1):
+                if i == threads // 2:  # gap in the middle of the row
+                    sub = 1
+                    continue
+                self.circles[(i - sub) * 2] = circles_x + (i - threads / 2) * SMALL_CIRCLE_RADIUS * 2 + \
+                    SMALL_CIRCLE_RADIUS
+                self.circles[(i - sub) * 2 + 1] = grid_height // 2
+                self.circle_threads.append(i - sub)
+
+    @property
+    def cell_count(self) -> int:
+        """
+        :return: number of rhombuses
+        """
+        return len(self.clips)
+
+    def polygon(self, index: int) -> list[int]:
+        """
+        :param index: cell index
+        :return: polygon points of the cell: its template translated to its center
+        """
+        center: array.array = self.centers[index * 2:index * 2 + 2]
+        return [j + center[i % 2] for i, j in enumerate(rhombus_template(self.cell_width, self.cell_height,
+                                                                           self.clips[index]))]
+
+    def circle(self, n: int) -> tuple[float, float]:
+        """
+        :param n: thread number
+        :return: center of the thread circle
+        """
+        return self.circles[n * 2], self.circles[n * 2 + 1]
+
+    def cell_at(self, x: float, y: float) -> int:
+        """
+        Finds the rhombus at a canvas position. Rhombus (i, j), in half-sizes from the first one,
+        covers |u - i| + |v - j| <= 1, which is a square in the rotated coordinates u + v, u - v
+        :param x: x position
+        :param y: y position
+        :return: cell index, -1 outside the grid
+        """
+        u: float = (x - self.offset) / self.cell_width
+        v: float = (y - self.offset) / self.cell_height
+        if not (0 <= u <= 2 * (self.cols - 1) and 0 <= v <= 2 * self.rows - 1):
+            return -1
+        a: int = math.floor((u + v) / 2 + 0.5) * 2
+        b: int = math.floor((u - v) / 2 + 0.5) * 2
+        i: int = (a + b) // 2
+        j: int = (a - b) // 2
+        if i % 2 != j % 2 or not (0 <= i <= 2 * (self.cols - 1) and 0 <= j < 2 * self.rows):
+            return -1
+        if i % 2 == 0:
+            return j // 2 * self.cols + i // 2
+        return self.rows * self.cols + j // 2 * (self.cols - 1) + i // 2
+
+    def circle_at(self, x: float, y: float) -> int:
+        """
+        Finds the thread circle at a canvas position
+        :param x: x position
+        :param y: y position
+        :return: thread number, -1 if there is no circle
+        """
+        for n in self.circle_threads:
+            if math.hypot(x - self.circles[n * 2], y - self.circles[n * 2 + 1]) <= self.circle_radius:
+                return n
+        return -1
+
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout(rows: int, cols: int, threads: int, cell_width: int = DIAMOND_WIDTH, cell_height: int = DIAMOND_HEIGHT,
+           ring: bool = False, slots: int | None = None) -> Layout:
+    """
+    Layout for a configuration, shared by every tab with the same one
+    :param rows: grid rows
+    :param cols: grid columns
+    :param threads: number of threads
+    :param cell_width: half-width of a rhombus
+    :param cell_height: half-height of a rhombus
+    :param ring: circles on a kumihimo ring
+    :param slots: slots of the kumihimo ring
+    :return: layout
+    """
+    return Layout(rows, cols, threads, cell_width, cell_height, ring, slots=slots)
@@ -0,0 +1,93 @@
+"""
+Thread groups of the built-in layouts. Does not use tkinter
+"""
+import functools
+
+from pattern import Pattern
+
+KUMIHIMO_SLOTS: int = 32  # fewest circle positions around the disk, fewer threads skip some of them
+KUMIHIMO_THREADS: tuple[int, ...] = (8, 16, 24, 32, 48, 64)  # thread counts offered by the GUI
+KUMIHIMO_CACHE_SIZE: int = 32  # group tables kept by kumihimo_table()
+
+
+def kumihimo_slots(threads: int, slots: int | None = None) -> int:
+    """
+    Checks a kumihimo configuration. Threads are used in pairs of neighbouring slots and every quarter of them
+    repeats along the braid, so their number is a multiple of 4
+    :param threads: number of threads
+    :param slots: number of slots, the smallest multiple of threads of at least KUMIHIMO_SLOTS by default
+    :return: number of slots
+    """
+    if threads <= 0 or threads % 4:
+        raise ValueError(f"kumihimo needs a positive multiple of 4 threads, not {threads}")
+    if slots is None:
+        slots = -(-KUMIHIMO_SLOTS // threads) * threads
+    if slots < threads or slots % 2:
+        raise ValueError(f"{threads} kumihimo threads need an even number of slots of at least {threads}, not {slots}")
+    return slots
+
+
+@functools.lru_cache(maxsize=None)
+def kumihimo_threads(threads: int, slots: int | None = None) -> tuple[int, ...]:
+    """
+    :param threads: number of threads
+    :param slots: number of slots, see kumihimo_slots
+    :return: slots used by the threads: pairs spread evenly around the disk
+    """
+    slots = kumihimo_slots(threads, slots)
+    return tuple(2 * (k * (slots // 2) // (threads // 2)) + i for k in range(threads // 2) for i in range(2))
+
+
+@functools.lru_cache(maxsize=KUMIHIMO_CACHE_SIZE)
+def kumihimo_table(rows: int, cols: int, threads: int, slots: int | None = None) -> tuple[tuple[int, ...], ...]:
+    """
+    Cells filled by every thread slot. In the rotated coordinates u = x + y, v = y - x the cells of one thread form
+    a lattice spanned by (0, 4) and (threads / 4, s), with s = 3 if threads / 4 is 2 modulo 4, else 1, which gives
+    the 8 and 16 thread layouts of the disk
+    :param rows: grid rows
+    :param cols: grid columns
+    :param threads: number of threads
+    :param slots: number of slots, see kumihimo_slots
+    :return: cell indices of every slot
+    """
+    slots = kumihimo_slots(threads, slots)
+    used: tuple[int, ...] = kumihimo_threads(threads, slots)
+    quarter: int = threads // 4
+    step: int = 3 if quarter % 4 == 2 else 1
+    groups: list[list[int]] = [[] for _ in range(slots)]
+    for index in range(rows * cols + rows * (cols - 1)):
+        inner: bool = index >= rows * cols
+        row, col = divmod(index - rows * cols, cols - 1) if inner else divmod(index, cols)
+        repeat, u = divmod(row + col + inner, quarter)
+        v: int = (row - col - repeat * step) % 4
+        pair: int = quarter - 1 - u  # pair of the thread in its half of the disk
+        shift: int = (v - pair - (step + 1) // 2) % 4  # slot in the pair, + 2 in the second half
+        groups[used[(shift // 2 * quarter + pair) * 2 + shift % 2]].append(index)
+    return tuple(tuple(i) for i in groups)
+
+
+def kumihimo_cells(circle: int, rows: int, cols: int, threads: int,
+                   slots: int | None = None) -> set[tuple[float, float]]:
+    """
+    Cells filled by a kumihimo thread
+    :param circle: thread slot
+    :param rows: grid rows
+    :param cols: grid columns
+    :param threads: number of threads
+    :param slots: number of slots, see kumihimo_slots
+    :return: logical coordinates of the cells
+    """
+    return {(i % cols, i // cols) if i < rows * cols else
+            ((i - rows * cols) % (cols - 1) + 0.5, (i - rows * cols) // (cols - 1) + 0.5)
+            for i in kumihimo_table(rows, cols, threads, slots)[circle]}
+
+
+def kumihimo_groups(pattern: Pattern, threads: int, slots: int | None = None) -> list[list[int]]:
+    """
+    Groups of a kumihimo pattern, from the cached table of its size
+    :param pattern: pattern with a thread per slot
+    :param threads: number of threads
+    :param slots: number of slots, see kumihimo_slots
+    :return: cell indices for every thread slot, for Pattern.set_groups
+    """
+    return [list(i) for i in kumihimo_table(pattern.rows, pattern.cols, threads, slots)]
@@ -0,0 +1,373 @@
+"""
+Pattern files and the pattern library index. Does not use tkinter
+"""
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import typing
+import zlib
+
+from pattern import Pattern, color_to_rgb, normalize_color
+
+PATTERN_VERSION: int = 2  # 1: pattern stored in the file, 2: pattern stored in a blob
+INLINE_PATTERN_VERSION: int = 1
+BLOB_CACHE_SIZE: int = 256  # decoded blobs kept in memory
+
+
+class Entry(typing.NamedTuple):
+    """
+    Indexed pattern
+    """
+    path: str
+    name: str
+    threads: int
+    rows: int
+    palette: list[str]
+    hash: str
+
+
+class BlobStore:
+    """
+    Content-addressed storage of patterns. Equal patterns are stored once, in a file named after their hash
+    """
+    def __init__(self, directory: str) -> None:
+        """
+        Opens the store
+        :param directory: directory with the blobs
+        """
+        self.directory: str = directory
+        self._cache: collections.OrderedDict[str, dict[str, typing.Any]] = collections.OrderedDict()
+        self._lock: threading.Lock = threading.Lock()  # the cache is shared with Library.update on a worker thread
+
+    def path(self, blob: str) -> str:
+        """
+        :param blob: blob hash
+        :return: path of the blob file
+        """
+        return os.path.join(self.directory, blob[:2], blob)
+
+    def put(self, pattern: Pattern) -> str:
+        """
+        Stores a pattern, unless an equal one is already stored
+        :param pattern: pattern
+        :return: blob hash
+        """
+        data: bytes = pattern.canonical_json()
+        blob: str = hashlib.sha256(data).hexdigest()
+        path: str = self.path(blob)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(f"{path}.tmp", path)
+        return blob
+
+    def get(self, blob: str) -> dict[str, typing.Any]:
+        """
+        Reads a stored pattern. Recently read blobs come from memory
+        :param blob: blob hash
+        :return: dict for Pattern.from_dict. Don't modify it, it is shared
+        """
+        with self._lock:
+            if blob in self._cache:
+                self._cache.move_to_end(blob)
+                return self._cache[blob]
+        with open(self.path(blob), "rb") as f:
+            data: bytes = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != blob:
+            raise ValueError(f"Blob {blob} is corrupted")
+        pattern: dict[str, typing.Any] = json.loads(data)
+        with self._lock:
+            self._cache[blob] = pattern
+            if len(self._cache) > BLOB_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return pattern
+
+    def remove_unused(self, used: typing.Iterable[str]) -> int:
+        """
+        Deletes blobs no pattern file refers to
+        :param used: hashes of the blobs in use
+        :return: number of deleted blobs
+        """
+        used = set(used)
+        removed: int = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for subdirectory in os.listdir(self.directory):
+            for blob in os.listdir(os.path.join(self.directory, subdirectory)):
+                if blob not in used and not blob.endswith(".tmp"):
+                    os.remove(os.path.join(self.directory, subdirectory, blob))
+                    with self._lock:
+                        self._cache.pop(blob, None)
+                    removed += 1
+        return removed
+
+
+def read_filenames(path: str, directory: str) -> list[str]:
+    """
+    Reads a filenames file
+    :param path: file with one pattern filename per line
+    :param directory: directory the filenames are relative to
+    :return: paths of the listed patterns
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return [os.path.join(directory, i.strip()) for i in f.read().splitlines() if i.strip()]
+
+
+def read_pattern_data(path: str, store: BlobStore | None = None
+                      ) -> tuple[dict[str, typing.Any], dict[str, typing.Any]]:
+    """
+    Reads a pattern file without building the pattern
+    :param path: file path
+    :param store: blob store the file refers to
+    :return: metadata (name, icon, compound, blob, layout), pattern dict for Pattern.from_dict
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data: dict[str, typing.Any] = json.load(f)
+    meta: dict[str, typing.Any] = {"name": data.get("name", "Custom"), "icon": data.get("icon"),
+                                   "compound": data.get("compound", "left"), "blob": data.get("blob"),
+                                   "layout": data.get("layout", "custom")}
+    if meta["blob"] is None:
+        return meta, data["pattern"]
+    if store is None:
+        raise ValueError(f"{path} refers to a blob, but there is no blob store")
+    return meta, store.get(meta["blob"])
+
+
+def read_pattern(path: str, store: BlobStore | None = None, tolerance: float = 0
+                 ) -> tuple[dict[str, typing.Any], Pattern]:
+    """
+    Reads a pattern file
+    :param path: file path
+    :param store: blob store the file refers to
+    :param tolerance: palette tolerance
+    :return: metadata (name, icon, compound, blob, layout), pattern
+    """
+    meta, data = read_pattern_data(path, store)
+    return meta, Pattern.from_dict(data, tolerance)
+
+
+def write_pattern(path: str, pattern: Pattern, store: BlobStore | None, name: str, icon: str | None = None,
+                  compound: str = "left", layout: str = "custom") -> str:
+    """
+    Writes a pattern file referring to a blob with the pattern. The file is replaced atomically,
+    so a crash never leaves half of it
+    :param path: file path
+    :param pattern: pattern
+    :param store: blob store for the pattern, None to store the pattern in the file itself
+    :param name: pattern name
+    :param icon: path to icon
+    :param compound: icon compound
+    :param layout: layout the groups come from, "custom" or "kumihimo"
+    :return: blob hash, or the content hash of an inline pattern
+    """
+    data: dict[str, typing.Any] = {"version": PATTERN_VERSION, "name": name, "icon": icon, "compound": compound,
+                                   "layout": layout}
+    if store is None:
+        data["version"] = INLINE_PATTERN_VERSION
+        data["pattern"] = pattern.to_dict()
+    else:
+        data["blob"] = store.put(pattern)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+    return data.get("blob") or pattern.content_hash()
+
+
+class Library:
+    """
+    Index of the patterns listed in a filenames file, stored in SQLite.
+    Only files that changed since the last update are read again. update may run on a worker thread while the
+    other methods run on the GUI thread, the connection is shared under a lock
+    """
+    def __init__(self, directory: str, filenames_path: str, index_path: str, blobs_path: str) -> None:
+        """
+        Opens or creates the index
+        :param directory: directory the filenames are relative to
+        :param filenames_path: file with one pattern filename per line
+        :param index_path: SQLite index file
+        :param blobs_path: directory of the blob store
+        """
+        self.directory: str = directory
+        self.filenames_path: str = filenames_path
+        self.store: BlobStore = BlobStore(blobs_path)
+        self.connection: sqlite3.Connection = sqlite3.connect(index_path, check_same_thread=False)
+        self.lock: threading.RLock = threading.RLock()  # held while using the connection
+        self.closed: bool = False
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS patterns (
+                path TEXT PRIMARY KEY, name TEXT COLLATE NOCASE, threads INTEGER, rows INTEGER, palette TEXT,
+                hash TEXT, mtime INTEGER, size INTEGER);
+            CREATE INDEX IF NOT EXISTS patterns_name ON patterns (name);
+            CREATE INDEX IF NOT EXISTS patterns_threads ON patterns (threads);
+            CREATE TABLE IF NOT EXISTS colors (
+                path TEXT REFERENCES patterns (path) ON DELETE CASCADE, color TEXT,
+                r INTEGER, g INTEGER, b INTEGER);
+            CREATE INDEX IF NOT EXISTS colors_color ON colors (color);
+            CREATE INDEX IF NOT EXISTS colors_path ON colors (path);
+        """)
+
+    def filenames(self) -> list[str]:
+        """
+        Reads the filenames file
+        :return: paths of the listed patterns
+        """
+        return read_filenames(self.filenames_path, self.directory)
+
+    def add(self, path: str) -> None:
+        """
+        Adds a pattern to the filenames file, if it isn't listed yet, and indexes it under its listed path, like update.
+        The file is read without holding the lock, so the GUI can run it on a worker thread
+        :param path: pattern path, relative or absolute
+        :return: None
+        """
+        target: str = os.path.normcase(os.path.abspath(path))
+        listed: str | None = next((i for i in self.filenames() if os.path.normcase(os.path.abspath(i)) == target), None)
+        if listed is None:
+            relpath: str = os.path.relpath(path, self.directory)
+            if relpath.startswith(os.pardir):
+                relpath = os.path.abspath(path)
+            with open(self.filenames_path, "a", encoding="utf-8") as f:
+                f.write(f"{relpath}\n")
+            listed = os.path.join(self.directory, relpath)
+        row: tuple[tuple[typing.Any, ...], set[str]] | None = self._read(listed)
+        with self.lock:
+            if self.closed:
+                return
+            self._write(listed, row)
+            self.connection.commit()
+
+    def update(self) -> int:
+        """
+        Brings the index up to date with the filenames file: indexes new and changed files, forgets removed ones.
+        Files are read without holding the lock, so searches go on meanwhile. Stops early if the library is closed
+        :return: number of files read
+        """
+        with self.lock:
+            indexed: dict[str, tuple[int, int]] = {i[0]: (i[1], i[2]) for i in
+                                                   self.connection.execute("SELECT path, mtime, size FROM patterns")}
+        read: int = 0
+        for path in self.filenames():
+            try:
+                stat: os.stat_result = os.stat(path)
+            except OSError:
+                continue
+            if indexed.pop(path, None) != (stat.st_mtime_ns, stat.st_size):
+                row: tuple[tuple[typing.Any, ...], set[str]] | None = self._read(path, stat)
+                with self.lock:
+                    if self.closed:
+                        return read
+                    self._write(path, row)
+                    self.connection.commit()
+                read += 1
+        with self.lock:
+            if not self.closed:
+                self.connection.executemany("DELETE FROM patterns WHERE path = ?", ((i,) for i in indexed))
+                self.connection.commit()
+        return read
+
+    def index_file(self, path: str, stat: os.stat_result | None = None) -> None:
+        """
+        Reads a pattern file into the index. Unreadable files are left out
+        :param path: pattern path
+        :param stat: os.stat of the file, if known
+        :return: None
+        """
+        row: tuple[tuple[typing.Any, ...], set[str]] | None = self._read(path, stat)
+        with self.lock:
+            self._write(path, row)
+
+    def _read(self, path: str, stat: os.stat_result | None = None
+              ) -> tuple[tuple[typing.Any, ...], set[str]] | None:
+        """
+        Reads the index entry of a pattern file
+        Not intended for use outside the class
+        :param path: pattern path
+        :param stat: os.stat of the file, if known
+        :return: patterns row and the colors used by threads or cells, None if the file can't be read
+        """
+        try:
+            if stat is None:
+                stat = os.stat(path)
+            meta, pattern = read_pattern(path, self.store)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        used: set[str] = {pattern.palette[i] for i in {*pattern.thread_colors, *pattern.cell_colors}
+                          if i < len(pattern.palette)}
+        return (path, meta["name"], pattern.threads, pattern.rows, json.dumps(list(pattern.palette)),
+                meta["blob"] or pattern.content_hash(), stat.st_mtime_ns, stat.st_size), used
+
+    def _write(self, path: str, row: tuple[tuple[typing.Any, ...], set[str]] | None) -> None:
+        """
+        Replaces the index entry of a pattern file. Call with the lock held
+        Not intended for use outside the class
+        :param path: pattern path
+        :param row: entry from _read, None to remove the file
+        :return: None
+        """
+        self.connection.execute("DELETE FROM patterns WHERE path = ?", (path,))
+        if row is None:
+            return
+        pattern_row, colors = row
+        self.connection.execute("INSERT INTO patterns VALUES (?, ?, ?, ?, ?, ?, ?, ?)", pattern_row)
+        self.connection.executemany("INSERT INTO colors VALUES (?, ?, ?, ?, ?)",
+                                    ((path, i, *(color_to_rgb(i) or (None, None, None))) for i in colors))
+
+    def search(self, text: str = "", prefix: bool = False, threads: int | None = None,
+               color: str | tuple[int, int, int] | None = None, tolerance: float = 0, limit: int = 200
+               ) -> list[Entry]:
+        """
+        Searches the index
+        :param text: text in the pattern name, case-insensitive
+        :param prefix: match text only at the start of the name
+        :param threads: only patterns with this many threads
+        :param color: only patterns that use this color
+        :param tolerance: also match colors this close to color
+        :param limit: maximum number of results
+        :return: matching patterns, sorted by name
+        """
+        query: str = "SELECT path, name, threads, rows, palette, hash FROM patterns WHERE name LIKE ? ESCAPE '\\'"
+        text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        params: list[typing.Any] = [f"{text}%" if prefix else f"%{text}%"]
+        if threads is not None:
+            query += " AND threads = ?"
+            params.append(threads)
+        if color is not None:
+            color = normalize_color(color)
+            rgb: tuple[int, int, int] | None = color_to_rgb(color)
+            if tolerance > 0 and rgb is not None:
+                query += (" AND path IN (SELECT path FROM colors "
+                          "WHERE (r - ?) * (r - ?) + (g - ?) * (g - ?) + (b - ?) * (b - ?) <= ?)")
+                params += [rgb[0], rgb[0], rgb[1], rgb[1], rgb[2], rgb[2], tolerance ** 2]
+            else:
+                query += " AND path IN (SELECT path FROM colors WHERE color = ?)"
+                params.append(color)
+        query += " ORDER BY name LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows: list[tuple[typing.Any, ...]] = self.connection.execute(query, params).fetchall()
+        return [Entry(i[0], i[1], i[2], i[3], json.loads(i[4]), i[5]) for i in rows]
+
+    def remove_unused_blobs(self) -> int:
+        """
+        Deletes blobs no indexed pattern refers to. Call update first
+        :return: number of deleted blobs
+        """
+        with self.lock:
+            used: list[str] = [i[0] for i in self.connection.execute("SELECT hash FROM patterns")]
+        return self.store.remove_unused(used)
+
+    def close(self) -> None:
+        """
+        Closes the index. A running update stops at its next file
+        :return: None
+        """
+        with self.lock:
+            self.closed = True
+            self.connection.close()
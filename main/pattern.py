@@ -0,0 +1,679 @@
+"""
+Pattern model: a palette and palette indices for every thread and cell. Does not use tkinter
+"""
+import array
+import hashlib
+import json
+import typing
+
+MAX_COLORS: int = 256  # indices are stored in bytearrays
+NAMED_COLORS: dict[str, str] = {"white": "#ffffff", "black": "#000000", "red": "#ff0000", "green": "#008000",
+                                "blue": "#0000ff", "yellow": "#ffff00", "gray": "#808080", "grey": "#808080"}
+
+Color = str | tuple[int, int, int]
+
+
+def normalize_color(color: Color) -> str:
+    """
+    Converts a color to the #rrggbb form used in palettes
+    :param color: "#rgb", "#rrggbb", "#rrrrggggbbbb" (from tkinter), a few color names or an (r, g, b) tuple
+    :return: color as #rrggbb, or the lowercase name if it can't be converted
+    """
+    if isinstance(color, (tuple, list)):
+        return "#{:02x}{:02x}{:02x}".format(*color[:3])
+    color = color.strip().lower()
+    color = NAMED_COLORS.get(color, color)
+    if color.startswith("#") and len(color) in (4, 7, 13):
+        digits: int = (len(color) - 1) // 3
+        try:
+            rgb: list[int] = [int(color[1 + i * digits:1 + (i + 1) * digits], 16) for i in range(3)]
+        except ValueError:
+            return color
+        if digits == 1:
+            rgb = [i * 17 for i in rgb]
+        elif digits == 4:
+            rgb = [i >> 8 for i in rgb]
+        return "#{:02x}{:02x}{:02x}".format(*rgb)
+    return color
+
+
+def color_to_rgb(color: str) -> tuple[int, int, int] | None:
+    """
+    Converts a normalized color to an (r, g, b) tuple
+    :param color: color from normalize_color
+    :return: (r, g, b), or None for colors that are not #rrggbb
+    """
+    if len(color) != 7 or not color.startswith("#"):
+        return None
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+def color_distance(color1: str, color2: str) -> float:
+    """
+    Euclidean distance between two normalized colors in RGB space
+    :param color1: first color
+    :param color2: second color
+    :return: distance, infinite if one of the colors is not #rrggbb and they differ
+    """
+    if color1 == color2:
+        return 0
+    rgb1: tuple[int, int, int] | None = color_to_rgb(color1)
+    rgb2: tuple[int, int, int] | None = color_to_rgb(color2)
+    if rgb1 is None or rgb2 is None:
+        return float("inf")
+    return ((rgb1[0] - rgb2[0]) ** 2 + (rgb1[1] - rgb2[1]) ** 2 + (rgb1[2] - rgb2[2]) ** 2) ** 0.5
+
+
+class Palette:
+    """
+    Table of colors of a pattern. Threads and cells store indices into it
+    """
+    def __init__(self, colors: typing.Iterable[Color] = ("#ffffff",), tolerance: float = 0) -> None:
+        """
+        Construct a palette
+        :param colors: starting colors, the first one is the background
+        :param tolerance: colors closer than this to an existing entry are merged into it (0 = exact matches only)
+        """
+        self.tolerance: float = tolerance
+        self.colors: list[str] = []
+        self._lookup: dict[str, int] = {}  # color: index
+        for i in colors:
+            self.colors.append(normalize_color(i))
+            self._lookup.setdefault(self.colors[-1], len(self.colors) - 1)
+
+    def __len__(self) -> int:
+        return len(self.colors)
+
+    def __getitem__(self, index: int) -> str:
+        return self.colors[index]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.colors)
+
+    def find(self, color: Color, tolerance: float | None = None) -> int | None:
+        """
+        Finds the entry for a color
+        :param color: color
+        :param tolerance: overrides the palette tolerance
+        :return: index of the exact or the closest entry within tolerance, None if there is none
+        """
+        color = normalize_color(color)
+        if color in self._lookup:
+            return self._lookup[color]
+        if tolerance is None:
+            tolerance = self.tolerance
+        if tolerance <= 0:
+            return None
+        best: int | None = None
+        best_distance: float = tolerance
+        for i, j in enumerate(self.colors):
+            distance: float = color_distance(color, j)
+            if distance <= best_distance:
+                best, best_distance = i, distance
+        return best
+
+    def index(self, color: Color) -> int:
+        """
+        Returns the index of a color, adding it to the palette if there is no entry within tolerance.
+        When the palette is full the closest entry is used
+        :param color: color
+        :return: palette index
+        """
+        found: int | None = self.find(color)
+        if found is not None:
+            return found
+        color = normalize_color(color)
+        if len(self.colors) >= MAX_COLORS:
+            return self.find(color, float("inf"))
+        self.colors.append(color)
+        self._lookup[color] = len(self.colors) - 1
+        return len(self.colors) - 1
+
+    def set(self, index: int, color: Color) -> None:
+        """
+        Changes the color of an entry. Every thread and cell using it changes with it
+        :param index: palette index
+        :param color: new color
+        :return: None
+        """
+        old: str = self.colors[index]
+        self.colors[index] = normalize_color(color)
+        if self._lookup.get(old) == index:
+            self._lookup.pop(old)
+            for i, j in enumerate(self.colors):  # another entry may have the same color
+                if j == old:
+                    self._lookup[old] = i
+                    break
+        self._lookup.setdefault(self.colors[index], index)
+
+    def quantize(self, tolerance: float | None = None) -> bytes:
+        """
+        Merges entries closer than tolerance to an earlier entry
+        :param tolerance: overrides the palette tolerance
+        :return: translation table from old to new indices, for bytearray.translate
+        """
+        if tolerance is None:
+            tolerance = self.tolerance
+        table: bytearray = bytearray(range(MAX_COLORS))
+        colors: list[str] = []
+        for i, j in enumerate(self.colors):
+            for k, l in enumerate(colors):
+                if color_distance(j, l) <= tolerance:
+                    table[i] = k
+                    break
+            else:
+                table[i] = len(colors)
+                colors.append(j)
+        self.colors = colors
+        self._lookup = {}
+        for i, j in enumerate(self.colors):
+            self._lookup.setdefault(j, i)
+        return bytes(table)
+
+
+class DisjointSet:
+    """
+    Union-find over the numbers 0 to size - 1, with path compression and union by size
+    """
+    def __init__(self, size: int) -> None:
+        """
+        Construct a disjoint set where every number is alone in its set
+        :param size: number of elements
+        """
+        self.parent: array.array = array.array("i", range(size))
+        self.sizes: array.array = array.array("i", [1]) * size
+
+    def find(self, i: int) -> int:
+        """
+        Finds the representative of the set of i, halving the path to it
+        :param i: element
+        :return: representative element
+        """
+        parent: array.array = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> int:
+        """
+        Merges the sets of i and j
+        :param i: first element
+        :param j: second element
+        :return: representative of the merged set
+        """
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return i
+        if self.sizes[i] < self.sizes[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.sizes[i] += self.sizes[j]
+        return i
+
+    def add(self) -> int:
+        """
+        Adds an element alone in its set
+        :return: new element
+        """
+        self.parent.append(len(self.parent))
+        self.sizes.append(1)
+        return len(self.parent) - 1
+
+
+class GroupBuilder:
+    """
+    Editable groups of cells filled together with a thread. Cells and threads are joined with union-find;
+    unlinking a cell moves it to a new node, so no edit has to rebuild the sets.
+    compile turns the sets into Pattern.groups
+    """
+    def __init__(self, cells: int, threads: int) -> None:
+        """
+        Construct a builder where no cell is linked
+        :param cells: number of cells
+        :param threads: number of threads
+        """
+        self.cells: int = cells
+        self.threads: int = threads
+        self.sets: DisjointSet = DisjointSet(cells + threads)
+        self.nodes: array.array = array.array("i", range(cells + threads))  # cells, then threads: node in sets
+
+    @classmethod
+    def from_groups(cls, cells: int, groups: list[list[int]]) -> "GroupBuilder":
+        """
+        Constructs a builder from compiled groups
+        :param cells: number of cells
+        :param groups: cell indices for every thread, like Pattern.groups
+        :return: builder
+        """
+        builder: GroupBuilder = cls(cells, len(groups))
+        for n, group in enumerate(groups):
+            for i in group:
+                builder.link_thread(i, n)
+        return builder
+
+    def link(self, cell1: int, cell2: int) -> None:
+        """
+        Puts two cells and everything linked to them in one group
+        :param cell1: first cell index
+        :param cell2: second cell index
+        :return: None
+        """
+        self.sets.union(self.nodes[cell1], self.nodes[cell2])
+
+    def link_thread(self, cell: int, n: int) -> None:
+        """
+        Puts a cell and everything linked to it in the group of thread n
+        :param cell: cell index
+        :param n: thread number
+        :return: None
+        """
+        self.sets.union(self.nodes[cell], self.nodes[self.cells + n])
+
+    def unlink(self, cell: int) -> None:
+        """
+        Takes a cell out of its group. The rest of the group stays linked
+        :param cell: cell index
+        :return: None
+        """
+        if self.sets.sizes[self.sets.find(self.nodes[cell])] > 1:
+            self.nodes[cell] = self.sets.add()
+
+    def compile(self) -> list[list[int]]:
+        """
+        Converts the sets to cell indices for every thread. Cells linked to several threads are in each of their
+        groups, cells linked to no thread are in none
+        :return: groups for Pattern.set_groups
+        """
+        find: typing.Callable[[int], int] = self.sets.find
+        roots: dict[int, list[int]] = {}  # root: threads
+        for n in range(self.threads):
+            roots.setdefault(find(self.nodes[self.cells + n]), []).append(n)
+        groups: list[list[int]] = [[] for _ in range(self.threads)]
+        for i in range(self.cells):
+            for n in roots.get(find(self.nodes[i]), ()):
+                groups[n].append(i)
+        if len(self.sets.parent) > 2 * len(self.nodes):  # too many nodes left by unlink
+            self.sets = DisjointSet(len(self.nodes))
+            firsts: dict[int, int] = {}  # old root: first element in its set
+            for i, node in enumerate(self.nodes):
+                self.sets.union(firsts.setdefault(find(node), i), i)
+            self.nodes = array.array("i", range(len(self.nodes)))
+        return groups
+
+
+class Change(typing.NamedTuple):
+    """
+    Change of a pattern, sent to its observers. It refers to the pattern's own lists instead of copying them,
+    so it costs the same for any pattern size
+    """
+    kind: str  # "thread", "cell", "fill", "fill_threads", "recolor", "groups", "resize", "quantize" or "replace"
+    index: int = -1  # thread number, cell index or palette index
+    color: int = -1  # new palette index
+    old: typing.Collection[int] = ()  # palette indices the changed threads and cells had before
+    cells: typing.Sequence[int] = ()  # changed cells of "cell" and "fill"
+    filled: dict[int, list[int]] | None = None  # threads filled with each palette index, for "fill_threads"
+
+
+class Problem(typing.NamedTuple):
+    """
+    Problem of pattern data, found by check_pattern or validation.validate
+    """
+    kind: str  # "file", "size", "threads", "range", "overlap", "unassigned", "palette" or "conflict"
+    message: str
+    cells: tuple[int, ...] = ()  # cells involved
+    threads: tuple[int, ...] = ()  # threads involved
+
+
+def check_pattern(data: dict[str, typing.Any]) -> list[Problem]:
+    """
+    Checks pattern data before a Pattern is built from it: its sizes, groups with cells outside the grid, cells in
+    several groups or in none and colors outside the palette. The groups are indexed into one table of the thread
+    of every cell, which the group checks share
+    :param data: pattern dict, like Pattern.to_dict makes
+    :return: problems, empty if there are none
+    """
+    try:
+        rows: int = int(data["rows"])
+        cols: int = int(data["cols"])
+        threads: int = int(data["threads"])
+        palette: int = len(Palette(data["palette"]))
+        thread_colors: bytes = bytes.fromhex(data["thread_colors"])
+        cell_colors: bytes = bytes.fromhex(data["cell_colors"])
+        groups: list[list[int]] = [[int(i) for i in group] for group in data["groups"]]
+    except KeyError as e:
+        return [Problem("file", f"missing pattern field {e}")]
+    except (TypeError, ValueError) as e:
+        return [Problem("file", f"malformed pattern: {e}")]
+    if rows < 1 or cols < 1 or threads < 1:
+        return [Problem("size", f"{rows} rows, {cols} columns and {threads} threads is no pattern")]
+
+    problems: list[Problem] = []
+    cells: int = rows * cols + rows * (cols - 1)
+    if len(thread_colors) != threads or len(cell_colors) != cells:
+        problems.append(Problem("size", f"{len(thread_colors)} thread and {len(cell_colors)} cell colors for "
+                                        f"{threads} threads and {cells} cells"))
+    if len(groups) != threads:
+        problems.append(Problem("threads", f"{len(groups)} groups for {threads} threads"))
+
+    owners: array.array = array.array("h", [-1]) * cells  # first thread of every cell
+    outside: dict[int, list[int]] = {}  # thread: cells outside the grid
+    shared: dict[int, set[int]] = {}  # cell: threads of the cells in several groups
+    for n, group in enumerate(groups):
+        for i in group:
+            if not 0 <= i < cells:
+                outside.setdefault(n, []).append(i)
+            elif owners[i] < 0:
+                owners[i] = n
+            elif owners[i] != n:
+                shared.setdefault(i, {owners[i]}).add(n)
+    if outside:
+        problems.append(Problem("range", f"{sum(map(len, outside.values()))} cells of {len(outside)} groups are "
+                                         f"outside the grid of {cells} cells", threads=tuple(outside)))
+    if shared:
+        problems.append(Problem("overlap", f"{len(shared)} cells are in more than one group", tuple(shared),
+                                tuple(sorted(set().union(*shared.values())))))
+    unassigned: tuple[int, ...] = tuple(i for i, n in enumerate(owners) if n < 0)
+    if unassigned:
+        problems.append(Problem("unassigned", f"{len(unassigned)} cells are in no group", unassigned))
+    if max(thread_colors, default=0) >= palette or max(cell_colors, default=0) >= palette:
+        problems.append(Problem("palette", f"colors outside the palette of {palette} colors",
+                                tuple(i for i, color in enumerate(cell_colors) if color >= palette),
+                                tuple(n for n, color in enumerate(thread_colors) if color >= palette)))
+    return problems
+
+
+class Pattern:
+    """
+    Colors of the threads and cells of a pattern, stored as palette indices.
+    Cells are addressed by logical coordinates like in the canvas: (col, row) for the outer grid and
+    (col + 0.5, row + 0.5) for the inner grid. Cells in the group of a thread are filled together with it.
+    Every change is sent to the observers, so several views can show one pattern
+    """
+    def __init__(self, rows: int, cols: int, threads: int, palette: Palette | None = None) -> None:
+        """
+        Construct a pattern with every thread and cell set to the first palette entry
+        :param rows: grid rows
+        :param cols: grid columns
+        :param threads: number of threads
+        :param palette: palette, a new one with white as the background by default
+        """
+        if palette is None:
+            palette = Palette()
+        self.palette: Palette = palette
+        self.rows: int = rows
+        self.cols: int = cols
+        self.threads: int = threads
+        self.thread_colors: bytearray = bytearray(threads)
+        self.cell_colors: bytearray = bytearray(self.cell_count)
+        self.groups: list[list[int]] = [[] for _ in range(threads)]  # thread: cell indices
+        self.cell_threads: array.array = array.array("h", [-1]) * self.cell_count  # cell index: thread, -1 if none
+        self.observers: list[typing.Callable[[Change], typing.Any]] = []
+
+    def subscribe(self, observer: typing.Callable[[Change], typing.Any]) -> None:
+        """
+        Calls observer with every change of the pattern
+        :param observer: callback
+        :return: None
+        """
+        self.observers.append(observer)
+
+    def unsubscribe(self, observer: typing.Callable[[Change], typing.Any]) -> None:
+        """
+        Stops sending changes to observer
+        :param observer: callback passed to subscribe
+        :return: None
+        """
+        if observer in self.observers:
+            self.observers.remove(observer)
+
+    def notify(self, change: Change) -> None:
+        """
+        Sends a change to the observers
+        :param change: change
+        :return: None
+        """
+        for observer in list(self.observers):  # an observer may unsubscribe
+            observer(change)
+
+    @property
+    def cell_count(self) -> int:
+        """
+        Number of cells in the outer and inner grids
+        :return: number of cells
+        """
+        return self.rows * self.cols + self.rows * (self.cols - 1)
+
+    def cell_index(self, x: float, y: float) -> int:
+        """
+        Returns the index of a cell in cell_colors
+        :param x: logical x position
+        :param y: logical y position
+        :return: cell index, -1 if there is no such cell
+        """
+        if x == int(x) and y == int(y):
+            if 0 <= x < self.cols and 0 <= y < self.rows:
+                return int(y) * self.cols + int(x)
+        elif x - int(x) == 0.5 and y - int(y) == 0.5:
+            if 0 <= x < self.cols - 1 and 0 <= y < self.rows:
+                return self.rows * self.cols + int(y) * (self.cols - 1) + int(x)
+        return -1
+
+    def cell_coords(self, index: int) -> tuple[float, float]:
+        """
+        Returns the logical coordinates of a cell
+        :param index: cell index
+        :return: logical x, y
+        """
+        if index < self.rows * self.cols:
+            return index % self.cols, index // self.cols
+        index -= self.rows * self.cols
+        return index % (self.cols - 1) + 0.5, index // (self.cols - 1) + 0.5
+
+    def resize(self, rows: int, cols: int, threads: int) -> None:
+        """
+        Changes the pattern size, resetting every thread and cell to the first palette entry
+        :param rows: grid rows
+        :param cols: grid columns
+        :param threads: number of threads
+        :return: None
+        """
+        self.rows, self.cols, self.threads = rows, cols, threads
+        self.thread_colors = bytearray(threads)
+        self.cell_colors = bytearray(self.cell_count)
+        self._index_groups([[] for _ in range(threads)])
+        if self.observers:
+            self.notify(Change("resize"))
+
+    def set_groups(self, groups: list[list[int]]) -> None:
+        """
+        Sets the cells filled together with each thread
+        :param groups: cell indices for every thread
+        :return: None
+        """
+        self._index_groups(groups)
+        if self.observers:
+            self.notify(Change("groups"))
+
+    def _index_groups(self, groups: list[list[int]]) -> None:
+        """
+        Sets the groups and the thread of every cell
+        Not intended for use outside the class
+        :param groups: cell indices for every thread
+        :return: None
+        """
+        self.groups = groups
+        self.cell_threads = array.array("h", [-1]) * self.cell_count
+        for n, cells in enumerate(groups):
+            for i in cells:
+                self.cell_threads[i] = n
+
+    def thread_color(self, n: int) -> str:
+        """
+        :param n: thread number
+        :return: color of thread n
+        """
+        return self.palette[self.thread_colors[n]]
+
+    def cell_color(self, index: int) -> str:
+        """
+        :param index: cell index
+        :return: color of the cell
+        """
+        return self.palette[self.cell_colors[index]]
+
+    def set_thread(self, n: int, color: Color) -> int:
+        """
+        Sets thread n to color
+        :param n: thread number
+        :param color: color
+        :return: palette index of the color
+        """
+        old: int = self.thread_colors[n]
+        self.thread_colors[n] = self.palette.index(color)
+        if self.observers:
+            self.notify(Change("thread", n, self.thread_colors[n], (old,)))
+        return self.thread_colors[n]
+
+    def set_cell(self, index: int, color: Color) -> int:
+        """
+        Sets a cell to color
+        :param index: cell index
+        :param color: color
+        :return: palette index of the color
+        """
+        old: int = self.cell_colors[index]
+        self.cell_colors[index] = self.palette.index(color)
+        if self.observers:
+            self.notify(Change("cell", index, self.cell_colors[index], (old,), (index,)))
+        return self.cell_colors[index]
+
+    def fill_thread(self, n: int, color: Color) -> tuple[int, set[int]]:
+        """
+        Sets thread n and every cell in its group to color
+        :param n: thread number
+        :param color: color
+        :return: palette index of the color, palette indices the thread and its cells had before
+        """
+        old: set[int] = {self.thread_colors[n]}
+        index: int = self.palette.index(color)
+        self.thread_colors[n] = index
+        for i in self.groups[n]:
+            old.add(self.cell_colors[i])
+            self.cell_colors[i] = index
+        if self.observers:
+            self.notify(Change("fill", n, index, old, self.groups[n]))
+        return index, old
+
+    def fill_threads(self, colors: typing.Sequence[Color | None]) -> tuple[dict[int, list[int]], set[int]]:
+        """
+        Fills every thread with its color, like fill_thread for each thread in order
+        :param colors: color of every thread, None leaves a thread as it is
+        :return: threads filled with each palette index, palette indices the filled threads and cells had before
+        """
+        filled: dict[int, list[int]] = {}
+        old: set[int] = set()
+        for n, color in enumerate(colors[:self.threads]):
+            if color is None:
+                continue
+            old.add(self.thread_colors[n])
+            index: int = self.palette.index(color)
+            self.thread_colors[n] = index
+            filled.setdefault(index, []).append(n)
+            cells: list[int] = self.groups[n]
+            old.update(self.cell_colors[i] for i in cells)
+            for i in cells:
+                self.cell_colors[i] = index
+        if self.observers:
+            self.notify(Change("fill_threads", old=old, filled=filled))
+        return filled, old
+
+    def recolor(self, index: int, color: Color) -> None:
+        """
+        Changes a palette entry, which changes every thread and cell that uses it
+        :param index: palette index
+        :param color: new color
+        :return: None
+        """
+        self.palette.set(index, color)
+        if self.observers:
+            self.notify(Change("recolor", index, index))
+
+    def replace(self, other: "Pattern") -> None:
+        """
+        Takes over the contents of another pattern, keeping the observers and the palette tolerance
+        :param other: pattern, not used afterwards
+        :return: None
+        """
+        other.palette.tolerance = self.palette.tolerance
+        self.palette = other.palette
+        self.rows, self.cols, self.threads = other.rows, other.cols, other.threads
+        self.thread_colors = other.thread_colors
+        self.cell_colors = other.cell_colors
+        self.groups = other.groups
+        self.cell_threads = other.cell_threads
+        if self.observers:
+            self.notify(Change("replace"))
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """
+        Converts the pattern to a JSON-serializable dict
+        :return: dict for from_dict
+        """
+        return {"rows": self.rows, "cols": self.cols, "threads": self.threads, "palette": list(self.palette),
+                "thread_colors": self.thread_colors.hex(), "cell_colors": self.cell_colors.hex(), "groups": self.groups}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, typing.Any], tolerance: float = 0) -> "Pattern":
+        """
+        Constructs a pattern from a dict made by to_dict. Raises ValueError if check_pattern finds the data
+        inconsistent, cells in several groups or in none are allowed
+        :param data: dict from to_dict
+        :param tolerance: palette tolerance
+        :return: pattern
+        """
+        problems: list[Problem] = [i for i in check_pattern(data) if i.kind not in ("overlap", "unassigned")]
+        if problems:
+            raise ValueError("; ".join(i.message for i in problems))
+        pattern: Pattern = cls(int(data["rows"]), int(data["cols"]), int(data["threads"]),
+                               Palette(data["palette"], tolerance))
+        pattern.thread_colors = bytearray.fromhex(data["thread_colors"])
+        pattern.cell_colors = bytearray.fromhex(data["cell_colors"])
+        pattern.set_groups([list(i) for i in data["groups"]])
+        return pattern
+
+    def canonical_json(self) -> bytes:
+        """
+        Converts the pattern to JSON that is the same for equal patterns, whatever the history of their palettes:
+        the palette keeps the background and the used colors, sorted, and the threads and cells are remapped to it
+        :return: UTF-8 JSON
+        """
+        used: set[int] = set(self.thread_colors) | set(self.cell_colors)
+        colors: list[str] = [self.palette[0], *sorted({self.palette[i] for i in used} - {self.palette[0]})]
+        position: dict[str, int] = {j: i for i, j in enumerate(colors)}
+        table: bytearray = bytearray(range(MAX_COLORS))
+        for i in used:
+            table[i] = position[self.palette[i]]
+        data: dict[str, typing.Any] = {**self.to_dict(), "palette": colors,
+                                       "thread_colors": self.thread_colors.translate(table).hex(),
+                                       "cell_colors": self.cell_colors.translate(table).hex()}
+        return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+    def content_hash(self) -> str:
+        """
+        Hash of the pattern contents. Equal patterns have equal hashes
+        :return: hex digest
+        """
+        return hashlib.sha256(self.canonical_json()).hexdigest()
+
+    def quantize(self, tolerance: float | None = None) -> None:
+        """
+        Merges near-identical palette colors and remaps every thread and cell in one pass
+        :param tolerance: overrides the palette tolerance
+        :return: None
+        """
+        table: bytes = self.palette.quantize(tolerance)
+        self.thread_colors = self.thread_colors.translate(table)
+        self.cell_colors = self.cell_colors.translate(table)
+        if self.observers:
+            self.notify(Change("quantize"))
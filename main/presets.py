@@ -0,0 +1,71 @@
+"""
+Thread color presets: gradients, alternating colors, a rainbow, colors sampled from an image.
+Does not use tkinter, PIL is imported only for images
+"""
+import colorsys
+import typing
+
+from pattern import Color, color_to_rgb, normalize_color
+
+
+def gradient(colors: typing.Sequence[Color], n: int) -> list[str]:
+    """
+    Colors evenly spaced along a gradient
+    :param colors: gradient stops, at least one
+    :param n: number of colors
+    :return: n colors from the first stop to the last one
+    """
+    stops: list[tuple[int, int, int]] = [color_to_rgb(normalize_color(i)) or (0, 0, 0) for i in colors]
+    result: list[str] = []
+    for i in range(n):
+        position: float = i / (n - 1) * (len(stops) - 1) if n > 1 and len(stops) > 1 else 0
+        stop: int = min(int(position), len(stops) - 2) if len(stops) > 1 else 0
+        t: float = position - stop
+        start, end = stops[stop], stops[min(stop + 1, len(stops) - 1)]
+        result.append(normalize_color(tuple(round(a + (b - a) * t) for a, b in zip(start, end))))
+    return result
+
+
+def alternating(colors: typing.Sequence[Color], n: int) -> list[str]:
+    """
+    Colors repeated in order
+    :param colors: colors, at least one
+    :param n: number of colors
+    :return: n colors
+    """
+    return [normalize_color(colors[i % len(colors)]) for i in range(n)]
+
+
+def rainbow(n: int) -> list[str]:
+    """
+    Colors evenly spaced around the hue circle
+    :param n: number of colors
+    :return: n colors
+    """
+    return [normalize_color(tuple(round(j * 255) for j in colorsys.hsv_to_rgb(i / max(n, 1), 1, 1)))
+            for i in range(n)]
+
+
+def from_image(path: str, n: int) -> list[str]:
+    """
+    Colors sampled from an image, averaged over n vertical strips from left to right
+    :param path: image file
+    :param n: number of colors
+    :return: n colors
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        strip: Image.Image = image.convert("RGB").resize((max(n, 1), 1), Image.Resampling.BOX)
+    return [normalize_color(strip.getpixel((i, 0))) for i in range(n)]
+
+
+PRESETS: dict[str, typing.Callable[[int], list[str]]] = {
+    "Rainbow": rainbow,
+    "Black and white": lambda n: alternating(("#000000", "#ffffff"), n),
+    "Red and white": lambda n: alternating(("#ff0000", "#ffffff"), n),
+    "Sunset": lambda n: gradient(("#ffd700", "#ff4500", "#800080"), n),
+    "Ocean": lambda n: gradient(("#e0ffff", "#1e90ff", "#000080"), n),
+    "Forest": lambda n: gradient(("#adff2f", "#228b22", "#3b2f1b"), n),
+    "Grayscale": lambda n: gradient(("#ffffff", "#000000"), n),
+}  # preset name: colors for n threads
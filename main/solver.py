@@ -0,0 +1,43 @@
+"""
+Reverse solver: finds the starting thread colors that produce a drawn pattern. Does not use tkinter
+"""
+import collections
+import typing
+
+from pattern import DisjointSet, Pattern
+
+
+class Solution(typing.NamedTuple):
+    """
+    Result of solve
+    """
+    thread_colors: bytearray  # palette index of every thread
+    conflicts: list[int]  # cells whose color differs from the color of their thread
+
+
+def solve(pattern: Pattern) -> Solution:
+    """
+    Computes thread colors from the cell colors of a pattern. Cells and threads in overlapping groups are joined
+    with union-find, every joined set takes its most common cell color and cells of other colors are conflicts.
+    Threads without cells keep their color, cells without threads never conflict
+    :param pattern: pattern with groups
+    :return: thread colors and conflicting cells
+    """
+    cells: int = pattern.cell_count
+    sets: DisjointSet = DisjointSet(cells + pattern.threads)  # cells, then threads
+    for n, group in enumerate(pattern.groups):
+        for i in group:
+            sets.union(cells + n, i)
+
+    roots: list[int] = [sets.find(i) if pattern.cell_threads[i] >= 0 else -1 for i in range(cells)]
+    counts: dict[int, collections.Counter[int]] = {}
+    for i, root in enumerate(roots):
+        if root >= 0:
+            counts.setdefault(root, collections.Counter())[pattern.cell_colors[i]] += 1
+    colors: dict[int, int] = {root: counter.most_common(1)[0][0] for root, counter in counts.items()}
+
+    thread_colors: bytearray = bytearray(pattern.thread_colors)
+    for n in range(pattern.threads):
+        thread_colors[n] = colors.get(sets.find(cells + n), thread_colors[n])
+    conflicts: list[int] = [i for i, root in enumerate(roots) if root >= 0 and pattern.cell_colors[i] != colors[root]]
+    return Solution(thread_colors, conflicts)
@@ -0,0 +1,68 @@
+"""
+Symmetric partners of threads, for filling a thread together with its mirror images. Does not use tkinter
+"""
+import collections
+import functools
+import typing
+
+from layouts import kumihimo_slots, kumihimo_threads
+from pattern import Pattern
+
+SYMMETRIES: tuple[str, ...] = ("None", "Horizontal", "Vertical", "Rotational")
+
+
+def mirror_cell(pattern: Pattern, index: int, symmetry: str) -> int:
+    """
+    Mirror image of a cell in the grid: left to right, top to bottom or rotated by half a turn
+    :param pattern: pattern
+    :param index: cell index
+    :param symmetry: name from SYMMETRIES
+    :return: index of the mirrored cell, -1 if it is outside the grid
+    """
+    x, y = pattern.cell_coords(index)
+    if symmetry in ("Horizontal", "Rotational"):
+        x = pattern.cols - 1 - x
+    if symmetry in ("Vertical", "Rotational"):
+        y = pattern.rows - 1 - y
+    return pattern.cell_index(x, y)
+
+
+def grid_partners(pattern: Pattern, symmetry: str) -> list[tuple[int, ...]]:
+    """
+    Partner of every thread: the thread whose group covers most of the mirror image of its group
+    :param pattern: pattern with groups
+    :param symmetry: name from SYMMETRIES
+    :return: partner threads of every thread, empty for threads that are their own mirror image or have none
+    """
+    if symmetry == "None":
+        return [()] * pattern.threads
+    partners: list[tuple[int, ...]] = []
+    for n, group in enumerate(pattern.groups):
+        counts: collections.Counter[int] = collections.Counter(
+            pattern.cell_threads[j] for j in (mirror_cell(pattern, i, symmetry) for i in group) if j >= 0)
+        counts.pop(-1, None)
+        partner: int = counts.most_common(1)[0][0] if counts else n
+        partners.append(() if partner == n else (partner,))
+    return partners
+
+
+@functools.lru_cache
+def ring_partners(threads: int, symmetry: str, slots: int | None = None) -> tuple[tuple[int, ...], ...]:
+    """
+    Partners of the kumihimo thread slots, mirrored around the ring of the disk: slot i is drawn at angle
+    (i - 0.5) / slots of a turn, so left to right it goes to 1 - i, top to bottom to slots / 2 + 1 - i, and half
+    a turn further to i + slots / 2
+    :param threads: number of threads
+    :param symmetry: name from SYMMETRIES
+    :param slots: number of slots, see kumihimo_slots
+    :return: partner slots of every slot, empty for unused slots and slots mirrored onto an unused one
+    """
+    slots = kumihimo_slots(threads, slots)
+    used: set[int] = set(kumihimo_threads(threads, slots))
+    half: int = slots // 2
+    mirror: dict[str, typing.Callable[[int], int]] = {
+        "Horizontal": lambda i: 1 - i, "Vertical": lambda i: half + 1 - i, "Rotational": lambda i: i + half}
+    if symmetry not in mirror:
+        return ((),) * slots
+    return tuple((mirror[symmetry](i) % slots,) if i in used and mirror[symmetry](i) % slots in used else ()
+                 for i in range(slots))
@@ -0,0 +1,129 @@
+"""
+Integrity checks of pattern files. The checks run on the pattern data before a Pattern is built from it, so broken
+files are reported instead of failing to load, and many files are checked in parallel. Does not use tkinter
+"""
+import collections
+import concurrent.futures
+import functools
+import itertools
+import typing
+
+from layouts import KUMIHIMO_THREADS, kumihimo_slots
+from library import BlobStore, read_pattern_data
+from pattern import Pattern, Problem, check_pattern
+from solver import solve
+
+MAX_THREADS: int = 35  # custom patterns have an odd number of threads up to this
+VALIDATE_CHUNK: int = 64  # most files sent to a worker process at once
+BLOB_RESULTS_CACHE_SIZE: int = 1024  # blobs whose problems are kept, patterns often share a blob
+
+
+class Report(typing.NamedTuple):
+    """
+    Result of validate_file
+    """
+    path: str
+    name: str | None  # pattern name, None if the file can't be read
+    problems: tuple[Problem, ...]
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """
+        :return: JSON-serializable report
+        """
+        return {"path": self.path, "name": self.name, "ok": not self.problems,
+                "problems": [i._asdict() for i in self.problems]}
+
+
+def validate(data: dict[str, typing.Any], layout: str = "custom") -> tuple[Problem, ...]:
+    """
+    Checks a pattern: the checks of check_pattern, the thread count rule of its layout and, if the rest is fine,
+    cells whose color no thread can make
+    :param data: pattern dict, like Pattern.to_dict makes
+    :param layout: layout the groups come from, "custom" or "kumihimo", as stored in the pattern file
+    :return: problems, empty if there are none
+    """
+    problems: list[Problem] = check_pattern(data)
+    if any(i.kind == "file" for i in problems):
+        return tuple(problems)
+    loadable: bool = not any(i.kind in ("size", "threads", "range", "palette") for i in problems)
+    threads: int = int(data["threads"])
+    if layout == "kumihimo":
+        slots: set[int] = {kumihimo_slots(i) for i in KUMIHIMO_THREADS}
+        if threads not in slots:
+            problems.insert(0, Problem("threads", f"{threads} thread slots, kumihimo patterns have "
+                                                  f"{', '.join(map(str, sorted(slots)))}"))
+    elif threads % 2 == 0 or threads > MAX_THREADS:
+        problems.insert(0, Problem("threads", f"{threads} threads, custom patterns have an odd number of at most "
+                                              f"{MAX_THREADS}"))
+    if loadable:
+        conflicts: list[int] = solve(Pattern.from_dict(data)).conflicts
+        if conflicts:
+            problems.append(Problem("conflict", f"{len(conflicts)} cells differ from their thread", tuple(conflicts)))
+    return tuple(problems)
+
+
+@functools.lru_cache(maxsize=None)
+def _store(directory: str) -> BlobStore:
+    """
+    Blob store of a worker process, kept to reuse its cache
+    Not intended for use outside the module
+    :param directory: directory of the blob store
+    :return: blob store
+    """
+    return BlobStore(directory)
+
+
+@functools.lru_cache(maxsize=BLOB_RESULTS_CACHE_SIZE)
+def _validate_blob(directory: str, blob: str, layout: str) -> tuple[Problem, ...]:
+    """
+    Validates a stored pattern once for all the files that refer to it
+    Not intended for use outside the module
+    :param directory: directory of the blob store
+    :param blob: blob hash
+    :param layout: layout of the pattern
+    :return: problems
+    """
+    return validate(_store(directory).get(blob), layout)
+
+
+def validate_file(path: str, blobs: str | None = None) -> Report:
+    """
+    Validates a pattern file. Called in worker processes
+    :param path: pattern file
+    :param blobs: directory of the blob store the file refers to
+    :return: report
+    """
+    try:
+        meta, data = read_pattern_data(path, None if blobs is None else _store(blobs))
+        if meta["blob"] is not None:
+            return Report(path, meta["name"], _validate_blob(blobs, meta["blob"], meta["layout"]))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return Report(path, None, (Problem("file", str(e)),))
+    return Report(path, meta["name"], validate(data, meta["layout"]))
+
+
+def validate_files(paths: typing.Sequence[str], blobs: str | None = None, jobs: int = 1) -> list[Report]:
+    """
+    Validates many pattern files, in parallel if jobs > 1
+    :param paths: pattern files
+    :param blobs: directory of the blob store the files refer to
+    :param jobs: worker processes
+    :return: report of every file, in order
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        return [validate_file(i, blobs) for i in paths]
+    chunk: int = max(1, min(VALIDATE_CHUNK, len(paths) // (jobs * 4)))
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(validate_file, paths, itertools.repeat(blobs), chunksize=chunk))
+
+
+def summary(reports: typing.Iterable[Report]) -> dict[str, typing.Any]:
+    """
+    Structured report of many files
+    :param reports: reports from validate_files
+    :return: JSON-serializable dict with the counts of files and problem kinds and every report
+    """
+    files: list[dict[str, typing.Any]] = [i.to_dict() for i in reports]
+    kinds: collections.Counter[str] = collections.Counter(j["kind"] for i in files for j in i["problems"])
+    return {"files": len(files), "failed": sum(1 for i in files if not i["ok"]), "problems": dict(kinds),
+            "reports": files}
@@ -0,0 +1,101 @@
+"""
+Tests of the autosave journals. Run from the repository root: python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import typing
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from autosave import Autosave, Journal, replay_journal  # noqa
+from pattern import Pattern  # noqa
+
+
+class TestAutosave(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        self.pattern: Pattern = Pattern(4, 3, 9)
+        self.pattern.set_groups([list(range(n, self.pattern.cell_count, 9)) for n in range(9)])
+
+    def snapshot(self) -> dict[str, typing.Any]:
+        """
+        :return: state of a tab showing self.pattern
+        """
+        return {"name": "Test", "icon": None, "compound": "left", "path": None, "pattern": self.pattern.to_dict()}
+
+    def journal(self, compact_edits: int = 1000) -> tuple[Autosave, Journal]:
+        """
+        :param compact_edits: edits after which the journal is compacted
+        :return: autosave and a journal of self.pattern
+        """
+        autosave: Autosave = Autosave(self.directory, 0.01, compact_edits)
+        return autosave, autosave.open(self.snapshot)
+
+    def test_replay(self) -> None:
+        autosave, journal = self.journal()
+        self.pattern.fill_thread(1, "#ff0000")
+        journal.record("fill", thread=1, color="#ff0000")
+        self.pattern.set_cell(2, "#00ff00")
+        journal.record("cell", cell=2, color="#00ff00")
+        journal.record("tab", name="Renamed")
+        autosave.close()
+        state: dict[str, typing.Any] = replay_journal(journal.path)
+        self.assertEqual(state["name"], "Renamed")
+        self.assertEqual(state["pattern"].to_dict(), self.pattern.to_dict())
+        self.assertEqual(autosave.journals(), [journal.path])
+
+    def test_crash_in_the_middle_of_a_batch(self) -> None:
+        autosave, journal = self.journal()
+        self.pattern.fill_thread(0, "#ff0000")
+        journal.record("fill", thread=0, color="#ff0000")
+        autosave.close()
+        expected: dict[str, typing.Any] = self.pattern.to_dict()
+        with open(journal.path, "a", encoding="utf-8") as f:  # the next line was cut off by a crash
+            f.write(json.dumps({"op": "fill", "thread": 1, "color": "#0000ff"})[:20])
+        self.assertEqual(replay_journal(journal.path)["pattern"].to_dict(), expected)
+
+    def test_links_are_compiled(self) -> None:
+        autosave, journal = self.journal()
+        journal.record("unlink", cell=0)
+        journal.record("unlink", cell=1)
+        journal.record("link", cell=1, thread=0)
+        journal.record("fill", thread=0, color="#ff0000")
+        autosave.close()
+        pattern: Pattern = replay_journal(journal.path)["pattern"]
+        self.assertEqual(pattern.cell_threads[0], -1)
+        self.assertEqual(pattern.cell_threads[1], 0)
+        self.assertEqual(pattern.cell_color(1), "#ff0000")
+        self.assertEqual(pattern.cell_color(0), "#ffffff")
+
+    def test_compaction(self) -> None:
+        autosave, journal = self.journal(compact_edits=3)
+        for i in range(5):
+            self.pattern.set_cell(i, "#ff0000")
+            journal.record("cell", cell=i, color="#ff0000")
+        autosave.close()
+        with open(journal.path, "r", encoding="utf-8") as f:
+            lines: list[str] = f.read().splitlines()
+        self.assertEqual(json.loads(lines[0])["op"], "snapshot")
+        self.assertLess(len(lines), 5)
+        self.assertEqual(replay_journal(journal.path)["pattern"].to_dict(), self.pattern.to_dict())
+
+    def test_remove(self) -> None:
+        autosave, journal = self.journal()
+        journal.remove()
+        autosave.close()
+        self.assertEqual(autosave.journals(), [])
+
+    def test_no_snapshot(self) -> None:
+        path: str = os.path.join(self.directory, "empty.journal")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "cell", "cell": 0, "color": "#ff0000"}) + "\n")
+        self.assertIsNone(replay_journal(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
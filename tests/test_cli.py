@@ -0,0 +1,129 @@
+"""
+Tests of the command line interface. Run from the repository root: python -m pytest tests
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from cli import main, output_path  # noqa
+from layouts import kumihimo_threads  # noqa
+from library import read_pattern, write_pattern  # noqa
+from pattern import Pattern  # noqa
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        pattern: Pattern = Pattern(6, 5, 17)
+        pattern.set_groups([list(range(n, pattern.cell_count, 17)) for n in range(17)])
+        self.path: str = self.write("pattern.json", pattern)
+
+    def write(self, name: str, pattern: Pattern, layout: str = "custom") -> str:
+        """
+        :param name: file name in the test directory
+        :param pattern: pattern
+        :param layout: layout of the groups
+        :return: path of the self-contained pattern file
+        """
+        path: str = os.path.join(self.directory, name)
+        write_pattern(path, pattern, None, os.path.splitext(name)[0], layout=layout)
+        return path
+
+    def run_cli(self, *argv: str) -> tuple[int, str, str]:
+        """
+        :param argv: arguments
+        :return: exit code, output and error output
+        """
+        out: io.StringIO = io.StringIO()
+        err: io.StringIO = io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            code: int = main(["--blobs", os.path.join(self.directory, "blobs"), *argv])
+        return code, out.getvalue(), err.getvalue()
+
+    def test_info(self) -> None:
+        code, out, err = self.run_cli("info", self.path)
+        self.assertEqual(code, 0)
+        self.assertIn("6 rows, 5 columns, 17 threads, 17 groups, 1 colors", out)
+        self.assertEqual(err, "")
+
+    def test_missing_file(self) -> None:
+        code, out, err = self.run_cli("info", self.path, os.path.join(self.directory, "missing.json"))
+        self.assertEqual(code, 1)
+        self.assertIn("missing.json", err)
+        self.assertIn("pattern.json", out)
+
+    def test_simulate(self) -> None:
+        output: str = os.path.join(self.directory, "simulated.json")
+        code, out, err = self.run_cli("simulate", self.path, "--colors", "#ff0000,#0000ff", "-o", output)
+        self.assertEqual(code, 0, err)
+        meta, pattern = read_pattern(output)
+        self.assertEqual(meta["layout"], "custom")
+        self.assertEqual(pattern.cell_color(0), "#ff0000")
+        self.assertEqual(pattern.cell_color(1), "#0000ff")
+        self.assertEqual(pattern.cell_color(2), "#ff0000")
+
+    def test_simulate_kumihimo(self) -> None:
+        path: str = self.write("disk.json", Pattern(8, 5, 32))
+        output: str = os.path.join(self.directory, "out")
+        os.mkdir(output)
+        code, out, err = self.run_cli("simulate", path, "--colors", "#ff0000", "--layout", "kumihimo",
+                                      "--kumihimo-threads", "8", "-o", output)
+        self.assertEqual(code, 0, err)
+        meta, pattern = read_pattern(os.path.join(output, "disk.json"))
+        self.assertEqual(meta["layout"], "kumihimo")
+        self.assertEqual({pattern.palette[pattern.thread_colors[n]] for n in kumihimo_threads(8)}, {"#ff0000"})
+        self.assertEqual({pattern.cell_color(i) for i in range(pattern.cell_count)}, {"#ff0000"})
+        code, out, err = self.run_cli("simulate", self.path, "--colors", "#ff0000", "--layout", "kumihimo",
+                                      "-o", output)
+        self.assertEqual(code, 1)
+        self.assertIn("32 thread slots", err)
+
+    def test_convert(self) -> None:
+        for extension in ("png", "svg", "txt", "json"):
+            output: str = os.path.join(self.directory, "out")
+            code, out, err = self.run_cli("convert", self.path, "--to", extension, "-o", output, "--scale", "0.2")
+            self.assertEqual(code, 0, err)
+            self.assertTrue(os.path.exists(os.path.join(output, f"pattern.{extension}")))
+
+    def test_convert_never_overwrites(self) -> None:
+        code, out, err = self.run_cli("convert", self.path, "--to", "json")
+        self.assertEqual(code, 1)
+        self.assertIn("overwrite", err)
+
+    def test_parallel(self) -> None:
+        paths: list[str] = [self.path, self.write("other.json", Pattern(3, 3, 9))]
+        code, out, err = self.run_cli("--jobs", "2", "info", *paths)
+        self.assertEqual(code, 0, err)
+        self.assertEqual(len(out.splitlines()), 2)
+
+    def test_validate(self) -> None:
+        broken: Pattern = Pattern(6, 5, 17)
+        broken.set_groups([list(range(n, broken.cell_count, 17)) for n in range(17)])
+        broken.set_cell(17, "#ff0000")
+        path: str = self.write("broken.json", broken)
+        report: str = os.path.join(self.directory, "report.json")
+        code, out, err = self.run_cli("validate", self.path, "--report", report)
+        self.assertEqual((code, err), (0, ""))
+        self.assertIn("ok", out)
+        code, out, err = self.run_cli("validate", self.path, path, "--report", report)
+        self.assertEqual(code, 1)
+        self.assertIn("broken.json", err)
+        with open(report, "r", encoding="utf-8") as f:
+            self.assertIsInstance(json.load(f), dict)
+
+    def test_output_path(self) -> None:
+        self.assertEqual(output_path("a/b.json", "c.png", "png", False), "c.png")
+        self.assertEqual(output_path("a/b.json", "c", "png", True), os.path.join("c", "b.png"))
+        self.assertEqual(output_path("a/b.json", None, "svg", False), os.path.join("a", "b.svg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
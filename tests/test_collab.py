@@ -0,0 +1,162 @@
+"""
+Tests of the collaboration protocol. Run from the repository root: python -m pytest tests
+"""
+import asyncio
+import json
+import os
+import random
+import struct
+import sys
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from collab import (FILL, MAX_SNAPSHOT, MESSAGES, SNAPSHOT, Loopback, Server, decode_snapshot, encode_snapshot,  # noqa
+                    read_message)
+from pattern import Pattern  # noqa
+
+
+def grouped(rows: int = 20, cols: int = 5) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: pattern whose threads each have a group
+    """
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    return pattern
+
+
+class TestLoopback(unittest.TestCase):
+    def test_converges(self) -> None:
+        loopback: Loopback = Loopback(grouped())
+        patterns: list[Pattern] = [grouped() for _ in range(5)]
+        for pattern in patterns:
+            loopback.connect(pattern)
+        rng: random.Random = random.Random(0)
+        colors: list[str] = [f"#{rng.randrange(0x1000000):06x}" for _ in range(8)]
+        for _ in range(50):
+            for pattern in patterns:
+                edit: int = rng.randrange(3)
+                if edit == 0:
+                    pattern.set_cell(rng.randrange(pattern.cell_count), rng.choice(colors))
+                elif edit == 1:
+                    pattern.set_thread(rng.randrange(pattern.threads), rng.choice(colors))
+                else:
+                    pattern.fill_thread(rng.randrange(pattern.threads), rng.choice(colors))
+            loopback.tick()
+        canonical: Pattern = loopback.hub.pattern
+        for pattern in patterns:
+            self.assertEqual([pattern.cell_color(i) for i in range(pattern.cell_count)],
+                             [canonical.cell_color(i) for i in range(canonical.cell_count)])
+            self.assertEqual([pattern.thread_color(n) for n in range(pattern.threads)],
+                             [canonical.thread_color(n) for n in range(canonical.threads)])
+
+    def test_snapshot_replaces(self) -> None:
+        loopback: Loopback = Loopback(grouped())
+        first: Pattern = grouped()
+        second: Pattern = grouped()
+        loopback.connect(first)
+        loopback.connect(second)
+        first.replace(grouped(30, 7))
+        first.set_cell(0, "#ff0000")
+        loopback.tick()
+        self.assertEqual((second.rows, second.cols), (30, 7))
+        self.assertEqual(second.cell_color(0), "#ff0000")
+
+    def test_failed_tick_is_dropped(self) -> None:
+        loopback: Loopback = Loopback(grouped())
+        client: Pattern = grouped()
+        loopback.connect(client)
+        loopback.hub.pattern.thread_colors = bytearray()  # a change of thread 0 fails
+        client.fill_thread(0, "#ff0000")
+        with self.assertRaises(IndexError):
+            loopback.tick()
+        loopback.hub.pattern.thread_colors = bytearray(client.threads)
+        client.set_cell(1, "#00ff00")
+        loopback.tick()
+        self.assertEqual(loopback.hub.pattern.cell_color(1), "#00ff00")
+
+
+class TestLimits(unittest.TestCase):
+    def test_oversized_snapshot(self) -> None:
+        async def read() -> bytes:
+            reader: asyncio.StreamReader = asyncio.StreamReader()
+            reader.feed_data(SNAPSHOT + struct.pack(">I", MAX_SNAPSHOT + 1))
+            reader.feed_eof()
+            return await read_message(reader)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(read())
+
+    def test_decompression_bomb(self) -> None:
+        with self.assertRaises(ValueError):
+            decode_snapshot(zlib.compress(b" " * (MAX_SNAPSHOT + 1)))
+
+    def test_broken_snapshot_disconnects(self) -> None:
+        errors: list[dict] = []
+
+        async def session() -> Pattern:
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            server: Server = Server(grouped())
+            await server.start("127.0.0.1", 0)
+            port: int = server._server.sockets[0].getsockname()[1]
+            try:
+                for data in (b"not zlib", zlib.compress(b"{}"), zlib.compress(b'{"rows": "x"}')):
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    await read_message(reader)
+                    writer.write(SNAPSHOT + struct.pack(">I", len(data)) + data)
+                    self.assertEqual(await reader.read(), b"")  # disconnected
+                    writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)  # still serving
+                pattern: Pattern = decode_snapshot((await read_message(reader))[1 + 4:])
+                writer.close()
+                return pattern
+            finally:
+                await server.close()
+
+        self.assertEqual(asyncio.run(session()).rows, 20)
+        self.assertEqual(errors, [])
+
+    def test_inconsistent_snapshot(self) -> None:
+        data: dict = grouped().to_dict()
+        for broken in ({**data, "threads": 13, "thread_colors": ""}, {**data, "cell_colors": "ff" * 36},
+                       {**data, "groups": [[10 ** 6]] * data["threads"]}, {**data, "rows": 10 ** 9, "cols": 10 ** 9}):
+            with self.assertRaises(ValueError):
+                decode_snapshot(zlib.compress(json.dumps(broken).encode()))
+
+    def test_inconsistent_snapshot_keeps_broadcasting(self) -> None:
+        async def session() -> bytes:
+            server: Server = Server(grouped())
+            await server.start("127.0.0.1", 0)
+            port: int = server._server.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                await read_message(reader)
+                data: bytes = zlib.compress(json.dumps({**grouped().to_dict(), "threads": 13,
+                                                        "thread_colors": ""}).encode())
+                fill: bytes = FILL + MESSAGES[FILL].pack(0, b"\xff\0\0")
+                writer.write(SNAPSHOT + struct.pack(">I", len(data)) + data + fill)
+                self.assertEqual(await reader.read(), b"")  # disconnected
+                writer.close()
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                await read_message(reader)
+                writer.write(FILL + MESSAGES[FILL].pack(1, b"\0\0\xff"))
+                message: bytes = await asyncio.wait_for(read_message(reader), 5)
+                writer.close()
+                self.assertFalse(server._ticker.done())
+                return message
+            finally:
+                await server.close()
+
+        self.assertEqual(asyncio.run(session()), FILL + MESSAGES[FILL].pack(1, b"\0\0\xff"))
+
+    def test_round_trip(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.set_cell(3, "#00ff00")
+        self.assertEqual(decode_snapshot(encode_snapshot(pattern)[1 + 4:]).cell_color(3), "#00ff00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Tests of the image to pattern converter. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from pattern import Pattern  # noqa
+
+try:
+    import numpy
+    from PIL import Image
+except ImportError:
+    numpy = Image = None
+else:
+    from converter import convert_image, fit_rows, sample_cells  # noqa
+
+
+@unittest.skipIf(Image is None, "PIL or NumPy is not installed")
+class TestConverter(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        # 5 columns sample 9 pixel columns of 10 pixels: the first 4 are red, the rest blue
+        self.path: str = self.image("halves.png", (90, 60), "#0000ff", "#ff0000", 40)
+
+    def image(self, name: str, size: tuple[int, int], color: str, left: str | None = None, width: int = 0) -> str:
+        """
+        :param name: file name in the test directory
+        :param size: width and height
+        :param color: color of the image
+        :param left: color of its left part
+        :param width: width of the left part
+        :return: path of the image
+        """
+        image: Image.Image = Image.new("RGB", size, color)
+        if left is not None:
+            image.paste(Image.new("RGB", (width, size[1]), left))
+        path: str = os.path.join(self.directory, name)
+        image.save(path)
+        return path
+
+    def test_fit_rows(self) -> None:
+        self.assertEqual(fit_rows(self.image("wide.png", (300, 100), "#ffffff"), 4), 1)
+        self.assertEqual(fit_rows(self.image("tall.png", (100, 300), "#ffffff"), 4), 6)
+        self.assertEqual(fit_rows(self.path, 9), 4)
+
+    def test_sample_cells(self) -> None:
+        cells: numpy.ndarray = sample_cells(self.path, 4, 5)
+        self.assertEqual(cells.shape, (4 * 5 + 4 * 4, 3))
+        self.assertEqual(cells[0].tolist(), [255, 0, 0])
+        self.assertEqual(cells[4].tolist(), [0, 0, 255])
+
+    def test_transparent_pixels(self) -> None:
+        path: str = os.path.join(self.directory, "transparent.png")
+        Image.new("RGBA", (10, 10), (0, 0, 0, 0)).save(path)
+        self.assertEqual(sample_cells(path, 2, 2).min(), 255)
+
+    def test_without_groups(self) -> None:
+        conversion = convert_image(self.path, Pattern(4, 5, 17), 8)
+        pattern: Pattern = conversion.pattern
+        self.assertEqual(sorted(pattern.palette), ["#0000ff", "#ff0000"])
+        self.assertEqual(conversion.conflicts, [])
+        self.assertEqual(pattern.cell_color(0), "#ff0000")
+        self.assertEqual(pattern.cell_color(4), "#0000ff")
+
+    def test_groups(self) -> None:
+        template: Pattern = Pattern(4, 5, 17)
+        template.set_groups([list(range(n, template.cell_count, 17)) for n in range(17)])
+        conversion = convert_image(self.path, template, 2)
+        pattern: Pattern = conversion.pattern
+        self.assertEqual(pattern.groups, template.groups)
+        for n, group in enumerate(pattern.groups):
+            self.assertEqual({pattern.cell_colors[i] for i in group}, {pattern.thread_colors[n]})
+        plain: Pattern = convert_image(self.path, Pattern(4, 5, 17), 2).pattern
+        self.assertEqual(conversion.conflicts, [i for i in range(pattern.cell_count)
+                                                if pattern.cell_color(i) != plain.cell_color(i)])
+        self.assertTrue(conversion.conflicts)
+        self.assertGreater(conversion.error, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
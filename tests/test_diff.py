@@ -0,0 +1,122 @@
+"""
+Tests of pattern diff and merge. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from diff import diff, merge  # noqa
+from pattern import Palette, Pattern  # noqa
+
+
+def grouped(rows: int = 4, cols: int = 3) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: pattern whose threads each have a group
+    """
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    return pattern
+
+
+def copy(pattern: Pattern) -> Pattern:
+    """
+    :param pattern: pattern
+    :return: independent copy
+    """
+    return Pattern.from_dict(pattern.to_dict())
+
+
+class TestDiff(unittest.TestCase):
+    def test_equal(self) -> None:
+        pattern: Pattern = grouped()
+        self.assertFalse(diff(pattern, copy(pattern)))
+
+    def test_palettes_are_compared_by_color(self) -> None:
+        old: Pattern = grouped()
+        old.set_cell(3, "#ff0000")
+        new: Pattern = Pattern(4, 3, 9, Palette(["#ffffff", "#00ff00", "#ff0000"]))
+        new.set_groups(old.groups)
+        new.set_cell(3, "#ff0000")
+        self.assertFalse(diff(old, new))
+        new.set_cell(4, "#00ff00")
+        self.assertEqual(diff(old, new).cells, [4])
+
+    def test_changes(self) -> None:
+        old: Pattern = grouped(40, 20)
+        new: Pattern = copy(old)
+        new.set_cell(5, "#ff0000")
+        new.set_cell(old.cell_count - 1, "#ff0000")
+        new.set_thread(2, "#00ff00")
+        new.set_groups([old.groups[0] + old.groups[1]] + [[]] + old.groups[2:])
+        result = diff(old, new)
+        self.assertEqual((result.rows, result.cols, result.threads), (None, None, None))
+        self.assertEqual(result.cells, [5, old.cell_count - 1])
+        self.assertEqual(result.thread_colors, [2])
+        self.assertEqual(result.groups, [0, 1])
+
+    def test_resized(self) -> None:
+        old: Pattern = Pattern(4, 4, 13)
+        new: Pattern = Pattern(5, 3, 9)
+        new.set_cell(new.cell_index(1, 1), "#ff0000")
+        new.set_cell(new.cell_index(1.5, 1.5), "#ff0000")
+        new.set_cell(new.cell_index(2, 4), "#ff0000")
+        result = diff(old, new)
+        self.assertEqual((result.rows, result.cols, result.threads), ((4, 5), (4, 3), (13, 9)))
+        self.assertEqual(result.cells, [new.cell_index(1, 1), new.cell_index(1.5, 1.5)])
+        self.assertEqual(result.groups, [])
+
+    def test_many_colors(self) -> None:
+        old: Pattern = Pattern(20, 9, 33)
+        new: Pattern = Pattern(20, 9, 33)
+        for i in range(old.cell_count):
+            old.set_cell(i, f"#00{i // 256:02x}{i % 256:02x}")
+            new.set_cell(i, f"#00{i // 256:02x}{i % 256:02x}" if i != 300 else "#ff0000")
+        self.assertEqual(diff(old, new).cells, [300])
+
+
+class TestMerge(unittest.TestCase):
+    def test_changes_from_both_sides(self) -> None:
+        base: Pattern = grouped()
+        ours: Pattern = copy(base)
+        theirs: Pattern = copy(base)
+        ours.set_cell(0, "#ff0000")
+        theirs.set_cell(1, "#00ff00")
+        theirs.set_thread(3, "#0000ff")
+        ours.set_cell(2, "#0000ff")
+        theirs.set_cell(2, "#0000ff")
+        result = merge(base, ours, theirs)
+        self.assertEqual((result.conflicts, result.thread_conflicts), ([], []))
+        self.assertEqual([result.pattern.cell_color(i) for i in range(3)], ["#ff0000", "#00ff00", "#0000ff"])
+        self.assertEqual(result.pattern.thread_color(3), "#0000ff")
+        self.assertEqual(result.pattern.groups, base.groups)
+
+    def test_conflicting_edits(self) -> None:
+        base: Pattern = grouped(40, 20)
+        ours: Pattern = copy(base)
+        theirs: Pattern = copy(base)
+        ours.set_cell(1500, "#ff0000")
+        theirs.set_cell(1500, "#00ff00")
+        theirs.set_cell(10, "#00ff00")
+        ours.set_thread(0, "#ff0000")
+        theirs.set_thread(0, "#00ff00")
+        theirs.set_groups([[]] + base.groups[1:])
+        ours.set_groups([base.groups[0] + base.groups[1]] + [[]] + base.groups[2:])
+        result = merge(base, ours, theirs)
+        self.assertEqual(result.conflicts, [1500])
+        self.assertEqual(result.pattern.cell_color(1500), "#ff0000")
+        self.assertEqual(result.pattern.cell_color(10), "#00ff00")
+        self.assertEqual(result.thread_conflicts, [0])
+        self.assertEqual(result.pattern.thread_color(0), "#ff0000")
+        self.assertEqual(result.pattern.groups[:2], [sorted(base.groups[0] + base.groups[1]), []])
+
+    def test_different_layouts(self) -> None:
+        with self.assertRaises(ValueError):
+            merge(grouped(), grouped(), grouped(5, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
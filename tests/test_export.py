@@ -0,0 +1,169 @@
+"""
+Tests of the streaming export. Run from the repository root: python -m pytest tests
+"""
+import os
+import struct
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from export import (RASTER_BACKGROUND, RASTER_OUTLINE, export, export_png, export_svg, export_text, raster,  # noqa
+                    raster_palette, raster_size)
+from pattern import Pattern  # noqa
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def read_png(path: str) -> tuple[int, int, bytes, bytes]:
+    """
+    Reads the chunks of a PNG written by export_png
+    :param path: file path
+    :return: width, height, palette and decompressed image data
+    """
+    with open(path, "rb") as f:
+        data: bytes = f.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks: dict[bytes, bytes] = {}
+    position: int = 8
+    while position < len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        chunk: bytes = data[position + 8:position + 8 + length]
+        assert struct.unpack(">I", data[position + 8 + length:position + 12 + length])[0] == zlib.crc32(kind + chunk)
+        chunks[kind] = chunks.get(kind, b"") + chunk
+        position += 12 + length
+    width, height = struct.unpack(">II", chunks[b"IHDR"][:8])
+    return width, height, chunks[b"PLTE"], zlib.decompress(chunks[b"IDAT"])
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        self.pattern: Pattern = Pattern(5, 3, 9)
+        self.pattern.set_cell(0, "#ff0000")
+        self.pattern.set_cell(self.pattern.rows * self.pattern.cols, "#0000ff")
+
+    def test_png(self) -> None:
+        path: str = os.path.join(self.directory, "pattern.png")
+        export_png(self.pattern, path, 4, 6, strip_rows=1)
+        width, height, palette, data = read_png(path)
+        self.assertEqual((width, height), raster_size(self.pattern, 4, 6))
+        self.assertEqual((width, height), (16, 54))
+        self.assertEqual(len(palette), 256 * 3)
+        self.assertEqual(len(data), height * (width + 1))
+        self.assertTrue(all(data[i] == 0 for i in range(0, len(data), width + 1)))
+
+    @unittest.skipIf(Image is None, "PIL is not installed")
+    def test_png_decodes(self) -> None:
+        path: str = os.path.join(self.directory, "pattern.png")
+        export_png(self.pattern, path, 4, 6)
+        with Image.open(path) as image:
+            self.assertEqual(image.size, raster_size(self.pattern, 4, 6))
+            image = image.convert("RGB")
+            self.assertEqual(image.getpixel((2, 1)), (255, 0, 0))
+            self.assertEqual(image.getpixel((4, 6)), (0, 0, 255))
+
+    def test_svg(self) -> None:
+        path: str = os.path.join(self.directory, "pattern.svg")
+        export_svg(self.pattern, path, 4, 6)
+        root: xml.etree.ElementTree.Element = xml.etree.ElementTree.parse(path).getroot()
+        self.assertEqual((int(root.get("width")), int(root.get("height"))), raster_size(self.pattern, 4, 6))
+        fills: list[str] = [polygon.get("fill") for polygon in root.iter("{http://www.w3.org/2000/svg}polygon")]
+        self.assertEqual(len(fills), self.pattern.cell_count)
+        self.assertEqual(fills[0], "#ff0000")
+        self.assertEqual(fills[self.pattern.cols], "#0000ff")
+
+    def test_text(self) -> None:
+        path: str = os.path.join(self.directory, "pattern.txt")
+        export_text(self.pattern, path)
+        with open(path, "r", encoding="utf-8") as f:
+            lines: list[str] = f.read().splitlines()
+        self.assertEqual(lines[0], "Legend:")
+        legend: dict[str, str] = dict(line.split() for line in lines[1:1 + len(self.pattern.palette)])
+        rows: list[str] = lines[lines.index("Rows:") + 1:]
+        self.assertEqual(len(rows), 2 * self.pattern.rows)
+        self.assertEqual(legend[rows[0].split()[1]], "#ff0000")
+        self.assertEqual(legend[rows[1].split()[0]], "#0000ff")
+
+    def test_text_too_many_colors(self) -> None:
+        pattern: Pattern = Pattern(10, 9, 33)
+        for i in range(pattern.cell_count):
+            pattern.set_cell(i, f"#0000{i:02x}")
+        with self.assertRaises(ValueError):
+            export_text(pattern, os.path.join(self.directory, "pattern.txt"))
+
+    def test_export_by_extension(self) -> None:
+        for name in ("pattern.png", "pattern.svg", "pattern.txt"):
+            export(self.pattern, os.path.join(self.directory, name))
+        with open(os.path.join(self.directory, "pattern.png"), "rb") as f:
+            self.assertEqual(f.read(4), b"\x89PNG")
+        with open(os.path.join(self.directory, "pattern.svg"), "r", encoding="utf-8") as f:
+            self.assertTrue(f.read().startswith("<svg"))
+        with open(os.path.join(self.directory, "pattern.txt"), "r", encoding="utf-8") as f:
+            self.assertEqual(f.readline(), "Legend:\n")
+
+
+class TestRaster(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pattern: Pattern = Pattern(6, 4, 13)
+        for i in range(self.pattern.cell_count):
+            self.pattern.set_cell(i, f"#00{i:02x}00")
+
+    def test_size(self) -> None:
+        lines: list[bytes] = list(raster(self.pattern, 5, 7))
+        width, height = raster_size(self.pattern, 5, 7)
+        self.assertEqual(len(lines), height)
+        self.assertEqual({len(line) for line in lines}, {width})
+        self.assertEqual(raster_size(Pattern(1, 1, 1), 5, 7), (1, 7))
+
+    def test_cell_centers(self) -> None:
+        lines: list[bytes] = list(raster(self.pattern, 5, 7))
+        rows, cols = self.pattern.rows, self.pattern.cols
+        for row in range(rows):
+            for col in range(1, cols - 1):
+                self.assertEqual(lines[2 * row * 7 + 3][2 * col * 5], self.pattern.cell_colors[row * cols + col])
+            for col in range(cols - 1):
+                self.assertEqual(lines[2 * row * 7 + 3 + 7 * (row < rows - 1)][(2 * col + 1) * 5],
+                                 self.pattern.cell_colors[rows * cols + row * (cols - 1) + col])
+        self.assertIn(RASTER_OUTLINE, lines[3])
+        self.assertFalse(any(RASTER_BACKGROUND in line for line in lines))  # the cells cover the whole image
+
+    def test_rows(self) -> None:
+        lines: list[bytes] = list(raster(self.pattern, 5, 7))
+        self.assertEqual(list(raster(self.pattern, 5, 7, 2, 4)), lines[2 * 2 * 7:2 * 4 * 7])
+        self.assertEqual(list(raster(self.pattern, 5, 7, 4)), lines[2 * 4 * 7:])
+
+    def test_wide_pattern(self) -> None:
+        pattern: Pattern = Pattern(2, 100, 397)
+        pattern.set_cell(98, "#ff0000")
+        lines: list[bytes] = list(raster(pattern, 2, 3))
+        self.assertEqual(len(lines[0]), raster_size(pattern, 2, 3)[0])
+        self.assertEqual(lines[1][97 * 4], 0)
+        self.assertEqual(lines[1][98 * 4], pattern.cell_colors[98])
+
+    def test_palette(self) -> None:
+        palette: bytes = raster_palette(self.pattern)
+        self.assertEqual(len(palette), 256 * 3)
+        self.assertEqual(palette[:6], bytes((255, 255, 255, 0, 0, 0)))
+        self.assertEqual(palette[6:9], bytes((0, 1, 0)))
+        self.assertEqual(palette[RASTER_BACKGROUND * 3:RASTER_BACKGROUND * 3 + 3], bytes((255, 255, 255)))
+        self.assertEqual(palette[RASTER_OUTLINE * 3:], bytes(3))
+
+    def test_too_many_colors(self) -> None:
+        pattern: Pattern = Pattern(20, 9, 33)
+        for i in range(pattern.cell_count):
+            pattern.set_cell(i, f"#00{i // 256:02x}{i % 256:02x}")
+        with self.assertRaises(ValueError):
+            next(raster(pattern))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Tests of the canvas layout. Run from the repository root: python -m pytest tests
+"""
+import math
+import os
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from geometry import BOTTOM, LEFT, RIGHT, TOP, Layout, border_clip, layout, rhombus_template  # noqa
+from export import export_svg  # noqa
+from layouts import kumihimo_threads  # noqa
+from pattern import Pattern  # noqa
+
+
+class TestRhombus(unittest.TestCase):
+    def test_template(self) -> None:
+        self.assertEqual(rhombus_template(2, 3), (0, -3, 2, 0, 0, 3, -2, 0))
+        self.assertEqual(rhombus_template(2, 3, TOP), (2, 0, 0, 3, -2, 0))
+        self.assertEqual(rhombus_template(2, 3, TOP | LEFT), (2, 0, 0, 3, 0, 0))
+
+    def test_border_clip(self) -> None:
+        self.assertEqual(border_clip(4, 3, 0, 0, False), TOP | LEFT)
+        self.assertEqual(border_clip(4, 3, 0, 2, False), TOP | RIGHT)
+        self.assertEqual(border_clip(4, 3, 3, 1, False), 0)
+        self.assertEqual(border_clip(4, 3, 3, 1, True), BOTTOM)
+        self.assertEqual(border_clip(4, 3, 1, 0, True), 0)
+
+
+class TestLayout(unittest.TestCase):
+    def test_cell_at_centers(self) -> None:
+        grid: Layout = Layout(5, 4, 13)
+        self.assertEqual(grid.cell_count, 5 * 4 + 5 * 3)
+        for i in range(grid.cell_count):
+            x, y = grid.centers[i * 2], grid.centers[i * 2 + 1]
+            self.assertEqual(grid.cell_at(x, y), i)
+            polygon: list[int] = grid.polygon(i)
+            for k in range(0, len(polygon), 2):  # points a little inside every corner
+                self.assertEqual(grid.cell_at(x + (polygon[k] - x) * 0.9, y + (polygon[k + 1] - y) * 0.9), i)
+
+    def test_cell_at_outside(self) -> None:
+        grid: Layout = Layout(5, 4, 13)
+        self.assertEqual(grid.cell_at(0, 0), -1)
+        self.assertEqual(grid.cell_at(grid.offset + 7 * grid.cell_width, grid.offset), -1)
+        self.assertEqual(grid.cell_at(grid.offset, grid.offset + 10 * grid.cell_height), -1)
+
+    def test_polygon(self) -> None:
+        grid: Layout = Layout(5, 4, 13, 2, 3, offset=0)
+        self.assertEqual(grid.polygon(5), [4, 3, 6, 6, 4, 9, 2, 6])
+        self.assertEqual(grid.polygon(0), [2, 0, 0, 3, 0, 0])
+
+    def test_row_circles(self) -> None:
+        grid: Layout = Layout(5, 4, 13)
+        self.assertEqual(sorted(grid.circle_threads), list(range(13)))
+        for n in range(13):
+            self.assertEqual(grid.circle_at(*grid.circle(n)), n)
+        self.assertEqual(grid.circle_at(0, 0), -1)
+        self.assertEqual(len({grid.circle(n) for n in range(13)}), 13)
+
+    def test_ring_circles(self) -> None:
+        grid: Layout = Layout(20, 9, 16, ring=True)
+        cx, cy, radius = grid.ring
+        self.assertEqual(grid.circle_threads, list(kumihimo_threads(16)))
+        for n in range(32):
+            x, y = grid.circle(n)
+            if n in grid.circle_threads:
+                self.assertAlmostEqual(math.hypot(x - cx, y - cy), radius)
+                self.assertEqual(grid.circle_at(x, y), n)
+            else:
+                self.assertTrue(math.isnan(x))
+        self.assertLessEqual(cx + radius, grid.width)
+        self.assertLessEqual(cy + radius, grid.height)
+
+    def test_export_matches_canvas(self) -> None:
+        pattern: Pattern = Pattern(5, 4, 13)
+        grid: Layout = Layout(5, 4, 13, 4, 6, offset=0)
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, "pattern.svg")
+            export_svg(pattern, path, 4, 6)
+            polygons: list[list[int]] = [[int(k) for j in i.get("points").split() for k in j.split(",")]
+                                         for i in xml.etree.ElementTree.parse(path).getroot().iter(
+                                             "{http://www.w3.org/2000/svg}polygon")]
+        # the SVG goes row by row, outer cells then inner cells of each row
+        order: list[int] = [i for row in range(5) for i in (*range(row * 4, row * 4 + 4),
+                                                             *range(20 + row * 3, 20 + row * 3 + 3))]
+        self.assertEqual(polygons, [grid.polygon(i) for i in order])
+
+    def test_shared(self) -> None:
+        self.assertIs(layout(5, 4, 13), layout(5, 4, 13))
+        self.assertIsNot(layout(5, 4, 13), layout(5, 4, 13, ring=False, cell_width=10))
+
+
+if __name__ == "__main__":
+    unittest.main()
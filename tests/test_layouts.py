@@ -0,0 +1,92 @@
+"""
+Tests of the built-in layouts. Run from the repository root: python -m pytest tests
+"""
+import math
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from layouts import (KUMIHIMO_THREADS, kumihimo_cells, kumihimo_groups, kumihimo_slots, kumihimo_table,  # noqa
+                     kumihimo_threads)
+from pattern import Pattern  # noqa
+
+
+def fill_circle(circle: int, rows: int, threads: int) -> set[tuple[float, float]]:
+    """
+    The diamond walk Kumihimo used before the layouts were tabulated, kept as the reference for 8 and 16 threads
+    :param circle: thread slot
+    :param rows: grid rows
+    :param threads: number of threads
+    :return: logical coordinates of the cells, including some outside the grid
+    """
+    start_x: float = 3 - math.floor(circle % 16 / (32 / threads * 2))
+    shift: float = math.floor(circle / 16) * 2 + circle % 2
+    start_x -= 0.5 * shift
+    start_y: float = 0.5 * shift
+    sh: float = math.log(threads // 4, 2) % 2 * 2 + 1
+    start_shift: tuple[float, float] = (0.5 * (threads // 4) - 0.5 * sh, 0.5 * (threads // 4) + 0.5 * sh)
+    if threads // 4 < 4:
+        start_x -= start_shift[0]
+        start_y -= start_shift[1]
+    diamonds: set[tuple[float, float]] = set()
+    while start_y < rows:
+        x, y = start_x, start_y
+        while 0 <= x and y < rows:
+            diamonds.add((x, y))
+            x, y = x - 2, y + 2
+        start_x, start_y = start_x + start_shift[0], start_y + start_shift[1]
+        x, y = start_x, start_y
+        while x < rows - 0.5 and 0 <= y:
+            start_x, start_y = x, y
+            x, y = x + 2, y - 2
+    return diamonds
+
+
+class TestKumihimo(unittest.TestCase):
+    def test_threads(self) -> None:
+        self.assertEqual(kumihimo_threads(8), (0, 1, 8, 9, 16, 17, 24, 25))
+        self.assertEqual(kumihimo_threads(16), tuple(i for i in range(32) if i % 4 < 2))
+
+    def test_baseline(self) -> None:
+        for threads in (8, 16):
+            for rows, cols in ((7, 5), (20, 5), (10, 9), (30, 9)):
+                with self.subTest(threads=threads, rows=rows, cols=cols):
+                    pattern: Pattern = Pattern(rows, cols, 32)
+                    grid: set[tuple[float, float]] = {pattern.cell_coords(i) for i in range(pattern.cell_count)}
+                    for circle in kumihimo_threads(threads):
+                        self.assertEqual(kumihimo_cells(circle, rows, cols, threads),
+                                         fill_circle(circle, rows, threads) & grid)
+
+    def test_groups(self) -> None:
+        pattern: Pattern = Pattern(12, 7, 32)
+        groups: list[list[int]] = kumihimo_groups(pattern, 16)
+        self.assertEqual(len(groups), 32)
+        self.assertEqual(sorted(i for group in groups for i in group), list(range(pattern.cell_count)))
+        self.assertTrue(all(not groups[n] for n in range(32) if n not in kumihimo_threads(16)))
+        self.assertIs(kumihimo_table(12, 7, 16), kumihimo_table(12, 7, 16))
+
+    def test_slots(self) -> None:
+        self.assertEqual([kumihimo_slots(i) for i in KUMIHIMO_THREADS], [32, 32, 48, 32, 48, 64])
+        self.assertEqual(kumihimo_slots(8, 10), 10)
+        for threads, slots in ((0, None), (6, None), (-4, None), (8, 6), (8, 9)):
+            with self.subTest(threads=threads, slots=slots), self.assertRaises(ValueError):
+                kumihimo_slots(threads, slots)
+
+    def test_every_thread_count(self) -> None:
+        for threads in KUMIHIMO_THREADS + (12, 20):
+            for slots in (None, kumihimo_slots(threads) + 4):
+                with self.subTest(threads=threads, slots=slots):
+                    used: tuple[int, ...] = kumihimo_threads(threads, slots)
+                    self.assertEqual(len(set(used)), threads)
+                    table: tuple[tuple[int, ...], ...] = kumihimo_table(25, 9, threads, slots)
+                    self.assertEqual(len(table), kumihimo_slots(threads, slots))
+                    cells: list[int] = sorted(i for group in table for i in group)
+                    self.assertEqual(cells, list(range(25 * 9 + 25 * 8)))
+                    self.assertTrue(all(table[n] for n in used))
+                    self.assertFalse(any(table[n] for n in range(len(table)) if n not in used))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Tests of pattern files and the library index. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from library import BlobStore, Library, read_pattern, write_pattern  # noqa
+from pattern import Palette, Pattern  # noqa
+
+
+class TestLibrary(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        self.filenames: str = os.path.join(self.directory, "filenames.txt")
+        self.library: Library = Library(self.directory, self.filenames, os.path.join(self.directory, "index.sqlite3"),
+                                        os.path.join(self.directory, "blobs"))
+        self.addCleanup(self.library.close)
+
+    def save(self, filename: str, name: str, threads: int = 5, colors: tuple[str, ...] = ()) -> str:
+        """
+        Writes a pattern file with the cells of the first threads filled
+        :param filename: file name in the directory
+        :param name: pattern name
+        :param threads: number of threads
+        :param colors: colors of the first threads
+        :return: file path
+        """
+        pattern: Pattern = Pattern(3, 3, threads, Palette(("#ffffff", "#123456")))  # #123456 is never used
+        for n, color in enumerate(colors):
+            pattern.set_thread(n, color)
+        path: str = os.path.join(self.directory, filename)
+        write_pattern(path, pattern, None, name)
+        return path
+
+    def listed(self, *filenames: str) -> None:
+        """
+        Writes the filenames file
+        :param filenames: listed files
+        :return: None
+        """
+        with open(self.filenames, "w", encoding="utf-8") as f:
+            f.write("".join(f"{i}\n" for i in filenames))
+
+    def names(self, **query) -> list[str]:
+        """
+        :param query: search arguments
+        :return: names of the found patterns
+        """
+        return [i.name for i in self.library.search(**query)]
+
+    def test_update_and_search(self) -> None:
+        self.save("a.json", "Alpha", 5, ("#ff0000",))
+        self.save("b.json", "Beta", 7, ("#0000ff",))
+        self.save("c.json", "alphabet", 7)
+        self.listed("a.json", "b.json", "c.json")
+        self.assertEqual(self.library.update(), 3)
+        self.assertEqual(self.library.update(), 0)  # nothing changed
+        self.assertEqual(self.names(), ["Alpha", "alphabet", "Beta"])
+        self.assertEqual(self.names(text="ALPHA"), ["Alpha", "alphabet"])
+        self.assertEqual(self.names(text="bet"), ["alphabet", "Beta"])
+        self.assertEqual(self.names(text="bet", prefix=True), ["Beta"])
+        self.assertEqual(self.names(threads=7), ["alphabet", "Beta"])
+        self.assertEqual(self.names(color="#f00"), ["Alpha"])
+        self.assertEqual(self.names(color="#fb0000"), [])
+        self.assertEqual(self.names(color="#fb0000", tolerance=8), ["Alpha"])
+        self.assertEqual(self.names(color="#123456"), [])  # in the palette, but unused
+        self.assertEqual(self.names(text="%"), [])
+
+    def test_update_follows_changes(self) -> None:
+        self.save("a.json", "Alpha")
+        self.save("b.json", "Beta")
+        self.listed("a.json", "b.json")
+        self.library.update()
+        self.save("a.json", "Gamma", 9)
+        self.listed("a.json")
+        self.assertEqual(self.library.update(), 1)
+        self.assertEqual([(i.name, i.threads) for i in self.library.search()], [("Gamma", 9)])
+
+    def test_add(self) -> None:
+        path: str = self.save("a.json", "Alpha")
+        self.library.add(path)
+        self.library.add(os.path.join(self.directory, ".", "a.json"))
+        self.assertEqual(self.library.filenames(), [os.path.join(self.directory, "a.json")])
+        self.assertEqual([i.path for i in self.library.search()], [os.path.join(self.directory, "a.json")])
+        self.assertEqual(self.library.update(), 0)  # indexed under the listed path
+
+    def test_unreadable_files_are_left_out(self) -> None:
+        with open(os.path.join(self.directory, "broken.json"), "w", encoding="utf-8") as f:
+            f.write("{")
+        self.save("a.json", "Alpha")
+        self.listed("broken.json", "missing.json", "a.json")
+        self.library.update()
+        self.assertEqual(self.names(), ["Alpha"])
+
+    def test_read_pattern(self) -> None:
+        path: str = self.save("a.json", "Alpha", 5, ("#ff0000",))
+        meta, pattern = read_pattern(path)
+        self.assertEqual((meta["name"], meta["layout"], meta["blob"]), ("Alpha", "custom", None))
+        self.assertEqual(pattern.thread_color(0), "#ff0000")
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        self.store: BlobStore = BlobStore(os.path.join(self.directory, "blobs"))
+
+    def test_equal_patterns_are_stored_once(self) -> None:
+        first: Pattern = Pattern(3, 3, 5, Palette(("#ffffff", "#00ff00", "#0000ff")))
+        second: Pattern = Pattern(3, 3, 5)
+        for pattern in (first, second):
+            pattern.set_thread(0, "#ff0000")
+            pattern.set_cell(1, "#0000ff")
+        self.assertEqual(first.content_hash(), second.content_hash())  # palettes differ in unused and order
+        blob: str = self.store.put(first)
+        self.assertEqual(self.store.put(second), blob)
+        self.assertEqual(blob, first.content_hash())
+        stored: Pattern = Pattern.from_dict(self.store.get(blob))
+        self.assertEqual((stored.thread_color(0), stored.cell_color(1), stored.cell_color(0)),
+                         ("#ff0000", "#0000ff", "#ffffff"))
+        self.assertEqual(len(stored.palette), 3)
+
+    def test_different_patterns_differ(self) -> None:
+        first: Pattern = Pattern(3, 3, 5)
+        second: Pattern = Pattern(3, 3, 5)
+        second.set_cell(0, "#ff0000")
+        self.assertNotEqual(first.content_hash(), second.content_hash())
+        self.assertNotEqual(Pattern(3, 3, 5, Palette(("#000000",))).content_hash(), first.content_hash())
+
+    def test_pattern_files(self) -> None:
+        pattern: Pattern = Pattern(3, 3, 5)
+        pattern.set_cell(2, "#ff0000")
+        first: str = os.path.join(self.directory, "a.json")
+        second: str = os.path.join(self.directory, "b.json")
+        blob: str = write_pattern(first, pattern, self.store, "A")
+        self.assertEqual(write_pattern(second, pattern, self.store, "B"), blob)
+        meta, copy = read_pattern(second, self.store)
+        self.assertEqual((meta["name"], meta["blob"]), ("B", blob))
+        self.assertEqual(copy.cell_color(2), "#ff0000")
+        with self.assertRaises(ValueError):
+            read_pattern(second)  # no store for the blob
+
+    def test_remove_unused(self) -> None:
+        used: str = self.store.put(Pattern(3, 3, 5))
+        unused: str = self.store.put(Pattern(4, 3, 5))
+        self.assertEqual(self.store.remove_unused([used]), 1)
+        self.assertTrue(os.path.exists(self.store.path(used)))
+        self.assertFalse(os.path.exists(self.store.path(unused)))
+
+
+if __name__ == "__main__":
+    unittest.main()
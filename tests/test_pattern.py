@@ -0,0 +1,257 @@
+"""
+Tests of the pattern model. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from pattern import Change, GroupBuilder, Palette, Pattern, check_pattern, normalize_color  # noqa
+
+
+def grouped(rows: int = 4, cols: int = 3) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: pattern whose threads each have a group
+    """
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    return pattern
+
+
+class TestColors(unittest.TestCase):
+    def test_normalize_color(self) -> None:
+        self.assertEqual(normalize_color("#F00"), "#ff0000")
+        self.assertEqual(normalize_color("#ffff00000000"), "#ff0000")
+        self.assertEqual(normalize_color((0, 128, 255)), "#0080ff")
+        self.assertEqual(normalize_color(" Grey "), "#808080")
+        self.assertEqual(normalize_color("nonsense"), "nonsense")
+
+
+class TestPalette(unittest.TestCase):
+    def test_index_adds_colors_once(self) -> None:
+        palette: Palette = Palette()
+        self.assertEqual(palette.index("#ff0000"), 1)
+        self.assertEqual(palette.index("#F00"), 1)
+        self.assertEqual(list(palette), ["#ffffff", "#ff0000"])
+
+    def test_tolerance(self) -> None:
+        palette: Palette = Palette(("#ffffff", "#ff0000"), tolerance=8)
+        self.assertEqual(palette.index("#fb0000"), 1)
+        self.assertEqual(palette.index("#f00000"), 2)
+        self.assertIsNone(palette.find("#f80000", tolerance=0))
+
+    def test_set_keeps_lookup(self) -> None:
+        palette: Palette = Palette(("#ffffff", "#ff0000", "#ff0000"))
+        palette.set(1, "#00ff00")
+        self.assertEqual(palette.find("#ff0000"), 2)
+        self.assertEqual(palette.find("#00ff00"), 1)
+
+    def test_quantize(self) -> None:
+        palette: Palette = Palette(("#ffffff", "#ff0000", "#fe0101", "#0000ff", "#fdfdfd"))
+        table: bytes = palette.quantize(8)
+        self.assertEqual(list(palette), ["#ffffff", "#ff0000", "#0000ff"])
+        self.assertEqual(list(table[:5]), [0, 1, 1, 2, 0])
+
+
+class TestPattern(unittest.TestCase):
+    def test_cell_coordinates(self) -> None:
+        pattern: Pattern = Pattern(4, 3, 9)
+        self.assertEqual(pattern.cell_count, 4 * 3 + 4 * 2)
+        for i in range(pattern.cell_count):
+            self.assertEqual(pattern.cell_index(*pattern.cell_coords(i)), i)
+        self.assertEqual(pattern.cell_index(3, 0), -1)
+        self.assertEqual(pattern.cell_index(2.5, 0.5), -1)
+        self.assertEqual(pattern.cell_index(0.25, 0), -1)
+
+    def test_fill_thread(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.set_cell(0, "#00ff00")
+        index, old = pattern.fill_thread(0, "#ff0000")
+        self.assertEqual(pattern.palette[index], "#ff0000")
+        self.assertEqual(old, {0, pattern.palette.index("#00ff00")})
+        self.assertEqual({pattern.cell_color(i) for i in pattern.groups[0]}, {"#ff0000"})
+        self.assertEqual(pattern.thread_color(0), "#ff0000")
+        self.assertEqual(pattern.cell_color(1), "#ffffff")
+
+    def test_fill_threads(self) -> None:
+        pattern: Pattern = grouped()
+        expected: Pattern = grouped()
+        colors: list[str | None] = ["#ff0000", None, "#0000ff", "#ff0000"] + [None] * (pattern.threads - 4)
+        for n, color in enumerate(colors):
+            if color is not None:
+                expected.fill_thread(n, color)
+        filled, old = pattern.fill_threads(colors)
+        self.assertEqual(pattern.to_dict(), expected.to_dict())
+        self.assertEqual(filled, {pattern.palette.index("#ff0000"): [0, 3], pattern.palette.index("#0000ff"): [2]})
+        self.assertEqual(old, {0})
+        pattern.fill_threads(["#00ff00"] * (pattern.threads + 5))
+        self.assertEqual({pattern.cell_color(i) for i in range(pattern.cell_count)}, {"#00ff00"})
+
+    def test_recolor(self) -> None:
+        pattern: Pattern = grouped()
+        index, _ = pattern.fill_thread(1, "#ff0000")
+        pattern.recolor(index, "#0000ff")
+        self.assertEqual({pattern.cell_color(i) for i in pattern.groups[1]}, {"#0000ff"})
+
+    def test_quantize(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.set_cell(0, "#ff0000")
+        pattern.set_cell(1, "#fe0000")
+        pattern.quantize(8)
+        self.assertEqual(len(pattern.palette), 2)
+        self.assertEqual(pattern.cell_colors[0], pattern.cell_colors[1])
+
+    def test_dict_round_trip(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.fill_thread(2, "#ff0000")
+        pattern.set_cell(5, "#00ff00")
+        copy: Pattern = Pattern.from_dict(pattern.to_dict())
+        self.assertEqual(copy.to_dict(), pattern.to_dict())
+        self.assertEqual(list(copy.cell_threads), list(pattern.cell_threads))
+
+    def test_resize(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.set_cell(0, "#ff0000")
+        pattern.resize(2, 2, 5)
+        self.assertEqual(len(pattern.cell_colors), pattern.cell_count)
+        self.assertEqual(set(pattern.cell_colors), {0})
+        self.assertEqual(pattern.groups, [[]] * 5)
+
+
+class TestCheckPattern(unittest.TestCase):
+    def kinds(self, **fields) -> list[str]:
+        """
+        :param fields: fields replaced in a consistent pattern
+        :return: kinds of the problems found
+        """
+        return [i.kind for i in check_pattern({**grouped().to_dict(), **fields})]
+
+    def test_consistent(self) -> None:
+        self.assertEqual(check_pattern(grouped().to_dict()), [])
+
+    def test_problems(self) -> None:
+        data: dict = grouped().to_dict()
+        self.assertEqual([i.kind for i in check_pattern({k: j for k, j in data.items() if k != "groups"})], ["file"])
+        self.assertEqual(self.kinds(cell_colors="zz"), ["file"])
+        self.assertEqual(self.kinds(rows=0), ["size"])
+        self.assertEqual(self.kinds(thread_colors=""), ["size"])
+        self.assertEqual(self.kinds(groups=data["groups"][:-1]), ["threads", "unassigned"])
+        self.assertEqual(self.kinds(groups=[[100]] + data["groups"][1:]), ["range", "unassigned"])
+        self.assertEqual(self.kinds(groups=[data["groups"][0] + [1]] + data["groups"][1:]), ["overlap"])
+        self.assertEqual(self.kinds(thread_colors="05" + data["thread_colors"][2:]), ["palette"])
+
+    def test_from_dict_rejects_inconsistent_data(self) -> None:
+        data: dict = grouped().to_dict()
+        for broken in ({**data, "thread_colors": ""}, {**data, "cell_colors": "05" + data["cell_colors"][2:]},
+                       {**data, "groups": [[100]] + data["groups"][1:]}, {**data, "groups": data["groups"][:-1]},
+                       {k: j for k, j in data.items() if k != "palette"}):
+            with self.assertRaises(ValueError):
+                Pattern.from_dict(broken)
+
+    def test_from_dict_allows_unlinked_cells(self) -> None:
+        data: dict = grouped().to_dict()
+        pattern: Pattern = Pattern.from_dict({**data, "groups": [[0, 1]] + [[] for _ in data["groups"][1:]]})
+        self.assertEqual(pattern.cell_threads[1], 0)
+        self.assertEqual(pattern.cell_threads[2], -1)
+
+
+class TestGroupBuilder(unittest.TestCase):
+    def test_from_groups_round_trip(self) -> None:
+        pattern: Pattern = grouped()
+        self.assertEqual(GroupBuilder.from_groups(pattern.cell_count, pattern.groups).compile(), pattern.groups)
+
+    def test_link(self) -> None:
+        builder: GroupBuilder = GroupBuilder(6, 2)
+        builder.link(0, 1)
+        builder.link(1, 2)
+        builder.link_thread(2, 0)
+        builder.link_thread(4, 1)
+        self.assertEqual(builder.compile(), [[0, 1, 2], [4]])
+
+    def test_link_threads_together(self) -> None:
+        builder: GroupBuilder = GroupBuilder(4, 2)
+        builder.link_thread(0, 0)
+        builder.link_thread(1, 1)
+        builder.link(0, 1)
+        self.assertEqual(builder.compile(), [[0, 1], [0, 1]])
+
+    def test_unlink(self) -> None:
+        builder: GroupBuilder = GroupBuilder.from_groups(5, [[0, 1, 2], [3, 4]])
+        builder.unlink(1)
+        self.assertEqual(builder.compile(), [[0, 2], [3, 4]])
+        builder.unlink(1)
+        builder.link_thread(1, 1)
+        self.assertEqual(builder.compile(), [[0, 2], [1, 3, 4]])
+
+    def test_many_unlinks(self) -> None:
+        builder: GroupBuilder = GroupBuilder.from_groups(4, [[0, 1, 2, 3]])
+        for _ in range(20):
+            builder.unlink(0)
+            builder.link_thread(0, 0)
+            self.assertEqual(builder.compile(), [[0, 1, 2, 3]])
+        self.assertLessEqual(len(builder.sets.parent), 2 * len(builder.nodes) + 1)
+
+
+class TestObservers(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pattern: Pattern = grouped()
+        self.changes: list[Change] = []
+        self.pattern.subscribe(self.changes.append)
+
+    def test_changes(self) -> None:
+        pattern: Pattern = self.pattern
+        red: int = pattern.set_thread(1, "#ff0000")
+        pattern.set_cell(4, "#ff0000")
+        pattern.fill_thread(0, "#ff0000")
+        green: int = pattern.palette.index("#00ff00")
+        pattern.fill_threads(["#00ff00"])
+        pattern.recolor(red, "#0000ff")
+        pattern.set_groups(pattern.groups)
+        pattern.quantize(8)
+        pattern.replace(grouped())
+        pattern.resize(2, 2, 5)
+        self.assertEqual([i.kind for i in self.changes], ["thread", "cell", "fill", "fill_threads", "recolor",
+                                                          "groups", "quantize", "replace", "resize"])
+        self.assertEqual(self.changes[0], Change("thread", 1, red, (0,)))
+        self.assertEqual(self.changes[1], Change("cell", 4, red, (0,), (4,)))
+        self.assertEqual(self.changes[2].cells, grouped().groups[0])
+        self.assertEqual(self.changes[3].filled, {green: [0]})
+        self.assertIn(red, self.changes[3].old)
+
+    def test_unsubscribe(self) -> None:
+        pattern: Pattern = self.pattern
+        pattern.unsubscribe(self.changes.append)
+        pattern.unsubscribe(self.changes.append)
+        pattern.set_cell(0, "#ff0000")
+        self.assertEqual(self.changes, [])
+
+    def test_unsubscribe_while_notified(self) -> None:
+        pattern: Pattern = self.pattern
+        seen: list[str] = []
+
+        def once(change: Change) -> None:
+            seen.append(change.kind)
+            pattern.unsubscribe(once)
+
+        pattern.subscribe(once)
+        pattern.set_cell(0, "#ff0000")
+        pattern.set_cell(1, "#ff0000")
+        self.assertEqual(seen, ["cell"])
+        self.assertEqual(len(self.changes), 2)
+
+    def test_replace_keeps_observers(self) -> None:
+        pattern: Pattern = Pattern(4, 3, 9, Palette(tolerance=5))
+        pattern.subscribe(self.changes.append)
+        other: Pattern = grouped(5, 3)
+        pattern.replace(other)
+        self.assertEqual((pattern.rows, pattern.palette.tolerance), (5, 5))
+        self.assertEqual(pattern.observers, [self.changes.append])
+        pattern.set_cell(0, "#ff0000")
+        self.assertEqual([i.kind for i in self.changes], ["replace", "cell"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+Tests of the thread color presets. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from presets import PRESETS, alternating, from_image, gradient, rainbow  # noqa
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class TestPresets(unittest.TestCase):
+    def test_gradient(self) -> None:
+        self.assertEqual(gradient(("#000000", "#ffffff"), 3), ["#000000", "#808080", "#ffffff"])
+        self.assertEqual(gradient(("#ff0000", "#00ff00", "#0000ff"), 5),
+                         ["#ff0000", "#808000", "#00ff00", "#008080", "#0000ff"])
+        self.assertEqual(gradient(("#ff0000", "#0000ff"), 1), ["#ff0000"])
+        self.assertEqual(gradient(("red",), 2), ["#ff0000", "#ff0000"])
+        self.assertEqual(gradient(("#000000", "#ffffff"), 0), [])
+
+    def test_alternating(self) -> None:
+        self.assertEqual(alternating(("#000", "white"), 5), ["#000000", "#ffffff", "#000000", "#ffffff", "#000000"])
+
+    def test_rainbow(self) -> None:
+        colors: list[str] = rainbow(6)
+        self.assertEqual(colors, ["#ff0000", "#ffff00", "#00ff00", "#00ffff", "#0000ff", "#ff00ff"])
+        self.assertEqual(rainbow(0), [])
+
+    def test_every_preset(self) -> None:
+        for name, preset in PRESETS.items():
+            with self.subTest(name=name):
+                colors: list[str] = preset(17)
+                self.assertEqual(len(colors), 17)
+                self.assertTrue(all(len(i) == 7 and i.startswith("#") for i in colors))
+
+    @unittest.skipIf(Image is None, "PIL is not installed")
+    def test_from_image(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path: str = os.path.join(directory, "stripes.png")
+            image: Image.Image = Image.new("RGB", (40, 10), "#0000ff")
+            image.paste((255, 0, 0), (0, 0, 20, 10))
+            image.save(path)
+            self.assertEqual(from_image(path, 2), ["#ff0000", "#0000ff"])
+            self.assertEqual(from_image(path, 4), ["#ff0000", "#ff0000", "#0000ff", "#0000ff"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+Tests of the reverse solver. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from pattern import DisjointSet, Pattern  # noqa
+from solver import solve  # noqa
+
+
+def grouped(rows: int = 4, cols: int = 3) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: pattern whose threads each have a group
+    """
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    return pattern
+
+
+class TestDisjointSet(unittest.TestCase):
+    def test_union_and_find(self) -> None:
+        sets: DisjointSet = DisjointSet(6)
+        sets.union(0, 1)
+        sets.union(2, 3)
+        self.assertEqual(sets.find(0), sets.find(1))
+        self.assertNotEqual(sets.find(1), sets.find(2))
+        root: int = sets.union(1, 3)
+        self.assertEqual({sets.find(i) for i in range(4)}, {root})
+        self.assertEqual(sets.sizes[root], 4)
+        self.assertEqual(sets.find(5), 5)
+
+    def test_add(self) -> None:
+        sets: DisjointSet = DisjointSet(2)
+        i: int = sets.add()
+        self.assertEqual(i, 2)
+        self.assertEqual(sets.find(i), i)
+        sets.union(0, i)
+        self.assertEqual(sets.find(0), sets.find(2))
+
+
+class TestSolve(unittest.TestCase):
+    def test_filled_pattern(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.fill_threads(["#ff0000" if n % 2 else "#0000ff" for n in range(pattern.threads)])
+        expected: bytearray = bytearray(pattern.thread_colors)
+        pattern.thread_colors = bytearray(len(expected))
+        solution = solve(pattern)
+        self.assertEqual(solution.thread_colors, expected)
+        self.assertEqual(solution.conflicts, [])
+
+    def test_conflicts(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.fill_thread(0, "#ff0000")
+        group: list[int] = pattern.groups[0]
+        pattern.set_cell(group[1], "#00ff00")
+        solution = solve(pattern)
+        self.assertEqual(pattern.palette[solution.thread_colors[0]], "#ff0000")
+        self.assertEqual(solution.conflicts, [group[1]])
+
+    def test_overlapping_groups_are_joined(self) -> None:
+        pattern: Pattern = grouped()
+        groups: list[list[int]] = pattern.groups
+        pattern.set_groups([groups[0] + groups[1][:1]] + groups[1:])
+        pattern.fill_thread(1, "#ff0000")
+        pattern.set_cell(groups[0][0], "#ff0000")
+        solution = solve(pattern)
+        self.assertEqual(solution.thread_colors[0], solution.thread_colors[1])
+        self.assertEqual(pattern.palette[solution.thread_colors[0]], "#ff0000")
+        self.assertEqual(sorted(solution.conflicts), groups[0][1:])
+
+    def test_unassigned_cells_never_conflict(self) -> None:
+        pattern: Pattern = Pattern(4, 3, 9)
+        pattern.set_thread(2, "#00ff00")
+        pattern.set_cell(0, "#ff0000")
+        solution = solve(pattern)
+        self.assertEqual(solution.conflicts, [])
+        self.assertEqual(pattern.palette[solution.thread_colors[2]], "#00ff00")
+
+
+if __name__ == "__main__":
+    unittest.main()
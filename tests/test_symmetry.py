@@ -0,0 +1,85 @@
+"""
+Tests of symmetric thread partners. Run from the repository root: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from layouts import kumihimo_threads  # noqa
+from pattern import Pattern  # noqa
+from symmetry import SYMMETRIES, grid_partners, mirror_cell, ring_partners  # noqa
+
+
+def columns(rows: int = 4, cols: int = 3) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :return: pattern with a thread for every outer and inner column, outer columns first
+    """
+    pattern: Pattern = Pattern(rows, cols, 2 * cols - 1)
+    pattern.set_groups([[i for i in range(pattern.cell_count) if pattern.cell_coords(i)[0] == n / 2]
+                        for n in list(range(0, 2 * cols - 1, 2)) + list(range(1, 2 * cols - 1, 2))])
+    return pattern
+
+
+class TestGrid(unittest.TestCase):
+    def test_mirror_cell(self) -> None:
+        pattern: Pattern = Pattern(4, 3, 9)
+        self.assertEqual(pattern.cell_coords(mirror_cell(pattern, 0, "Horizontal")), (2, 0))
+        self.assertEqual(pattern.cell_coords(mirror_cell(pattern, 0, "Vertical")), (0, 3))
+        self.assertEqual(pattern.cell_coords(mirror_cell(pattern, pattern.cell_index(0.5, 0.5), "Rotational")),
+                         (1.5, 2.5))
+        self.assertEqual(mirror_cell(pattern, pattern.cell_index(0.5, 3.5), "Vertical"), -1)
+        self.assertEqual(mirror_cell(pattern, 5, "None"), 5)
+
+    def test_mirror_twice(self) -> None:
+        pattern: Pattern = Pattern(5, 4, 13)
+        for symmetry in SYMMETRIES:
+            for i in range(pattern.cell_count):
+                j: int = mirror_cell(pattern, i, symmetry)
+                if j >= 0:
+                    self.assertEqual(mirror_cell(pattern, j, symmetry), i)
+
+    def test_grid_partners(self) -> None:
+        pattern: Pattern = columns()
+        self.assertEqual(grid_partners(pattern, "Horizontal"), [(2,), (), (0,), (4,), (3,)])
+        self.assertEqual(grid_partners(pattern, "Vertical"), [()] * 5)
+        self.assertEqual(grid_partners(pattern, "None"), [()] * 5)
+
+    def test_threads_without_cells(self) -> None:
+        pattern: Pattern = Pattern(4, 3, 9)
+        self.assertEqual(grid_partners(pattern, "Rotational"), [()] * 9)
+
+
+class TestRing(unittest.TestCase):
+    def test_partners_are_mirrored(self) -> None:
+        for threads in (8, 16, 24, 32, 48, 64):
+            used: set[int] = set(kumihimo_threads(threads))
+            for symmetry in SYMMETRIES[1:]:
+                with self.subTest(threads=threads, symmetry=symmetry):
+                    partners: tuple[tuple[int, ...], ...] = ring_partners(threads, symmetry)
+                    for i, partner in enumerate(partners):
+                        if i not in used:
+                            self.assertEqual(partner, ())
+                        for j in partner:
+                            self.assertIn(j, used)
+                            self.assertEqual(partners[j], (i,))
+
+    def test_rotational(self) -> None:
+        partners: tuple[tuple[int, ...], ...] = ring_partners(16, "Rotational")
+        self.assertEqual(len(partners), 32)
+        self.assertEqual(partners[0], (16,))
+        self.assertEqual(partners[5], (21,))
+        self.assertEqual(partners[2], ())
+        self.assertEqual(ring_partners(16, "None"), ((),) * 32)
+
+    def test_horizontal(self) -> None:
+        partners: tuple[tuple[int, ...], ...] = ring_partners(16, "Horizontal")
+        self.assertEqual(partners[0], (1,))
+        self.assertEqual(partners[4], (29,))
+
+
+if __name__ == "__main__":
+    unittest.main()
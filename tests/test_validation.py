@@ -0,0 +1,122 @@
+"""
+Tests of the pattern file checks. Run from the repository root: python -m pytest tests
+"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main"))
+
+from library import BlobStore, read_filenames, write_pattern  # noqa
+from pattern import Pattern  # noqa
+from validation import MAX_THREADS, summary, validate, validate_files  # noqa
+
+
+def grouped(rows: int = 4, cols: int = 3, threads: int | None = None) -> Pattern:
+    """
+    :param rows: grid rows
+    :param cols: grid columns
+    :param threads: number of threads, (cols - 1) * 4 + 1 by default
+    :return: pattern whose threads each have a group
+    """
+    pattern: Pattern = Pattern(rows, cols, (cols - 1) * 4 + 1 if threads is None else threads)
+    pattern.set_groups([list(range(n, pattern.cell_count, pattern.threads)) for n in range(pattern.threads)])
+    return pattern
+
+
+class TestValidate(unittest.TestCase):
+    def kinds(self, layout: str = "custom", **fields) -> list[str]:
+        """
+        :param layout: layout of the pattern
+        :param fields: fields replaced in a consistent pattern
+        :return: kinds of the problems found
+        """
+        return [i.kind for i in validate({**grouped().to_dict(), **fields}, layout)]
+
+    def test_consistent(self) -> None:
+        self.assertEqual(validate(grouped().to_dict()), ())
+
+    def test_problem_kinds(self) -> None:
+        groups: list[list[int]] = grouped().groups
+        self.assertEqual(self.kinds(rows="many"), ["file"])
+        self.assertEqual(self.kinds(cell_colors="00"), ["size"])
+        self.assertEqual(self.kinds(groups=groups[:-1]), ["threads", "unassigned"])
+        self.assertEqual(self.kinds(groups=[[-1]] + groups[1:]), ["range", "unassigned"])
+        self.assertEqual(self.kinds(groups=[groups[0] + [1]] + groups[1:]), ["overlap"])
+        self.assertEqual(self.kinds(groups=[[]] + groups[1:]), ["unassigned"])
+        self.assertEqual(self.kinds(thread_colors="07" + "00" * 8), ["palette"])
+
+    def test_conflict(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.fill_thread(0, "#ff0000")
+        pattern.set_cell(pattern.groups[0][1], "#00ff00")
+        problems = validate(pattern.to_dict())
+        self.assertEqual([i.kind for i in problems], ["conflict"])
+        self.assertEqual(problems[0].cells, (pattern.groups[0][1],))
+
+    def test_thread_rules(self) -> None:
+        self.assertEqual([i.kind for i in validate(grouped(threads=10).to_dict())], ["threads"])
+        self.assertEqual([i.kind for i in validate(grouped(threads=MAX_THREADS + 2).to_dict())], ["threads"])
+        self.assertEqual([i.kind for i in validate(grouped(threads=MAX_THREADS).to_dict())], [])
+        self.assertEqual([i.kind for i in validate(grouped(threads=32).to_dict(), "kumihimo")], [])
+        self.assertEqual([i.kind for i in validate(grouped().to_dict(), "kumihimo")], ["threads"])
+
+    def test_broken_data_is_not_solved(self) -> None:
+        pattern: Pattern = grouped()
+        pattern.fill_thread(0, "#ff0000")
+        pattern.set_cell(pattern.groups[0][1], "#00ff00")
+        data: dict = pattern.to_dict()
+        self.assertEqual([i.kind for i in validate({**data, "thread_colors": data["thread_colors"][2:]})], ["size"])
+
+
+class TestValidateFiles(unittest.TestCase):
+    def setUp(self) -> None:
+        temporary: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory: str = temporary.name
+        self.blobs: str = os.path.join(self.directory, "blobs")
+        self.store: BlobStore = BlobStore(self.blobs)
+
+    def path(self, name: str) -> str:
+        """
+        :param name: file name
+        :return: path in the test directory
+        """
+        return os.path.join(self.directory, name)
+
+    def test_files(self) -> None:
+        broken: Pattern = grouped(6, 3)
+        broken.set_cell(broken.groups[2][0], "#ff0000")
+        write_pattern(self.path("inline.json"), grouped(), None, "Inline")
+        write_pattern(self.path("stored.json"), grouped(), self.store, "Stored")
+        write_pattern(self.path("broken.json"), broken, self.store, "Broken")
+        with open(self.path("garbage.json"), "w", encoding="utf-8") as f:
+            f.write("{")
+        paths: list[str] = [self.path(i) for i in ("inline.json", "stored.json", "broken.json", "garbage.json",
+                                                   "missing.json")]
+        for jobs in (1, 2):
+            with self.subTest(jobs=jobs):
+                reports = validate_files(paths, self.blobs, jobs)
+                self.assertEqual([i.path for i in reports], paths)
+                self.assertEqual([i.name for i in reports], ["Inline", "Stored", "Broken", None, None])
+                self.assertEqual([[j.kind for j in i.problems] for i in reports],
+                                 [[], [], ["conflict"], ["file"], ["file"]])
+        result: dict = summary(reports)
+        self.assertEqual((result["files"], result["failed"]), (5, 3))
+        self.assertEqual(result["problems"], {"conflict": 1, "file": 2})
+        self.assertEqual(json.loads(json.dumps(result))["reports"][2]["problems"][0]["cells"],
+                         [broken.groups[2][0]])
+
+    def test_read_filenames(self) -> None:
+        path: str = self.path("filenames.txt")
+        self.assertEqual(read_filenames(path, self.directory), [])
+        with open(path, "w", encoding="utf-8-sig") as f:
+            f.write("a.json\n\n  b.json  \n")
+        self.assertEqual(read_filenames(path, "library"),
+                         [os.path.join("library", "a.json"), os.path.join("library", "b.json")])
+
+
+if __name__ == "__main__":
+    unittest.main()